@@ -0,0 +1,482 @@
+import os
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from analytics.data import BASE_VERSION, DELTA_LOOKBACK, SECTION_COLUMNS, TABLE, VERSION_LAUNCHES, time_bounds
+from analytics.filters import FilterState, select, state_mask
+from analytics.metrics import EMPTY_METRICS, MAX_SESSION_SEC, metrics_table, summary_metrics, trend_table
+from analytics.rollup import MEDIANS, SKETCHES, histogram
+
+# Where every panel's aggregates are computed: 'cube' in process from the
+# rollup, 'rpc' in Postgres (see FUNCTIONS), which needs no cube at all
+AGGREGATE_SOURCE = os.environ.get('SITENUDGE_AGGREGATES', 'cube')
+
+FREQ_UNITS = {'h': 'hour', 'D': 'day'}
+
+# Columns a p_group parameter can name besides 'version'
+GROUP_COLUMNS = ('is_bot', 'utm_source', 'device_type', 'hero_variant', 'social_proof_variant', 'scroll_hook_variant')
+
+# Row counts that come back per group (see counts())
+COUNT_COLUMNS = ['sessions', 'new_visitors', 'returning_visitors']
+
+
+def version_sql(launches=VERSION_LAUNCHES, base=BASE_VERSION):
+    # data.fill_versions() in SQL: rows with no version get the latest launch at or before started_at
+    cases = ' '.join(f"WHEN started_at >= '{launched.isoformat()}' THEN '{label}'" for launched, label in reversed(launches))
+    return f"coalesce(version::text, CASE {cases} ELSE '{base}' END)"
+
+
+def group_sql(param):
+    # The column a p_group parameter names, as text; NULL when it names none
+    cases = ' '.join(f"WHEN '{column}' THEN {column}::text" for column in GROUP_COLUMNS)
+    return f"CASE {param} WHEN 'version' THEN {version_sql()} {cases} END"
+
+
+# Every function takes the period and the FilterState fields first. The
+# bodies only use SQL that Postgres and DuckDB both accept, so the same text
+# becomes a Postgres function (render_postgres) and a DuckDB table macro.
+WINDOW_PARAMS = (
+    ('p_start', 'timestamptz'),
+    ('p_end', 'timestamptz'),
+    ('p_end_inclusive', 'boolean'),
+    ('p_exclude_bots', 'boolean'),
+    ('p_tiktok_only', 'boolean'),
+    ('p_price', 'double precision'),
+    ('p_version', 'text'),
+    ('p_test_id', 'text'),
+)
+
+WINDOW_SQL = f"""FROM {TABLE}
+    WHERE started_at >= p_start
+      AND (started_at < p_end OR (p_end_inclusive AND started_at = p_end))
+      AND (NOT p_exclude_bots OR is_bot IS NOT TRUE)
+      AND (NOT p_tiktok_only OR utm_source::text = 'tiktok')
+      AND (p_price IS NULL OR price_shown = p_price)
+      AND (p_version IS NULL OR {version_sql()} = p_version)
+      AND (p_test_id IS NULL OR hero_test_id::text = p_test_id)"""
+
+VALID_TIME = f'time_on_site_sec > 0 AND time_on_site_sec <= {MAX_SESSION_SEC}'
+
+# Per-row sum of the columns a session updates as it goes on
+ACTIVITY = ('coalesce(time_on_site_sec, 0) + coalesce(scroll_depth_pct, 0) + coalesce(clicks_total, 0)'
+            ' + (clicked_buy IS TRUE)::integer + (initiated_checkout IS TRUE)::integer + (purchased IS TRUE)::integer')
+
+FUNCTIONS = {
+    'dashboard_metrics': {
+        'params': WINDOW_PARAMS + (('p_group', 'text'),),
+        'returns': (
+            ('group_key', 'text'), ('sessions', 'bigint'), ('median_time', 'double precision'),
+            ('median_scroll', 'double precision'), ('total_clicks', 'bigint'), ('clicked_buy', 'bigint'),
+            ('initiated_checkout', 'bigint'), ('purchased', 'bigint'), ('bounces', 'bigint'),
+            ('engaged_sessions', 'bigint'),
+        ),
+        'body': f"""SELECT {group_sql('p_group')} AS group_key,
+           count(*)::bigint AS sessions,
+           (percentile_cont(0.5) WITHIN GROUP (ORDER BY time_on_site_sec) FILTER (WHERE {VALID_TIME}))::double precision AS median_time,
+           (percentile_cont(0.5) WITHIN GROUP (ORDER BY scroll_depth_pct) FILTER (WHERE scroll_depth_pct > 0))::double precision AS median_scroll,
+           coalesce(sum(clicks_total), 0)::bigint AS total_clicks,
+           (count(*) FILTER (WHERE clicked_buy))::bigint AS clicked_buy,
+           (count(*) FILTER (WHERE initiated_checkout))::bigint AS initiated_checkout,
+           (count(*) FILTER (WHERE purchased))::bigint AS purchased,
+           (count(*) FILTER (WHERE time_on_site_sec = 0 OR scroll_depth_pct = 0))::bigint AS bounces,
+           (count(*) FILTER (WHERE time_on_site_sec > 10 AND scroll_depth_pct > 25))::bigint AS engaged_sessions
+    {WINDOW_SQL}
+    GROUP BY 1
+    ORDER BY 1 NULLS LAST""",
+    },
+    'dashboard_price_stats': {
+        'params': WINDOW_PARAMS,
+        'returns': (
+            ('price_shown', 'double precision'), ('sessions', 'bigint'), ('clicked_buy', 'bigint'),
+            ('initiated_checkout', 'bigint'), ('purchased', 'bigint'),
+        ),
+        'body': f"""SELECT price_shown::double precision AS price_shown,
+           count(*)::bigint AS sessions,
+           (count(*) FILTER (WHERE clicked_buy))::bigint AS clicked_buy,
+           (count(*) FILTER (WHERE initiated_checkout))::bigint AS initiated_checkout,
+           (count(*) FILTER (WHERE purchased))::bigint AS purchased
+    {WINDOW_SQL}
+      AND price_shown IS NOT NULL
+    GROUP BY 1
+    ORDER BY 1""",
+    },
+    'dashboard_trend': {
+        'params': WINDOW_PARAMS + (('p_bucket', 'text'),),
+        'returns': (
+            ('bucket', 'timestamptz'), ('sessions', 'bigint'), ('median_time', 'double precision'),
+            ('users_5sec', 'bigint'), ('users_10sec', 'bigint'), ('median_scroll', 'double precision'),
+            ('users_25scroll', 'bigint'), ('users_50scroll', 'bigint'), ('total_clicks', 'bigint'),
+            ('clicked_buy', 'bigint'), ('initiated_checkout', 'bigint'),
+        ),
+        'body': f"""SELECT date_trunc(p_bucket, started_at) AS bucket,
+           count(*)::bigint AS sessions,
+           (percentile_cont(0.5) WITHIN GROUP (ORDER BY time_on_site_sec) FILTER (WHERE {VALID_TIME}))::double precision AS median_time,
+           (count(*) FILTER (WHERE time_on_site_sec > 5))::bigint AS users_5sec,
+           (count(*) FILTER (WHERE time_on_site_sec > 10))::bigint AS users_10sec,
+           (percentile_cont(0.5) WITHIN GROUP (ORDER BY scroll_depth_pct) FILTER (WHERE scroll_depth_pct > 0))::double precision AS median_scroll,
+           (count(*) FILTER (WHERE scroll_depth_pct > 25))::bigint AS users_25scroll,
+           (count(*) FILTER (WHERE scroll_depth_pct > 50))::bigint AS users_50scroll,
+           coalesce(sum(clicks_total), 0)::bigint AS total_clicks,
+           (count(*) FILTER (WHERE clicked_buy))::bigint AS clicked_buy,
+           (count(*) FILTER (WHERE initiated_checkout))::bigint AS initiated_checkout
+    {WINDOW_SQL}
+    GROUP BY 1
+    ORDER BY 1""",
+    },
+    'dashboard_counts': {
+        'params': WINDOW_PARAMS + (('p_group1', 'text'), ('p_group2', 'text'), ('p_bucket', 'text')),
+        'returns': (
+            ('bucket', 'timestamptz'), ('group1', 'text'), ('group2', 'text'), ('sessions', 'bigint'),
+            ('new_visitors', 'bigint'), ('returning_visitors', 'bigint'),
+        ),
+        'body': f"""SELECT date_trunc(p_bucket, started_at) AS bucket,
+           {group_sql('p_group1')} AS group1,
+           {group_sql('p_group2')} AS group2,
+           count(*)::bigint AS sessions,
+           (count(*) FILTER (WHERE visit_number = 1))::bigint AS new_visitors,
+           (count(*) FILTER (WHERE visit_number > 1))::bigint AS returning_visitors
+    {WINDOW_SQL}
+    GROUP BY 1, 2, 3
+    ORDER BY 1 NULLS LAST, 2 NULLS LAST, 3 NULLS LAST""",
+    },
+    'dashboard_visitors': {
+        'params': WINDOW_PARAMS,
+        'returns': (('unique_visitors', 'bigint'),),
+        'body': f"""SELECT count(DISTINCT user_id)::bigint AS unique_visitors
+    {WINDOW_SQL}""",
+    },
+    # Sessions per distinct value of a sketched input (see rollup.SKETCHES),
+    # binned by the caller
+    'dashboard_distribution': {
+        'params': WINDOW_PARAMS + (('p_sketch', 'text'),),
+        'returns': (('value', 'double precision'), ('sessions', 'bigint')),
+        'body': f"""SELECT (CASE p_sketch WHEN 'time' THEN time_on_site_sec WHEN 'scroll' THEN scroll_depth_pct END)::double precision AS value,
+           count(*)::bigint AS sessions
+    {WINDOW_SQL}
+      AND CASE p_sketch WHEN 'time' THEN {VALID_TIME} WHEN 'scroll' THEN scroll_depth_pct > 0 END
+    GROUP BY 1
+    ORDER BY 1""",
+    },
+    'dashboard_cities': {
+        'params': WINDOW_PARAMS + (('p_limit', 'integer'),),
+        'returns': (('city', 'text'), ('sessions', 'bigint')),
+        'body': f"""SELECT city::text AS city,
+           count(*)::bigint AS sessions
+    {WINDOW_SQL}
+      AND city IS NOT NULL AND city::text <> ''
+    GROUP BY 1
+    ORDER BY 2 DESC, 1
+    LIMIT p_limit""",
+    },
+    # SECTION_COLUMNS['recent_sessions'] of the newest sessions
+    'dashboard_recent_sessions': {
+        'params': WINDOW_PARAMS + (('p_limit', 'integer'),),
+        'returns': (
+            ('started_at', 'timestamptz'), ('device_type', 'text'), ('city', 'text'),
+            ('time_on_site_sec', 'double precision'), ('scroll_depth_pct', 'integer'), ('clicked_buy', 'boolean'),
+            ('hero_variant', 'text'), ('social_proof_variant', 'text'),
+        ),
+        'body': f"""SELECT started_at,
+           device_type::text AS device_type,
+           city::text AS city,
+           time_on_site_sec::double precision AS time_on_site_sec,
+           scroll_depth_pct::integer AS scroll_depth_pct,
+           clicked_buy,
+           hero_variant::text AS hero_variant,
+           social_proof_variant::text AS social_proof_variant
+    {WINDOW_SQL}
+    ORDER BY started_at DESC
+    LIMIT p_limit""",
+    },
+    'dashboard_prices': {
+        'params': (),
+        'returns': (('price_shown', 'double precision'),),
+        'body': f"""SELECT DISTINCT price_shown::double precision AS price_shown
+    FROM {TABLE}
+    WHERE price_shown > 0
+    ORDER BY 1""",
+    },
+    # The table's started_at range and a fingerprint of the sessions since
+    # p_since, polled in place of downloading rows (see FunctionStatus)
+    'dashboard_status': {
+        'params': (('p_since', 'timestamptz'),),
+        'returns': (
+            ('first_started_at', 'timestamptz'), ('last_started_at', 'timestamptz'),
+            ('recent_sessions', 'bigint'), ('recent_activity', 'double precision'),
+        ),
+        'body': f"""SELECT (SELECT min(started_at) FROM {TABLE}) AS first_started_at,
+           (SELECT max(started_at) FROM {TABLE}) AS last_started_at,
+           count(*)::bigint AS recent_sessions,
+           coalesce(sum({ACTIVITY}), 0)::double precision AS recent_activity
+    FROM {TABLE}
+    WHERE started_at >= p_since""",
+    },
+}
+
+
+def render_postgres(functions=FUNCTIONS):
+    # The migration behind sql/dashboard_rpc.sql
+    statements = ['-- Generated by analytics.aggregates.render_postgres(); edit FUNCTIONS there.\n']
+    for name, spec in functions.items():
+        params = ', '.join(f'{param} {kind}' for param, kind in spec['params'])
+        returns = ', '.join(f'{column} {kind}' for column, kind in spec['returns'])
+        statements.append(f"CREATE OR REPLACE FUNCTION {name}({params})\n"
+                          f"RETURNS TABLE ({returns})\n"
+                          f"LANGUAGE sql STABLE AS $$\n    {spec['body']}\n$$;\n")
+    return '\n'.join(statements)
+
+
+class FunctionAggregates(ABC):
+    """Funnel, per-group, price and trend aggregates for one period and
+    FilterState, computed by running FUNCTIONS next to the data.
+
+    Subclasses implement call(name, params), which returns a list of row
+    dicts. CubeAggregates answers the same methods from the rollup cube.
+    """
+
+    @abstractmethod
+    def call(self, name, params):
+        pass
+
+    def metrics(self, start, end, state, by=None, closed='both'):
+        # calculate_metrics() dict, or a grouped_metrics() table when `by` names a column
+        columns = [column for column, _ in FUNCTIONS['dashboard_metrics']['returns']]
+        rows = pd.DataFrame(self.call('dashboard_metrics', {**_window(start, end, state, closed), 'p_group': by}),
+                            columns=columns)
+        rows[['median_time', 'median_scroll']] = rows[['median_time', 'median_scroll']].astype('float64')
+        if by is None:
+            return summary_metrics(rows.to_dict('records')[0]) if len(rows) else dict(EMPTY_METRICS)
+        return metrics_table(rows.dropna(subset=['group_key']).set_index('group_key').rename_axis(by))
+
+    def price_stats(self, start, end, state, closed='both'):
+        columns = [column for column, _ in FUNCTIONS['dashboard_price_stats']['returns']]
+        return pd.DataFrame(self.call('dashboard_price_stats', _window(start, end, state, closed)), columns=columns)
+
+    def trend(self, start, end, state, freq, closed='both'):
+        columns = [column for column, _ in FUNCTIONS['dashboard_trend']['returns']]
+        rows = pd.DataFrame(self.call('dashboard_trend', {**_window(start, end, state, closed), 'p_bucket': FREQ_UNITS[freq]}),
+                            columns=columns)
+        rows['bucket'] = pd.to_datetime(rows['bucket'], utc=True)
+        rows[['median_time', 'median_scroll']] = rows[['median_time', 'median_scroll']].astype('float64')
+        return trend_table(rows.set_index('bucket'))
+
+    def counts(self, start, end, state, by=(), freq=None, closed='both', dropna=True):
+        # COUNT_COLUMNS per group of up to two `by` columns, with a leading
+        # 'bucket' key when freq is given; a dict of totals without keys
+        if len(by) > 2:
+            raise ValueError(f"dashboard_counts groups by at most two columns, got {list(by)}")
+        groups = list(by) + [None] * (2 - len(by))
+        params = {**_window(start, end, state, closed), 'p_group1': groups[0], 'p_group2': groups[1],
+                  'p_bucket': FREQ_UNITS[freq] if freq is not None else None}
+        columns = [column for column, _ in FUNCTIONS['dashboard_counts']['returns']]
+        rows = pd.DataFrame(self.call('dashboard_counts', params), columns=columns)
+        keys = ['bucket'] if freq is not None else []
+        rows['bucket'] = pd.to_datetime(rows['bucket'], utc=True)
+        for key, column in zip(['group1', 'group2'], by):
+            # Booleans come back as their text
+            rows[key] = rows[key].map({'true': True, 'false': False}) if column == 'is_bot' else rows[key]
+            keys.append(key)
+        if not keys:
+            return {column: int(rows[column].sum()) for column in COUNT_COLUMNS}
+        if dropna:
+            rows = rows.dropna(subset=keys)
+        return rows.set_index(keys).rename_axis(keys[:len(keys) - len(by)] + list(by))[COUNT_COLUMNS]
+
+    def visitors(self, start, end, state=None, closed='both'):
+        rows = self.call('dashboard_visitors', _window(start, end, state, closed))
+        return int(rows[0]['unique_visitors']) if rows else 0
+
+    def distribution(self, start, end, sketch, edges, state=None, closed='both'):
+        # Binned like RollupCube.distribution(), values past the sketch's top edge included
+        rows = pd.DataFrame(self.call('dashboard_distribution', {**_window(start, end, state, closed), 'p_sketch': sketch}),
+                            columns=['value', 'sessions'])
+        values = np.minimum(rows['value'].to_numpy(dtype='float64'), SKETCHES[sketch][1][-1])
+        return histogram(values, rows['sessions'].to_numpy(dtype='int64'), edges)
+
+    def top_cities(self, start, end, state, limit, closed='both'):
+        # Sessions per city, most first and then by name, blank and missing cities left out
+        rows = pd.DataFrame(self.call('dashboard_cities', {**_window(start, end, state, closed), 'p_limit': limit}),
+                            columns=['city', 'sessions'])
+        return rows.set_index('city')['sessions']
+
+    def recent_sessions(self, start, end, state, limit, closed='both'):
+        # The newest `limit` sessions, newest first
+        columns = [column for column, _ in FUNCTIONS['dashboard_recent_sessions']['returns']]
+        rows = pd.DataFrame(self.call('dashboard_recent_sessions', {**_window(start, end, state, closed), 'p_limit': limit}),
+                            columns=columns)
+        rows['started_at'] = pd.to_datetime(rows['started_at'], utc=True)
+        return rows
+
+    def prices(self):
+        # Every price above zero shown across the whole table, ascending
+        return [float(row['price_shown']) for row in self.call('dashboard_prices', {})]
+
+    def status(self, since):
+        # The dashboard_status row; the timestamps are None on an empty table
+        return self.call('dashboard_status', {'p_since': pd.Timestamp(since).to_pydatetime()})[0]
+
+
+def _window(start, end, state, closed):
+    # No state means no filters at all, bots included
+    state = state if state is not None else FilterState(exclude_bots=False)
+    return {
+        'p_start': pd.Timestamp(start).to_pydatetime(),
+        'p_end': pd.Timestamp(end).to_pydatetime(),
+        'p_end_inclusive': closed == 'both',
+        'p_exclude_bots': state.exclude_bots,
+        'p_tiktok_only': state.tiktok_only,
+        'p_price': state.price,
+        'p_version': state.version,
+        'p_test_id': state.test_id,
+    }
+
+
+class CubeAggregates:
+    """The FunctionAggregates methods, read from the in-process rollup cube built over df.
+
+    The panels that list cities or sessions read the rows of df, filtered
+    through `masks` (a filters.FilterEngine) when given.
+    """
+
+    def __init__(self, cube, df, exact=False, masks=None):
+        self.cube = cube
+        self.df = df
+        self.exact = exact
+        self.masks = masks
+
+    def _query(self, start, end, state, closed, **kwargs):
+        return self.cube.query(self.df, start, end, state=state, closed=closed, exact=self.exact, **kwargs)
+
+    def _rows(self, start, end, state, closed):
+        bounds = time_bounds(self.df, start, end, closed)
+        if self.masks is not None:
+            return select(self.df, bounds, self.masks.mask(self.df, state))
+        rows = select(self.df, bounds)
+        return rows[state_mask(rows, state)]
+
+    def metrics(self, start, end, state, by=None, closed='both'):
+        totals = self._query(start, end, state, closed, by=[by] if by else (), quantiles=MEDIANS)
+        return summary_metrics(totals) if by is None else metrics_table(totals)
+
+    def price_stats(self, start, end, state, closed='both'):
+        prices = self._query(start, end, state, closed, by=['price_shown']).reset_index()
+        return prices[['price_shown', 'sessions', 'clicked_buy', 'initiated_checkout', 'purchased']]
+
+    def trend(self, start, end, state, freq, closed='both'):
+        return trend_table(self._query(start, end, state, closed, freq=freq, quantiles=MEDIANS))
+
+    def counts(self, start, end, state, by=(), freq=None, closed='both', dropna=True):
+        totals = self._query(start, end, state, closed, by=list(by), freq=freq, dropna=dropna)
+        if isinstance(totals, dict):
+            return {column: totals[column] for column in COUNT_COLUMNS}
+        return totals[COUNT_COLUMNS]
+
+    def visitors(self, start, end, state=None, closed='both'):
+        return self._query(start, end, state, closed, visitors=True)['unique_visitors']
+
+    def distribution(self, start, end, sketch, edges, state=None, closed='both'):
+        return self.cube.distribution(self.df, start, end, sketch, edges, state=state, closed=closed)
+
+    def top_cities(self, start, end, state, limit, closed='both'):
+        if 'city' not in self.df.columns:
+            return pd.Series([], index=pd.Index([], name='city', dtype=object), name='sessions', dtype='int64')
+        cities = self._rows(start, end, state, closed)['city']
+        counts = cities[cities.notna() & (cities != '')].astype(str).value_counts()
+        counts = counts.sort_index().sort_values(ascending=False, kind='stable').head(limit)
+        return counts.rename_axis('city').rename('sessions')
+
+    def recent_sessions(self, start, end, state, limit, closed='both'):
+        rows = self._rows(start, end, state, closed)
+        columns = [column for column in SECTION_COLUMNS['recent_sessions'] if column in rows.columns]
+        return rows[columns].tail(limit).iloc[::-1].reset_index(drop=True)
+
+    def prices(self):
+        if 'price_shown' not in self.df.columns:
+            return []
+        return sorted(float(price) for price in self.df['price_shown'].dropna().unique() if price > 0)
+
+
+class SupabaseAggregates(FunctionAggregates):
+    """FUNCTIONS run in Postgres through PostgREST; only result rows come back."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def call(self, name, params):
+        params = {key: value.isoformat() if hasattr(value, 'isoformat') else value for key, value in params.items()}
+        return self.client.rpc(name, params).execute().data or []
+
+
+class DuckDBAggregates(FunctionAggregates):
+    """FUNCTIONS as DuckDB table macros over a local copy of the sessions table.
+
+    A stand-in for Supabase in tests and benchmarks: `data` is a sessions
+    DataFrame or a file DuckDB can read (Parquet, CSV, JSON).
+    """
+
+    def __init__(self, data, functions=FUNCTIONS):
+        import duckdb
+
+        self._con = duckdb.connect()
+        self._con.execute("SET TimeZone = 'UTC'")
+        if isinstance(data, pd.DataFrame):
+            self._con.register('fixture', data)
+            self._con.execute(f"CREATE TABLE {TABLE} AS SELECT * FROM fixture")
+            self._con.unregister('fixture')
+        else:
+            self._con.execute(f"CREATE TABLE {TABLE} AS SELECT * FROM '{data}'")
+        for name, spec in functions.items():
+            params = ', '.join(param for param, _ in spec['params'])
+            self._con.execute(f"CREATE MACRO {name}({params}) AS TABLE {spec['body']}")
+        self.functions = functions
+        self._lock = threading.Lock()
+
+    def call(self, name, params):
+        # Macro arguments are positional, in FUNCTIONS order
+        placeholders = ', '.join(f'${param}' for param, _ in self.functions[name]['params'])
+        with self._lock:
+            result = self._con.execute(f"SELECT * FROM {name}({placeholders})", params)
+            columns = [column[0] for column in result.description]
+            return [dict(zip(columns, row)) for row in result.fetchall()]
+
+
+class FunctionStatus:
+    """Stands in for data.SessionStore under a SessionRefresher when every
+    panel runs in FUNCTIONS, so no rows are ever downloaded.
+
+    Each refresh polls dashboard_status through `source`. The frame is that
+    one status row and is only replaced when the row changes: a new session
+    moves last_started_at and an update to one started within `lookback`
+    moves the activity sum, so the refresher publishes a new version just
+    when results may differ. An empty table gives an empty frame.
+    """
+
+    changed_since = None
+    memory = {'raw': 0, 'typed': 0}
+
+    def __init__(self, source, lookback=DELTA_LOOKBACK):
+        self.source = source
+        self.lookback = lookback
+        self.df = pd.DataFrame()
+
+    def invalidate(self):
+        # The next refresh publishes a new version, which recomputes every cached result
+        self.df = pd.DataFrame()
+
+    def require(self, columns):
+        # The functions read the columns they need in Postgres
+        return False
+
+    def refresh(self):
+        status = self.source.status(datetime.now(timezone.utc) - self.lookback)
+        df = pd.DataFrame([status]) if status['last_started_at'] is not None else pd.DataFrame()
+        for column in ('first_started_at', 'last_started_at'):
+            if column in df.columns:
+                df[column] = pd.to_datetime(df[column], utc=True)
+        if not df.equals(self.df):
+            self.df = df
+        return self.df
@@ -0,0 +1,103 @@
+import os
+import threading
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+# Which engine runs the heavy group-bys (see get_backend)
+BACKEND = os.environ.get('SITENUDGE_BACKEND', 'pandas')
+
+
+class PandasBackend:
+    """Group-bys in pandas, single-threaded. The reference implementation."""
+
+    name = 'pandas'
+
+    def aggregate(self, frame, keys, aggs):
+        """Group `frame` on the `keys` columns and aggregate.
+
+        `aggs` maps each output column to (input column, 'sum', 'max' or 'size').
+        Null keys form their own groups and rows come back sorted by the
+        keys, nulls last, with the keys as ordinary columns.
+        """
+        return frame.groupby(keys, observed=True, dropna=False, sort=True).agg(**aggs).reset_index()
+
+
+class DuckDBBackend:
+    """The same group-bys in DuckDB, which scans the frame's arrays in place
+    and spreads the work over all cores.
+
+    Results are cast back to the dtypes PandasBackend returns, so callers
+    can't tell the two apart (float sums may differ in the last bits).
+    """
+
+    name = 'duckdb'
+
+    SQL = {'sum': 'sum("{}")', 'max': 'max("{}")', 'size': 'count(*)'}
+
+    def __init__(self, threads=None):
+        try:
+            import duckdb
+        except ImportError as e:
+            raise RuntimeError("SITENUDGE_BACKEND=duckdb needs the duckdb package installed") from e
+        self._con = duckdb.connect(config={'threads': threads} if threads else {})
+        self._con.execute("SET TimeZone = 'UTC'")
+        self._lock = threading.Lock()
+
+    def aggregate(self, frame, keys, aggs):
+        key_list = ', '.join(f'"{key}"' for key in keys)
+        columns = [f'{self.SQL[func].format(column)} AS "{name}"' for name, (column, func) in aggs.items()]
+        sql = f'SELECT {key_list}, {", ".join(columns)} FROM frame GROUP BY {key_list} ORDER BY {key_list} NULLS LAST'
+        with self._lock:
+            cursor = self._con.cursor()
+        try:
+            cursor.register('frame', frame)
+            result = cursor.execute(sql).df()
+        finally:
+            cursor.close()
+
+        for key in keys:
+            result[key] = result[key].astype(frame[key].dtype)
+        for name, (column, func) in aggs.items():
+            result[name] = result[name].astype('int64' if func == 'size' else frame[column].dtype)
+        return result
+
+
+BACKENDS = {'pandas': PandasBackend, 'duckdb': DuckDBBackend}
+
+
+@lru_cache(maxsize=None)
+def get_backend(name=BACKEND):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend {name!r}, expected one of {', '.join(BACKENDS)}")
+    return BACKENDS[name]()
+
+
+def compare_backends(df, names=('pandas', 'duckdb')):
+    """Build the rollup cube from df with each backend and list every difference.
+
+    Every dashboard number is read from the cube, so matching tables mean
+    matching dashboards. Returns human-readable mismatches; empty when the
+    backends agree.
+    """
+    from analytics.rollup import RollupCube
+
+    reference, *others = [RollupCube.build(df, backend=get_backend(name)) for name in names]
+    problems = []
+    for name, cube in zip(names[1:], others):
+        for table, expected in reference.tables.items():
+            actual = cube.tables[table]
+            if list(actual.columns) != list(expected.columns) or len(actual) != len(expected):
+                problems.append(f"{name}: {table} has shape {actual.shape}, expected {expected.shape}")
+                continue
+            for column in expected.columns:
+                a, b = actual[column], expected[column]
+                if a.dtype != b.dtype:
+                    problems.append(f"{name}: {table}.{column} is {a.dtype}, expected {b.dtype}")
+                elif pd.api.types.is_float_dtype(b.dtype):
+                    if not np.allclose(a, b, equal_nan=True):
+                        problems.append(f"{name}: {table}.{column} values differ")
+                elif not a.equals(b):
+                    problems.append(f"{name}: {table}.{column} values differ")
+    return problems
@@ -0,0 +1,136 @@
+"""Times each stage of the dashboard pipeline over synthetic session tables.
+
+    python -m analytics.bench --sizes 10k,100k,1M --out bench.json
+    python -m analytics.bench --sizes 10k,100k,1M --baseline bench.json
+
+Every stage runs `--repeat` times per size and records its best and median
+wall time. With --baseline, stages whose best time grew by more than
+--tolerance times the baseline are listed and the exit status is 1.
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+
+from analytics.aggregates import CubeAggregates, DuckDBAggregates
+from analytics.charts import TREND_PANELS, trend_figure
+from analytics.data import SessionStore, fill_versions, frame_memory, time_bounds
+from analytics.filters import FilterEngine, FilterState, select
+from analytics.metrics import build_trend, calculate_ab_stats, calculate_metrics
+from analytics.rollup import RollupCube
+from analytics.synthetic import SYNTHETIC_END, SyntheticClient, generate_sessions
+
+SIZES = ('10k', '100k', '1M', '10M')
+VARIANT_COLUMNS = ('hero_variant', 'social_proof_variant', 'scroll_hook_variant')
+# The window and filters the dashboard opens with
+PERIOD = timedelta(days=30)
+STATE = FilterState()
+FIGURE_LAYOUT = dict(template='plotly_dark', xaxis={}, yaxis={})
+PANEL_WIDTH = 680
+
+
+def parse_size(text):
+    scale = {'k': 10 ** 3, 'm': 10 ** 6}.get(text[-1].lower(), 1)
+    return int(float(text[:-1] if scale > 1 else text) * scale)
+
+
+def timed(func, repeat):
+    # (best, median) seconds over `repeat` runs, and the last run's result
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - started)
+    times.sort()
+    return {'best': times[0], 'median': times[len(times) // 2]}, result
+
+
+def run_stages(n, repeat=3, seed=0, rpc=False):
+    """Stage timings for an n-row table, in pipeline order."""
+    raw = generate_sessions(n, seed=seed)
+    client = SyntheticClient(raw)
+    start, end = SYNTHETIC_END - PERIOD, SYNTHETIC_END
+    stages = {}
+
+    # Paged fetch, JSON records to frame, version backfill and dtypes
+    stages['load'], df = timed(lambda: SessionStore(client).refresh(), repeat)
+    stages['version_backfill'], _ = timed(lambda: fill_versions(raw.copy()), repeat)
+    bounds = time_bounds(df, start, end)
+    # A fresh engine per run so no predicate mask is reused
+    stages['filter'], filtered = timed(lambda: select(df, bounds, FilterEngine().mask(df, STATE)), repeat)
+    stages['metrics'], _ = timed(lambda: calculate_metrics(filtered), repeat)
+    stages['ab_stats'], _ = timed(lambda: [calculate_ab_stats(filtered, col) for col in VARIANT_COLUMNS], repeat)
+    stages['trend'], trend = timed(lambda: build_trend(filtered, 'D'), repeat)
+    stages['figure'], _ = timed(lambda: trend_figure(trend, list(TREND_PANELS), FIGURE_LAYOUT, PANEL_WIDTH).to_json(),
+                                repeat)
+
+    # What the dashboard reads in practice: the rollup cube, or the RPC functions
+    stages['rollup'], cube = timed(lambda: RollupCube.build(df), repeat)
+    aggregates = CubeAggregates(cube, df)
+    stages['cube_metrics'], _ = timed(lambda: (aggregates.metrics(start, end, STATE),
+                                               aggregates.trend(start, end, STATE, 'D')), repeat)
+    if rpc:
+        aggregates = DuckDBAggregates(df)
+        stages['rpc_metrics'], _ = timed(lambda: (aggregates.metrics(start, end, STATE),
+                                                  aggregates.trend(start, end, STATE, 'D')), repeat)
+    return {'rows': len(df), 'memory_mb': frame_memory(df) / 1e6, 'stages': stages}
+
+
+def regressions(results, baseline, tolerance):
+    found = []
+    for size, result in results['sizes'].items():
+        before = baseline.get('sizes', {}).get(size)
+        if before is None:
+            continue
+        for stage, timing in result['stages'].items():
+            old = before['stages'].get(stage)
+            if old is not None and timing['best'] > old['best'] * tolerance:
+                found.append(f"{size} {stage}: {timing['best']:.4f}s, was {old['best']:.4f}s")
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default=','.join(SIZES[:3]), help=f"comma-separated row counts, e.g. {','.join(SIZES)}")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--rpc', action='store_true', help="also time the RPC functions on DuckDB")
+    parser.add_argument('--out', help="write the results JSON here")
+    parser.add_argument('--baseline', help="results JSON to compare against")
+    parser.add_argument('--tolerance', type=float, default=1.25)
+    args = parser.parse_args(argv)
+
+    results = {
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+        'repeat': args.repeat,
+        'seed': args.seed,
+        'sizes': {},
+    }
+    for size in args.sizes.split(','):
+        result = run_stages(parse_size(size), repeat=args.repeat, seed=args.seed, rpc=args.rpc)
+        results['sizes'][size] = result
+        print(f"{size}: {result['rows']:,} rows, {result['memory_mb']:,.1f} MB")
+        for stage, timing in result['stages'].items():
+            print(f"  {stage:<18}{timing['best']:>10.4f}s  (median {timing['median']:.4f}s)")
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=1)
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(results, json.load(f), args.tolerance)
+        for line in found:
+            print(f"REGRESSION {line}")
+        return 1 if found else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
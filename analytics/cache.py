@@ -0,0 +1,146 @@
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from analytics.data import time_bounds
+
+# Memory budget for computed panel results, shared by every browser session
+RESULT_CACHE_BYTES = int(os.environ.get('SITENUDGE_RESULT_CACHE_MB', 64)) * 1024 ** 2
+
+
+def result_size(value):
+    # Rough bytes held by a cached result: frames and series report their
+    # own usage, containers and plotly figures are summed over their items
+    if hasattr(value, 'to_plotly_json'):
+        return result_size(value.to_plotly_json())
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(value.memory_usage(deep=True).sum() if isinstance(value, pd.DataFrame)
+                   else value.memory_usage(deep=True))
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(result_size(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(result_size(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class ResultCache:
+    """Least-recently-used panel results for the current data snapshot.
+
+    Keys are tuples of whatever the result depends on besides the data;
+    the snapshot version is passed separately, and the first lookup for a
+    newer version drops everything cached for the old one. Lookups from a
+    session still on an older version compute without storing. Entries
+    are evicted oldest first once their combined size passes max_bytes.
+    Cached values are shared, so callers must not modify them.
+    """
+
+    def __init__(self, max_bytes=RESULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, version, key, compute):
+        with self._lock:
+            if self.version is None or version > self.version:
+                self._entries.clear()
+                self._bytes = 0
+                self.version = version
+            if version == self.version and key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+
+        value = compute()
+        size = result_size(value)
+        with self._lock:
+            if version != self.version or size > self.max_bytes:
+                return value
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+        return value
+
+    @property
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._bytes, 'hits': self.hits, 'misses': self.misses}
+
+
+class CachedAggregates:
+    """An aggregates source (aggregates.CubeAggregates or a FunctionAggregates
+    subclass) whose results go through a ResultCache.
+
+    Periods are keyed by the rows of df they cover rather than their exact
+    bounds, so a window that slides with the clock keeps hitting until a
+    row enters or leaves it. In rpc mode there is no df and periods are
+    keyed by their bounds instead, with an end past `latest` (the
+    snapshot's newest session) cut back to it. `tag` tells apart sources
+    that can answer differently for the same rows, such as exact and
+    estimated medians.
+    """
+
+    def __init__(self, source, cache, df, version, tag=(), latest=None):
+        self.source = source
+        self.cache = cache
+        self.df = df
+        self.version = version
+        self.tag = tag
+        self.latest = latest
+
+    def period_key(self, start, end, closed='both'):
+        if self.df is not None:
+            return time_bounds(self.df, start, end, closed)
+        if self.latest is not None and end > self.latest:
+            return (start, self.latest, 'both')
+        return (start, end, closed)
+
+    def _get(self, name, start, end, closed, args, compute):
+        key = (name, self.tag, self.period_key(start, end, closed)) + args
+        return self.cache.get(self.version, key, compute)
+
+    def metrics(self, start, end, state, by=None, closed='both'):
+        return self._get('metrics', start, end, closed, (state, by),
+                         lambda: self.source.metrics(start, end, state, by=by, closed=closed))
+
+    def price_stats(self, start, end, state, closed='both'):
+        return self._get('price_stats', start, end, closed, (state,),
+                         lambda: self.source.price_stats(start, end, state, closed=closed))
+
+    def trend(self, start, end, state, freq, closed='both'):
+        return self._get('trend', start, end, closed, (state, freq),
+                         lambda: self.source.trend(start, end, state, freq, closed=closed))
+
+    def counts(self, start, end, state, by=(), freq=None, closed='both', dropna=True):
+        return self._get('counts', start, end, closed, (state, tuple(by), freq, dropna),
+                         lambda: self.source.counts(start, end, state, by=by, freq=freq, closed=closed, dropna=dropna))
+
+    def visitors(self, start, end, state=None, closed='both'):
+        return self._get('visitors', start, end, closed, (state,),
+                         lambda: self.source.visitors(start, end, state, closed=closed))
+
+    def distribution(self, start, end, sketch, edges, state=None, closed='both'):
+        return self._get('distribution', start, end, closed, (sketch, tuple(edges), state),
+                         lambda: self.source.distribution(start, end, sketch, edges, state=state, closed=closed))
+
+    def top_cities(self, start, end, state, limit, closed='both'):
+        return self._get('top_cities', start, end, closed, (state, limit),
+                         lambda: self.source.top_cities(start, end, state, limit, closed=closed))
+
+    def recent_sessions(self, start, end, state, limit, closed='both'):
+        return self._get('recent_sessions', start, end, closed, (state, limit),
+                         lambda: self.source.recent_sessions(start, end, state, limit, closed=closed))
+
+    def prices(self):
+        return self.cache.get(self.version, ('prices', self.tag), self.source.prices)
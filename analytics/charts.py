@@ -0,0 +1,58 @@
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+from analytics.downsample import downsample
+
+# Trend panels: title and its series as (column, line color, marker color,
+# hover, legend name). The first series is filled, a second one is dashed.
+TREND_PANELS = {
+    "Sessions Over Time": [('sessions', '#3b82f6', '#60a5fa', '%{y} sessions', None)],
+    "Median Time on Site (seconds)": [('median_time', '#10b981', '#34d399', '%{y:.2f}s', None)],
+    "Median Scroll Depth (%)": [('median_scroll', '#8b5cf6', '#a78bfa', '%{y:.2f}%', None)],
+    "Total Clicks Over Time": [('clicks', '#f59e0b', '#fbbf24', '%{y} clicks', None)],
+    "Buy Button Clicks Over Time": [('buy_clicks', '#06b6d4', '#22d3ee', '%{y} buy clicks', None)],
+    "Checkouts Over Time": [('checkouts', '#ef4444', '#f87171', '%{y} checkouts', None)],
+    "Click-Through Rate (CTR) %": [('ctr', '#ec4899', '#f472b6', '%{y:.2f}%', None)],
+    "Checkout Rate (% of buy clicks)": [('checkout_rate', '#14b8a6', '#2dd4bf', '%{y:.2f}%', None)],
+    "Users Who Spend Time (>10 sec)": [('users_10sec', '#22c55e', '#4ade80', '%{y} users', 'Users >10s'),
+                                       ('users_5sec', '#86efac', None, '%{y} users', 'Users >5s')],
+    "Users Who Scroll (>25% depth)": [('users_25scroll', '#a855f7', '#c084fc', '%{y} users', 'Users >25%'),
+                                      ('users_50scroll', '#d8b4fe', None, '%{y} users', 'Users >50%')],
+    "Engagement Rate (% >10 sec)": [('engaged_rate', '#0ea5e9', '#38bdf8', '%{y:.2f}%', None)],
+    "Quality Score (Engaged Rate × CTR / 100)": [('quality_score', '#f97316', '#fb923c', '%{y:.2f}', None)],
+}
+TREND_PANEL_HEIGHT = 220
+
+
+def fill_color(color, alpha=0.15):
+    return f"rgba({int(color[1:3], 16)}, {int(color[3:5], 16)}, {int(color[5:7], 16)}, {alpha})"
+
+
+def trend_figure(trend_data, panels, layout, width):
+    """The chosen TREND_PANELS as one figure, two per row on a shared time axis.
+
+    trend_data is a metrics.build_trend() frame; `layout` is the dashboard's
+    plotly theme and `width` the pixel width of one panel, which sets each
+    series' point budget.
+    """
+    data = trend_data.assign(quality_score=trend_data['engaged_rate'] * trend_data['ctr'] / 100)
+    rows = (len(panels) + 1) // 2
+    height = rows * TREND_PANEL_HEIGHT
+    fig = make_subplots(rows=rows, cols=2, shared_xaxes='all', subplot_titles=panels,
+                        vertical_spacing=60 / height, horizontal_spacing=0.06)
+    for i, title in enumerate(panels):
+        for j, (column, color, marker, hover, name) in enumerate(TREND_PANELS[title]):
+            x, y = downsample(data['date'], data[column], width)
+            if j == 0:
+                trace = go.Scatter(x=x, y=y, mode='lines+markers', line=dict(color=color, width=3),
+                                   marker=dict(size=8, color=marker), fill='tozeroy', fillcolor=fill_color(color))
+            else:
+                trace = go.Scatter(x=x, y=y, mode='lines', line=dict(color=color, width=2, dash='dash'))
+            trace.update(name=name, showlegend=name is not None, hovertemplate=hover + '<extra></extra>')
+            fig.add_trace(trace, row=i // 2 + 1, col=i % 2 + 1)
+    fig.update_layout(**{k: v for k, v in layout.items() if k not in ('xaxis', 'yaxis')}, height=height,
+                      legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1))
+    fig.update_xaxes(**layout['xaxis'])
+    fig.update_yaxes(**layout['yaxis'])
+    fig.update_annotations(font=dict(size=13, color='#e2e8f0'))
+    return fig
@@ -0,0 +1,487 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+from postgrest.exceptions import APIError
+
+log = logging.getLogger(__name__)
+
+TABLE = 'session_sessions'
+WATERMARK_COLUMN = 'started_at'
+
+# Columns the dashboard reads and the dtype each is stored as. None leaves the
+# column as loaded.
+SESSION_COLUMNS = {
+    'session_id': None,
+    'started_at': None,
+    'user_id': None,
+    'visit_number': 'int16',
+    'is_bot': 'boolean',
+    'utm_source': 'category',
+    'device_type': 'category',
+    'city': 'category',
+    'price_shown': 'float64',
+    'version': 'category',
+    'hero_test_id': 'category',
+    'hero_variant': 'category',
+    'social_proof_variant': 'category',
+    'scroll_hook_variant': 'category',
+    'time_on_site_sec': 'float32',
+    'scroll_depth_pct': 'int8',
+    'clicks_total': 'int32',
+    'clicked_buy': 'boolean',
+    'initiated_checkout': 'boolean',
+    'purchased': 'boolean',
+}
+
+# Columns only some collapsed sections read. They stay out of the first load
+# and are fetched the first time one of those sections is shown (see
+# SessionStore.require).
+LAZY_COLUMNS = ('city',)
+SECTION_COLUMNS = {
+    'distribution_charts': ('city',),
+    'recent_sessions': ('started_at', 'device_type', 'city', 'time_on_site_sec', 'scroll_depth_pct',
+                        'clicked_buy', 'hero_variant', 'social_proof_variant'),
+}
+
+# The select list of every load, instead of '*'
+BASE_COLUMNS = tuple(column for column in SESSION_COLUMNS if column not in LAZY_COLUMNS)
+
+UNDEFINED_COLUMN = '42703'
+
+# Landing page launches, oldest first. Sessions with no recorded version get
+# the label of the latest launch at or before their started_at.
+BASE_VERSION = 'V1.0'
+VERSION_LAUNCHES = (
+    (pd.Timestamp('2025-12-10 12:00', tz='UTC'), 'V2.0'),
+)
+
+# How often the loaded frame is written back to the on-disk snapshot
+SNAPSHOT_INTERVAL = timedelta(minutes=10)
+
+# A cold start trusts a snapshot whose frame matched the whole table at most
+# this long ago (and reconciles it on the next refresh); anything older is
+# skipped for a full read
+SNAPSHOT_MAX_AGE = timedelta(hours=6)
+
+# Seconds between background refreshes
+REFRESH_INTERVAL = 15
+
+# Sessions keep being updated (time on site, scroll, clicks) after they start,
+# so every delta re-reads this much history behind the watermark.
+DELTA_LOOKBACK = timedelta(minutes=30)
+
+# Rows past the lookback are never re-read by a delta, so an update that lands
+# later (a tab left open for hours, a backfill, a deleted bot) would stay
+# stale. The whole table is read again this often and replaces the frame.
+RECONCILE_INTERVAL = timedelta(hours=1)
+
+# PostgREST caps every response (1000 rows by default), so larger reads are
+# split into started_at windows fetched concurrently. Pages within a window
+# still use .range(), which Postgres runs as OFFSET, so each window is sized
+# to about WINDOW_PAGES pages and no page skips more rows than its window holds.
+PAGE_SIZE = 1000
+MAX_WORKERS = 4
+WINDOW_PAGES = 8
+
+
+def fetch_rows(client, table=TABLE, columns='*', since=None, page_size=PAGE_SIZE, max_workers=MAX_WORKERS,
+               window_pages=WINDOW_PAGES):
+    # Windows are cut from started_at, so every row carries it
+    if columns != '*' and WATERMARK_COLUMN not in columns.split(','):
+        columns = f"{columns},{WATERMARK_COLUMN}"
+
+    def query(select=columns, count=None):
+        query = client.table(table).select(select, count=count)
+        if since is not None:
+            query = query.gt(WATERMARK_COLUMN, since.isoformat())
+        return query
+
+    def page(query, start, size):
+        # session_id breaks started_at ties so pages never overlap or skip rows
+        query = query.order(WATERMARK_COLUMN).order('session_id')
+        return query.range(start, start + size - 1).execute()
+
+    first = page(query(count='exact'), 0, page_size)
+    rows = first.data or []
+    total = first.count or 0
+    if not rows or len(rows) >= total:
+        return rows
+
+    # The server may cap pages below page_size; the first page shows the real
+    # size. Its rows up to the last started_at are kept, and the windows take
+    # over from that timestamp so a tie is never split between the two.
+    step = len(rows)
+    times = pd.to_datetime([row[WATERMARK_COLUMN] for row in rows], utc=True)
+    rows = rows[:times.searchsorted(times[-1])]
+    lo = times[-1]
+    newest = query(WATERMARK_COLUMN).order(WATERMARK_COLUMN, desc=True).limit(1).execute().data
+    hi = pd.Timestamp(newest[0][WATERMARK_COLUMN]) if newest else lo
+    count = max(1, -(-(total - len(rows)) // (step * window_pages))) if hi > lo else 1
+    edges = [lo + (hi - lo) * i / count for i in range(count + 1)]
+
+    def window(i):
+        def bounded():
+            # The last window is closed so the newest row is included
+            q = query().gte(WATERMARK_COLUMN, edges[i].isoformat())
+            if i == count - 1:
+                return q.lte(WATERMARK_COLUMN, hi.isoformat())
+            return q.lt(WATERMARK_COLUMN, edges[i + 1].isoformat())
+
+        found = []
+        while True:
+            data = page(bounded(), len(found), step).data or []
+            found.extend(data)
+            if len(data) < step:
+                return found
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, count))) as pool:
+        for data in pool.map(window, range(count)):
+            rows.extend(data)
+    return rows
+
+
+def apply_schema(df, schema=SESSION_COLUMNS):
+    for col, dtype in schema.items():
+        if col not in df.columns or dtype is None:
+            continue
+        values = df[col]
+        if dtype == 'boolean':
+            # A missing flag means the event never fired, which is how every
+            # `== True` / `!= True` check in the dashboard already reads it
+            df[col] = values.astype('boolean').fillna(False)
+        elif dtype.startswith('int'):
+            # Small ints only when every value fits; nulls keep NaN semantics
+            # in comparisons, so those columns fall back to float32
+            info = np.iinfo(dtype)
+            fits = values.notna().all() and (values.empty or info.min <= values.min() and values.max() <= info.max)
+            df[col] = values.astype(dtype if fits else 'float32')
+        else:
+            df[col] = values.astype(dtype)
+    return df
+
+
+def classify_versions(started_at, launches=VERSION_LAUNCHES, base=BASE_VERSION):
+    bounds = pd.DatetimeIndex([launched for launched, _ in launches])
+    labels = [base] + [label for _, label in launches]
+    codes = bounds.searchsorted(pd.DatetimeIndex(started_at), side='right')
+    return pd.Categorical.from_codes(codes, categories=labels)
+
+
+def fill_versions(df):
+    if df.empty:
+        return df
+    if 'version' not in df.columns:
+        df['version'] = classify_versions(df['started_at'])
+    elif df['version'].isna().any():
+        missing = df['version'].isna().to_numpy()
+        version = df['version'].astype(object).to_numpy()
+        version[missing] = np.asarray(classify_versions(df['started_at'].iloc[missing]))
+        df['version'] = version
+    return df
+
+
+def frame_memory(df):
+    return int(df.memory_usage(deep=True).sum())
+
+
+def concat_frames(head, tail):
+    # concat only keeps a categorical when both sides share categories
+    head, tail = head.copy(deep=False), tail.copy(deep=False)
+    for col in head.columns.intersection(tail.columns):
+        a, b = head[col], tail[col]
+        if isinstance(a.dtype, pd.CategoricalDtype) and isinstance(b.dtype, pd.CategoricalDtype) and a.dtype != b.dtype:
+            categories = union_categoricals([a, b]).categories
+            head[col] = a.cat.set_categories(categories)
+            tail[col] = b.cat.set_categories(categories)
+    return pd.concat([head, tail], ignore_index=True)
+
+
+def time_bounds(df, start, end, closed='both'):
+    # The store keeps rows sorted by started_at, so any period is one
+    # contiguous block of rows found by binary search
+    times = df[WATERMARK_COLUMN]
+    lo = times.searchsorted(start, side='left')
+    hi = times.searchsorted(end, side='right' if closed == 'both' else 'left')
+    return lo, hi
+
+
+def _same_rows(a, b):
+    if len(a) != len(b) or list(a.columns) != list(b.columns):
+        return False
+    # object comparison when dtypes differ, so differing category sets don't
+    # count as a change
+    a, b = a.reset_index(drop=True), b.reset_index(drop=True)
+    return all(a[col].equals(b[col]) if a[col].dtype == b[col].dtype else
+               a[col].astype(object).equals(b[col].astype(object)) for col in a.columns)
+
+
+def rows_to_frame(rows):
+    if not rows:
+        return pd.DataFrame()
+    df = pd.DataFrame(rows)
+    df['started_at'] = pd.to_datetime(df['started_at'], utc=True)
+    return df
+
+
+class SessionStore:
+    """Keeps the loaded sessions frame and tops it up from a started_at watermark."""
+
+    def __init__(self, client, table=TABLE, columns=BASE_COLUMNS, lookback=DELTA_LOOKBACK,
+                 page_size=PAGE_SIZE, max_workers=MAX_WORKERS, snapshots=None, reconcile=RECONCILE_INTERVAL):
+        self.client = client
+        self.table = table
+        self.declared_columns = list(columns)
+        self.columns = list(columns)
+        # Columns a section asked for that the table doesn't have
+        self.absent = set()
+        self.lookback = lookback
+        self.page_size = page_size
+        self.max_workers = max_workers
+        self.snapshots = snapshots
+        self.reconcile = reconcile
+        self.df = pd.DataFrame()
+        self.watermark = None
+        # When the frame last matched the whole table (UTC)
+        self.reconciled_at = None
+        self._lock = threading.Lock()
+        self._use_snapshot = snapshots is not None
+        self._saved_at = None
+        # Where the last refresh started changing rows; None after a full replace
+        self.changed_since = None
+        # Frame size straight off the wire vs. after apply_schema, in bytes
+        self.memory = {'raw': None, 'typed': None}
+
+    def invalidate(self):
+        with self._lock:
+            self.df = pd.DataFrame()
+            self.watermark = None
+            self.columns = list(self.declared_columns)
+            self.absent = set()
+            # An explicit reload has to hit the database, not the snapshot
+            self._use_snapshot = False
+
+    def require(self, columns):
+        # Returns True when the frame gained columns and callers should re-read it
+        with self._lock:
+            missing = [c for c in columns if c not in self.columns and c not in self.absent]
+            if not missing:
+                return False
+            if not self.df.empty:
+                try:
+                    extra = self._fetch_extra(missing)
+                except APIError as e:
+                    if e.code != UNDEFINED_COLUMN:
+                        raise
+                    # Older tables lack some section columns - add whichever ones exist
+                    sample = self.client.table(self.table).select('*').limit(1).execute().data or [{}]
+                    self.absent.update(c for c in missing if c not in sample[0])
+                    missing = [c for c in missing if c in sample[0]]
+                    if not missing:
+                        return False
+                    extra = self._fetch_extra(missing)
+                self.df = self.df.merge(extra, on='session_id', how='left')
+            self.columns += missing
+            return True
+
+    def refresh(self):
+        with self._lock:
+            from_snapshot = False
+            if self.watermark is None and self._use_snapshot:
+                self._use_snapshot = False
+                loaded = self.snapshots.load(self.columns, reconciled_since=datetime.now(timezone.utc) - SNAPSHOT_MAX_AGE)
+                if loaded is not None:
+                    df, watermark, self.reconciled_at = loaded
+                    self._replace(fill_versions(df), watermark)
+                    self._saved_at = time.monotonic()
+                    self.memory = {'raw': None, 'typed': frame_memory(self.df)}
+                    from_snapshot = True
+
+            if self.watermark is None:
+                self._replace(self._fetch(measure=True))
+                self.reconciled_at = datetime.now(timezone.utc)
+                self._save_snapshot(force=True)
+                return self.df
+
+            # A snapshot is served (plus a delta) first and reconciled on the next refresh
+            due = self.reconciled_at is None or datetime.now(timezone.utc) - self.reconciled_at >= self.reconcile
+            if due and not from_snapshot:
+                self._reconcile()
+                return self.df
+
+            since = self.watermark - self.lookback
+            delta = self._fetch(since=since)
+            if delta.empty:
+                return self.df
+            if set(delta.columns) != set(self.df.columns):
+                # Table schema changed under us - start over
+                self._replace(self._fetch(measure=True))
+                self._save_snapshot(force=True)
+            else:
+                self._merge(delta, since)
+                self._save_snapshot()
+            return self.df
+
+    def _reconcile(self):
+        # A full read in place of the delta. An unchanged table keeps the frame
+        # (and its identity); otherwise it is replaced and rolled up afresh.
+        df = self._fetch(measure=True)
+        self.reconciled_at = datetime.now(timezone.utc)
+        if not _same_rows(self.df, df.sort_values(WATERMARK_COLUMN, kind='stable').reset_index(drop=True)):
+            self._replace(df)
+            self._save_snapshot(force=True)
+
+    def _fetch(self, since=None, measure=False):
+        try:
+            df = self._fetch_columns(self.columns, since=since)
+        except APIError as e:
+            if e.code != UNDEFINED_COLUMN:
+                raise
+            # Older tables lack some declared columns - keep whichever ones exist
+            df = self._fetch_columns(['*'], since=since)
+            self.columns = [c for c in self.columns if c in df.columns]
+            if not df.empty:
+                df = df[self.columns]
+        if measure:
+            raw = frame_memory(df)
+        df = apply_schema(fill_versions(df))
+        if measure:
+            self.memory = {'raw': raw, 'typed': frame_memory(df)}
+        return df
+
+    def _fetch_columns(self, columns, since=None):
+        return rows_to_frame(fetch_rows(self.client, self.table, columns=','.join(columns), since=since,
+                                        page_size=self.page_size, max_workers=self.max_workers))
+
+    def _fetch_extra(self, columns):
+        # `columns` for every loaded session, keyed on session_id
+        rows = fetch_rows(self.client, self.table, columns=','.join(['session_id'] + columns),
+                          page_size=self.page_size, max_workers=self.max_workers)
+        return apply_schema(pd.DataFrame(rows, columns=['session_id'] + columns))
+
+    def _replace(self, df, watermark=None, changed_since=None):
+        if not df.empty and not df[WATERMARK_COLUMN].is_monotonic_increasing:
+            df = df.sort_values(WATERMARK_COLUMN, kind='stable')
+        self.df = df.reset_index(drop=True)
+        if watermark is None and not df.empty:
+            watermark = df[WATERMARK_COLUMN].max()
+        self.watermark = watermark
+        self.changed_since = changed_since
+
+    def _save_snapshot(self, force=False):
+        if self.snapshots is None or self.df.empty:
+            return
+        due = self._saved_at is None or time.monotonic() - self._saved_at >= SNAPSHOT_INTERVAL.total_seconds()
+        if force or due:
+            self.snapshots.save(self.df, self.watermark, self.reconciled_at)
+            self._saved_at = time.monotonic()
+
+    def _merge(self, delta, since):
+        # The frame is sorted by started_at and the delta holds every row newer
+        # than `since`, so it replaces the tail outright - no dedupe pass needed.
+        keep = self.df[WATERMARK_COLUMN].searchsorted(since, side='right')
+        if _same_rows(self.df.iloc[keep:], delta):
+            # Nothing changed inside the lookback; keep the frame (and its identity)
+            return
+        self._replace(concat_frames(self.df.iloc[:keep], delta), changed_since=since)
+
+
+class SessionSnapshot(NamedTuple):
+    df: pd.DataFrame
+    version: int
+    refreshed_at: datetime
+    rollup: object = None
+
+
+class SessionRefresher:
+    """Refreshes a SessionStore on a background thread.
+
+    Readers always get the last published snapshot straight away; a refresh
+    that changes the frame publishes a new one in a single assignment. Only
+    this thread talks to the database, so every browser session shares the
+    same in-flight fetch. When given a `rollup` class (see rollup.RollupCube)
+    it is built once and then updated from the rows each refresh replaced.
+    """
+
+    def __init__(self, store, interval=REFRESH_INTERVAL, rollup=None):
+        self.store = store
+        self.interval = interval
+        self.rollup = rollup
+        self.snapshot = None
+        self.error = None
+        self._wake = threading.Event()
+        self._ready = threading.Event()
+        self._publish_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name='session-refresher', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def latest(self, timeout=None):
+        # Only the very first load makes callers wait
+        self._ready.wait(timeout)
+        return self.snapshot
+
+    def refresh_now(self):
+        self._wake.set()
+
+    def invalidate(self):
+        # Keeps serving the old frame until the full reload lands
+        self.store.invalidate()
+        self.refresh_now()
+
+    def require(self, columns):
+        # Runs on a script thread, so it holds the publish lock while the store
+        # fetches; the refresher then publishes the frame with these columns
+        with self._publish_lock:
+            current = self.snapshot
+            # A refresh that replaced the frame but hasn't published yet would
+            # leave the current rollup behind; that refresh publishes instead
+            behind = current is None or self.store.df is not current.df
+            if not self.store.require(columns):
+                return False
+            if not behind:
+                # Same rows, just more columns - the rollup still holds
+                self._publish(self.store.df, current.rollup)
+            return True
+
+    def _run(self):
+        while True:
+            try:
+                df = self.store.refresh()
+                rollup = self._rollup(df)
+                with self._publish_lock:
+                    # require() may have added columns since refresh() returned
+                    self._publish(self.store.df, rollup)
+                self.error = None
+            except Exception as e:
+                log.exception("Session refresh failed")
+                self.error = e
+            self._ready.set()
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def _rollup(self, df):
+        current = self.snapshot
+        if self.rollup is None or df.empty:
+            return None
+        if current is not None and current.df is df:
+            return current.rollup
+        if current is not None and current.rollup is not None and self.store.changed_since is not None:
+            return current.rollup.update(df, self.store.changed_since)
+        return self.rollup.build(df)
+
+    def _publish(self, df, rollup=None):
+        current = self.snapshot
+        if current is not None and current.df is df and current.rollup is rollup:
+            version = current.version
+        else:
+            version = current.version + 1 if current is not None else 1
+        self.snapshot = SessionSnapshot(df, version, datetime.now(timezone.utc), rollup)
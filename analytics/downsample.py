@@ -0,0 +1,51 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# Most points a line chart is given per pixel of its width; longer series
+# are thinned with LTTB
+POINTS_PER_PIXEL = float(os.environ.get('SITENUDGE_POINTS_PER_PIXEL', 0.5))
+
+
+def point_budget(width, per_pixel=POINTS_PER_PIXEL):
+    return max(3, int(width * per_pixel))
+
+
+def lttb(x, y, threshold):
+    """Indices of the points Largest-Triangle-Three-Buckets keeps out of (x, y).
+
+    The first and last points always stay. The rest are split into
+    threshold - 2 buckets and each bucket keeps the point that forms the
+    largest triangle with the previous pick and the next bucket's average,
+    which preserves peaks and dips. Series no longer than threshold are
+    returned whole.
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype='float64')
+    y = np.nan_to_num(np.asarray(y, dtype='float64'))
+    # Bucket i holds points edges[i]:edges[i + 1]; the last one ends just before the final point
+    edges = np.linspace(1, n - 1, threshold - 1).astype('int64')
+    keep = np.empty(threshold, dtype='int64')
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            cx, cy = x[hi:edges[i + 2]].mean(), y[hi:edges[i + 2]].mean()
+        else:
+            cx, cy = x[n - 1], y[n - 1]
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(area.argmax())
+        keep[i + 1] = a
+    return keep
+
+
+def downsample(x, y, width, per_pixel=POINTS_PER_PIXEL):
+    # (x, y) thinned to the point budget of a chart `width` pixels wide
+    x, y = pd.Series(x).reset_index(drop=True), pd.Series(y).reset_index(drop=True)
+    positions = x.astype('int64') if pd.api.types.is_datetime64_any_dtype(x) else x
+    keep = lttb(positions.to_numpy(), y.to_numpy(), point_budget(width, per_pixel))
+    return x.iloc[keep], y.iloc[keep]
@@ -0,0 +1,80 @@
+import threading
+from dataclasses import dataclass, fields
+from typing import Optional
+
+import numpy as np
+
+
+@dataclass(frozen=True)
+class FilterState:
+    """Global filter widgets; None/False means the filter is off."""
+    exclude_bots: bool = True
+    tiktok_only: bool = False
+    price: Optional[float] = None
+    version: Optional[str] = None
+    test_id: Optional[str] = None
+
+    def active(self):
+        return tuple((f.name, getattr(self, f.name)) for f in fields(self)
+                     if getattr(self, f.name) not in (None, False))
+
+
+# Column each predicate reads and how it turns the widget value into a row mask
+PREDICATES = {
+    'exclude_bots': ('is_bot', lambda col, _: (col != True).to_numpy(dtype=bool)),
+    'tiktok_only': ('utm_source', lambda col, _: (col == 'tiktok').to_numpy(dtype=bool)),
+    'price': ('price_shown', lambda col, price: (col == price).to_numpy(dtype=bool)),
+    'version': ('version', lambda col, version: (col == version).to_numpy(dtype=bool)),
+    'test_id': ('hero_test_id', lambda col, test_id: (col == test_id).to_numpy(dtype=bool)),
+}
+
+
+def state_mask(df, state):
+    # Uncached FilterState mask, for small frames such as rollup cells
+    combined = np.ones(len(df), dtype=bool)
+    for name, value in state.active():
+        column, predicate = PREDICATES[name]
+        if column in df.columns:
+            combined &= predicate(df[column], value)
+    return combined
+
+
+class FilterEngine:
+    """Combined row mask for a FilterState over one frame.
+
+    Each (predicate, value) mask is computed once per frame and kept, so
+    flipping one widget only evaluates that predicate; the rest is an AND
+    of cached arrays. Masks cover the whole frame, which lets the current
+    and comparison windows share them by position.
+    """
+
+    def __init__(self):
+        self._df = None
+        self._masks = {}
+        self._combined = {}
+        self._lock = threading.Lock()
+
+    def mask(self, df, state):
+        with self._lock:
+            if df is not self._df:
+                self._df, self._masks, self._combined = df, {}, {}
+            combined = self._combined.get(state)
+            if combined is None:
+                combined = np.ones(len(df), dtype=bool)
+                for name, value in state.active():
+                    column, predicate = PREDICATES[name]
+                    if column not in df.columns:
+                        continue
+                    key = (name, value)
+                    if key not in self._masks:
+                        self._masks[key] = predicate(df[column], value)
+                    combined &= self._masks[key]
+                self._combined[state] = combined
+            return combined
+
+
+def select(df, bounds, mask=None):
+    # Rows lo:hi of df (see data.time_bounds), optionally narrowed by a full-frame mask
+    lo, hi = bounds
+    window = df.iloc[lo:hi]
+    return window if mask is None else window[mask[lo:hi]]
@@ -0,0 +1,161 @@
+import numpy as np
+import pandas as pd
+
+EMPTY_METRICS = {'sessions': 0, 'median_time': 0, 'median_scroll': 0, 'total_clicks': 0,
+                 'clicked_buy': 0, 'initiated_checkout': 0, 'purchased': 0, 'bounce_rate': 0, 'engaged_sessions': 0}
+
+# Sessions longer than this are treated as tabs left open and ignored for median time
+MAX_SESSION_SEC = 1800
+
+
+def _column(df, name):
+    if name in df.columns:
+        return df[name]
+    return pd.Series(0, index=df.index)
+
+
+def metric_inputs(df):
+    # Per-row inputs behind every metric, shared by the grouped and scalar paths
+    time_col = _column(df, 'time_on_site_sec').astype('float64')
+    scroll_col = _column(df, 'scroll_depth_pct').astype('float64')
+    return pd.DataFrame({
+        'valid_time': time_col.where((time_col > 0) & (time_col <= MAX_SESSION_SEC)),
+        'valid_scroll': scroll_col.where(scroll_col > 0),
+        'total_clicks': _column(df, 'clicks_total'),
+        'clicked_buy': _column(df, 'clicked_buy').astype('int64'),
+        'initiated_checkout': _column(df, 'initiated_checkout').astype('int64'),
+        'purchased': _column(df, 'purchased').astype('int64'),
+        'bounce': ((time_col == 0) | (scroll_col == 0)).astype('int64'),
+        'engaged': ((time_col > 10) & (scroll_col > 25)).astype('int64'),
+    }, index=df.index)
+
+
+def grouped_metrics(df, by):
+    """calculate_metrics() for every group of `by` in a single groupby pass.
+
+    `by` is a column name, an array aligned with df, or a list of either.
+    Returns one row per non-empty group, indexed by the group keys.
+    """
+    keys = by if isinstance(by, list) else [by]
+    keys = [df[key] if isinstance(key, str) else key for key in keys]
+    return metrics_table(metric_inputs(df).groupby(keys, observed=True, sort=True).agg(
+        sessions=('bounce', 'size'),
+        median_time=('valid_time', 'median'),
+        median_scroll=('valid_scroll', 'median'),
+        total_clicks=('total_clicks', 'sum'),
+        clicked_buy=('clicked_buy', 'sum'),
+        initiated_checkout=('initiated_checkout', 'sum'),
+        purchased=('purchased', 'sum'),
+        bounces=('bounce', 'sum'),
+        engaged_sessions=('engaged', 'sum'),
+    ))
+
+
+def metrics_table(totals):
+    # grouped_metrics() columns from per-group sums and medians, whether they
+    # came from raw rows or from the rollup cube
+    table = totals.copy()
+    table[['median_time', 'median_scroll']] = table[['median_time', 'median_scroll']].fillna(0)
+    table['bounce_rate'] = table['bounces'] / table['sessions'] * 100
+    return table[list(EMPTY_METRICS)]
+
+
+def metrics_row(table, key):
+    # One row of a grouped_metrics() table as a calculate_metrics() dict
+    if key not in table.index:
+        return dict(EMPTY_METRICS)
+    return {name: table[name].loc[key] for name in EMPTY_METRICS}
+
+
+def calculate_metrics(df):
+    if df.empty:
+        return dict(EMPTY_METRICS)
+    return metrics_row(grouped_metrics(df, np.zeros(len(df), dtype=np.int8)), 0)
+
+
+def summary_metrics(totals):
+    # calculate_metrics() dict from one set of sums and medians (see rollup.RollupCube.query)
+    if not totals['sessions']:
+        return dict(EMPTY_METRICS)
+    metrics = {name: totals[name] for name in EMPTY_METRICS if name in totals}
+    for name in ('median_time', 'median_scroll'):
+        if pd.isna(metrics[name]):
+            metrics[name] = 0
+    metrics['bounce_rate'] = totals['bounces'] / totals['sessions'] * 100
+    return metrics
+
+
+def calculate_ab_stats(df, variant_col):
+    if variant_col not in df.columns or df.empty:
+        return None
+    return ab_table(grouped_metrics(df, variant_col))
+
+
+def ab_table(table):
+    # calculate_ab_stats() frame from a grouped_metrics() table indexed by variant
+    return pd.DataFrame({
+        'variant': table.index.astype(object),
+        'sessions': table['sessions'].to_numpy(),
+        'median_time': table['median_time'].to_numpy(),
+        'median_scroll': table['median_scroll'].to_numpy(),
+        'clicked_buy': table['clicked_buy'].to_numpy(),
+        'click_rate': (table['clicked_buy'] / table['sessions'] * 100).to_numpy(),
+        'bounce_rate': table['bounce_rate'].to_numpy(),
+        'engaged': table['engaged_sessions'].to_numpy(),
+    })
+
+
+def build_trend(df, freq):
+    """Per-bucket trend table for the Trend Analysis charts.
+
+    Threshold counts are sums of indicator columns and the filtered medians
+    run over masked columns, so the whole table is one groupby with no
+    per-group Python calls.
+    """
+    inputs = metric_inputs(df)
+    time_col = _column(df, 'time_on_site_sec')
+    scroll_col = _column(df, 'scroll_depth_pct')
+    frame = pd.DataFrame({
+        'valid_time': inputs['valid_time'],
+        'valid_scroll': inputs['valid_scroll'],
+        'users_5sec': (time_col > 5).astype('int64'),
+        'users_10sec': (time_col > 10).astype('int64'),
+        'users_25scroll': (scroll_col > 25).astype('int64'),
+        'users_50scroll': (scroll_col > 50).astype('int64'),
+        'total_clicks': inputs['total_clicks'],
+        'clicked_buy': inputs['clicked_buy'],
+        'initiated_checkout': inputs['initiated_checkout'],
+    }, index=df.index)
+    return trend_table(frame.groupby(df['started_at'].dt.floor(freq)).agg(
+        sessions=('total_clicks', 'size'),
+        median_time=('valid_time', 'median'),
+        users_5sec=('users_5sec', 'sum'),
+        users_10sec=('users_10sec', 'sum'),
+        median_scroll=('valid_scroll', 'median'),
+        users_25scroll=('users_25scroll', 'sum'),
+        users_50scroll=('users_50scroll', 'sum'),
+        total_clicks=('total_clicks', 'sum'),
+        clicked_buy=('clicked_buy', 'sum'),
+        initiated_checkout=('initiated_checkout', 'sum'),
+    ))
+
+
+def trend_table(totals):
+    # build_trend() frame from per-bucket sums and medians, indexed by bucket
+    trend = pd.DataFrame({
+        'sessions': totals['sessions'],
+        'median_time': totals['median_time'].fillna(0),
+        'users_5sec': totals['users_5sec'],
+        'users_10sec': totals['users_10sec'],
+        'median_scroll': totals['median_scroll'].fillna(0),
+        'users_25scroll': totals['users_25scroll'],
+        'users_50scroll': totals['users_50scroll'],
+        'clicks': totals['total_clicks'],
+        'buy_clicks': totals['clicked_buy'],
+        'checkouts': totals['initiated_checkout'],
+    }).rename_axis('date').reset_index()
+
+    trend['ctr'] = (trend['buy_clicks'] / trend['sessions'] * 100).fillna(0)
+    trend['checkout_rate'] = (trend['checkouts'] / trend['buy_clicks'] * 100).fillna(0)
+    trend['engaged_rate'] = (trend['users_10sec'] / trend['sessions'] * 100).fillna(0)
+    return trend
@@ -0,0 +1,429 @@
+import os
+from functools import reduce
+
+import numpy as np
+import pandas as pd
+
+from analytics.backends import get_backend
+from analytics.data import WATERMARK_COLUMN, concat_frames, frame_memory, time_bounds
+from analytics.filters import state_mask
+from analytics.metrics import MAX_SESSION_SEC, _column, metric_inputs
+
+# Columns the global filters test (see filters.PREDICATES). Every cube table
+# is keyed on these; utm_source only as 'tiktok' or missing, which is all
+# the tiktok_only filter asks of it
+FILTER_DIMENSIONS = ('version', 'price_shown', 'utm_source', 'is_bot', 'hero_test_id')
+
+# Columns a panel breaks down by. Each gets its own marginal tables, keyed on
+# the filter dimensions plus that one column, so no cell crosses two of them.
+# Only the A/B panels read medians per group, so only the variants get sketches.
+BREAKDOWNS = ('device_type', 'utm_source', 'hero_variant', 'social_proof_variant', 'scroll_hook_variant')
+SKETCHED_BREAKDOWNS = ('hero_variant', 'social_proof_variant', 'scroll_hook_variant')
+
+# The latest HOURLY_DAYS calendar days keep hourly cells; older rows are
+# rolled up by day
+HOURLY_DAYS = 2
+
+MEASURES = ['sessions', 'total_clicks', 'clicked_buy', 'initiated_checkout', 'purchased', 'bounces',
+            'engaged_sessions', 'users_5sec', 'users_10sec', 'users_25scroll', 'users_50scroll',
+            'new_visitors', 'returning_visitors']
+
+# Fixed-bin histograms of the median inputs. Bins are closed on the right and
+# a value is read back as its bin's upper edge, so whole seconds under two
+# minutes and every scroll percentage are exact; longer sessions are off by
+# at most the bin width (5s up to ten minutes, 30s after that).
+TIME_EDGES = np.concatenate([np.arange(0, 120), np.arange(120, 600, 5),
+                             np.arange(600, MAX_SESSION_SEC + 1, 30)]).astype('float64')
+SCROLL_EDGES = np.arange(0, 101).astype('float64')
+SKETCHES = {
+    'time': ('valid_time', TIME_EDGES),
+    'scroll': ('valid_scroll', SCROLL_EDGES),
+}
+
+# quantiles= for RollupCube.query: (output column, sketch, quantile)
+MEDIANS = (('median_time', 'time', 0.5), ('median_scroll', 'scroll', 0.5))
+
+# HyperLogLog registers per filter cell for unique visitors, so merging a
+# window touches cells x registers rather than every session. A cell keeps
+# 2**precision uint8 ranks (16KB at 14) once that is smaller than its set
+# registers packed one uint32 each, which most cells never reach. About
+# 1.04 / sqrt(2**precision) relative error (0.8% at 14). Windows of up to
+# EXACT_VISITOR_ROWS rows count the raw user_ids instead.
+HLL_PRECISION = int(os.environ.get('SITENUDGE_HLL_PRECISION', 14))
+EXACT_VISITOR_ROWS = 20_000
+
+
+def _bit_length(values):
+    # Exact for uint64: each 32-bit half converts to float64 without rounding
+    high, low = (values >> np.uint64(32)).astype('float64'), (values & np.uint64(0xFFFFFFFF)).astype('float64')
+    return np.where(high > 0, 32 + np.frexp(high)[1], np.frexp(low)[1])
+
+
+def hll_registers(user_ids, precision=HLL_PRECISION):
+    # Register and rank for each (non-null) user id: the top `precision` hash
+    # bits pick the register, the rank is one past the leading zeros of the rest
+    hashed = pd.util.hash_pandas_object(user_ids.astype(object), index=False).to_numpy()
+    bits = 64 - precision
+    register = (hashed >> np.uint64(bits)).astype('uint16')
+    rank = bits + 1 - _bit_length(hashed & np.uint64((1 << bits) - 1))
+    return pd.DataFrame({'register': register, 'rank': rank.astype('int8')}, index=user_ids.index)
+
+
+def hll_estimate(filled, inverse_sum, precision=HLL_PRECISION):
+    # Distinct count from, per group, how many registers are set and the sum
+    # of 2**-rank over them; unset registers count as rank 0
+    m = 1 << precision
+    alpha = 0.7213 / (1 + 1.079 / m)
+    empty = m - filled
+    raw = alpha * m * m / (inverse_sum + empty)
+    # Linear counting is more accurate while many registers are still empty
+    small = (raw <= 2.5 * m) & (empty > 0)
+    return np.where(small, m * np.log(m / np.maximum(empty, 1)), raw)
+
+
+def pack_registers(sparse, keys, precision=HLL_PRECISION):
+    # (keys, register, rank) rows to one row per key with a 'registers'
+    # array: its set registers as register << 8 | rank (uint32), or every
+    # register's rank (uint8) when that is smaller
+    group = sparse.groupby(keys, observed=True, dropna=False, sort=False).ngroup().to_numpy()
+    order = np.argsort(group, kind='stable')
+    packed = sparse['register'].to_numpy('uint32')[order] << 8 | sparse['rank'].to_numpy('uint32')[order]
+    starts = np.flatnonzero(np.diff(group[order], prepend=-1))
+    registers = np.empty(len(starts), dtype=object)
+    for i, cell in enumerate(np.split(packed, starts[1:])):
+        if 4 * len(cell) < 1 << precision:
+            registers[i] = cell.copy()
+        else:
+            registers[i] = np.zeros(1 << precision, dtype='uint8')
+            registers[i][cell >> 8] = cell.astype('uint8')
+    table = sparse[keys].iloc[order[starts]].reset_index(drop=True)
+    table['registers'] = registers
+    return table
+
+
+def merge_registers(registers, group, groups, precision=HLL_PRECISION):
+    # Register-wise max of the cells in each of `groups` groups, as a dense
+    # (groups x registers) matrix; group -1 cells are left out
+    merged = np.zeros((groups, 1 << precision), dtype='uint8')
+    cells, group = registers[group >= 0], group[group >= 0]
+    dense = np.array([cell.dtype == np.uint8 for cell in cells], dtype=bool)
+    for cell, g in zip(cells[dense], group[dense]):
+        np.maximum(merged[g], cell, out=merged[g])
+    if not dense.all():
+        packed = np.concatenate(list(cells[~dense]))
+        rows = np.repeat(group[~dense], [len(cell) for cell in cells[~dense]])
+        np.maximum.at(merged, (rows, packed >> 8), packed.astype('uint8'))
+    return merged
+
+
+def table_name(table, breakdown=None):
+    # 'cells', 'time', 'scroll', 'visitors', or a breakdown's marginal 'cells:device_type'
+    return f'{table}:{breakdown}' if breakdown else table
+
+
+def daily_boundary(df):
+    # Rows before this start of day are rolled up by day, later ones by hour
+    if df.empty:
+        return None
+    return df[WATERMARK_COLUMN].iloc[-1].floor('D') - pd.Timedelta(days=HOURLY_DAYS - 1)
+
+
+def rollup_tables(df, daily_before=None, precision=HLL_PRECISION, backend=None, names=None):
+    # Cube tables for raw session rows, keyed on the time bucket (the hour,
+    # or the day for rows before daily_before) and FILTER_DIMENSIONS:
+    # MEASURES summed per cell, per sketch a row count per cell and bin, the
+    # HLL registers of each cell's user ids, and per breakdown the same
+    # sums (and sketches) with that column added to the key. `names` limits
+    # which tables are built. The group-bys run on `backend` (see backends).
+    backend = backend or get_backend()
+
+    def wanted(name):
+        return names is None or name in names
+
+    inputs = metric_inputs(df)
+    time_col = _column(df, 'time_on_site_sec')
+    scroll_col = _column(df, 'scroll_depth_pct')
+    visit_col = _column(df, 'visit_number')
+    measures = pd.DataFrame({
+        'sessions': np.ones(len(df), dtype='int64'),
+        'total_clicks': inputs['total_clicks'],
+        'clicked_buy': inputs['clicked_buy'],
+        'initiated_checkout': inputs['initiated_checkout'],
+        'purchased': inputs['purchased'],
+        'bounces': inputs['bounce'],
+        'engaged_sessions': inputs['engaged'],
+        'users_5sec': (time_col > 5).astype('int64'),
+        'users_10sec': (time_col > 10).astype('int64'),
+        'users_25scroll': (scroll_col > 25).astype('int64'),
+        'users_50scroll': (scroll_col > 50).astype('int64'),
+        'new_visitors': (visit_col == 1).astype('int64'),
+        'returning_visitors': (visit_col > 1).astype('int64'),
+    }, index=df.index)
+    sums = {name: (name, 'sum') for name in MEASURES}
+
+    times = df[WATERMARK_COLUMN]
+    hour = times.dt.floor('h')
+    if daily_before is not None:
+        hour = hour.where(times >= daily_before, times.dt.floor('D'))
+    base = pd.DataFrame({'hour': hour}, index=df.index)
+    for column in FILTER_DIMENSIONS:
+        if column in df.columns:
+            base[column] = df[column]
+    if 'utm_source' in base.columns:
+        tiktok = (df['utm_source'] == 'tiktok').to_numpy(dtype=bool)
+        base['utm_source'] = pd.Categorical(np.where(tiktok, 'tiktok', None), categories=['tiktok'])
+    # One frame carries every breakdown column so each table is a group-by
+    # over different keys; utm_source's real values need a frame of their own
+    breakdowns = [column for column in BREAKDOWNS if column in df.columns]
+    keyed = base.join(df[[column for column in breakdowns if column not in base.columns]])
+
+    def key_columns(breakdown):
+        return list(base.columns) + ([breakdown] if breakdown not in (None, *base.columns) else [])
+
+    def with_source(frame, breakdown):
+        return frame.assign(utm_source=df['utm_source']) if breakdown == 'utm_source' else frame
+
+    tables = {}
+    cells = keyed.join(measures)
+    for breakdown in [None, *breakdowns]:
+        name = table_name('cells', breakdown)
+        if wanted(name):
+            tables[name] = backend.aggregate(with_source(cells, breakdown), key_columns(breakdown), sums)
+
+    for sketch, (column, edges) in SKETCHES.items():
+        sketched = [breakdown for breakdown in [None, *breakdowns]
+                    if (breakdown is None or breakdown in SKETCHED_BREAKDOWNS) and wanted(table_name(sketch, breakdown))]
+        if not sketched:
+            continue
+        valid = inputs[column].notna().to_numpy()
+        # Anything past the top edge (a scroll depth over 100) counts in the top bin
+        bins = np.minimum(np.searchsorted(edges, inputs[column][valid], side='left') - 1, len(edges) - 2)
+        binned = keyed[valid].assign(bin=bins.astype('int16'))
+        for breakdown in sketched:
+            tables[table_name(sketch, breakdown)] = backend.aggregate(
+                with_source(binned, breakdown), key_columns(breakdown) + ['bin'], {'count': ('bin', 'size')})
+
+    if wanted('visitors'):
+        user_ids = _column(df, 'user_id')
+        valid = user_ids.notna().to_numpy() & ('user_id' in df.columns)
+        registers = base[valid].join(hll_registers(user_ids[valid], precision))
+        sparse = backend.aggregate(registers, list(base.columns) + ['register'], {'rank': ('rank', 'max')})
+        tables['visitors'] = pack_registers(sparse, list(base.columns), precision)
+    return tables
+
+
+def sketch_quantile(counts, values, q):
+    """Quantile q of each row of a (groups x bins) count matrix.
+
+    `values` is what each bin stands for, ascending. Interpolates between
+    the two middle ranks like pandas, so q=0.5 matches Series.median() on
+    the binned values. Empty rows give NaN.
+    """
+    cum = counts.cumsum(axis=1)
+    n = cum[:, -1]
+    pos = q * np.maximum(n - 1, 0)
+    below = np.floor(pos)
+    lo = (cum > below[:, None]).argmax(axis=1)
+    hi = (cum > np.ceil(pos)[:, None]).argmax(axis=1)
+    estimate = values[lo] + (values[hi] - values[lo]) * (pos - below)
+    return np.where(n > 0, estimate, np.nan)
+
+
+def histogram(values, counts, edges):
+    # Sum of counts per right-closed bin of edges, values outside them left out
+    binned = np.searchsorted(edges, values, side='left') - 1
+    inside = (binned >= 0) & (binned < len(edges) - 1)
+    totals = np.bincount(binned[inside], weights=counts[inside], minlength=len(edges) - 1)
+    return pd.Series(totals.astype('int64'), index=pd.IntervalIndex.from_breaks(edges, closed='right'), name='count')
+
+
+def _grouped(table, state, by, freq, dropna, time_column='hour', extra=()):
+    if state is not None:
+        table = table[state_mask(table, state)]
+    keys = [table[column] for column in by]
+    if freq is not None:
+        keys.insert(0, table[time_column].dt.floor(freq).rename('bucket'))
+    if not keys:
+        keys = [pd.Series(0, index=table.index, dtype='int8')]
+    keys += [table[column] for column in extra]
+    return table.groupby(keys, observed=True, dropna=dropna, sort=True)
+
+
+def _finer_than_day(freq):
+    if freq is None:
+        return False
+    try:
+        return pd.Timedelta(pd.tseries.frequencies.to_offset(freq)) < pd.Timedelta(days=1)
+    except ValueError:
+        # Weeks, months and the like
+        return False
+
+
+def _breakdown(by):
+    # The one BREAKDOWNS column in `by`, if any; utm_source always needs its
+    # own table since the filter cells only tell tiktok from the rest
+    extra = [column for column in by if column not in FILTER_DIMENSIONS or column == 'utm_source']
+    if len(extra) > 1 or (extra and extra[0] not in BREAKDOWNS):
+        raise ValueError(f"the cube breaks down by one of {BREAKDOWNS} at a time, got {extra}")
+    return extra[0] if extra else None
+
+
+class RollupCube:
+    """Sums and sketches of the session measures per filter combination.
+
+    Cells are hourly for the latest HOURLY_DAYS days and daily before
+    that, keyed on FILTER_DIMENSIONS; each of BREAKDOWNS has marginal
+    tables with its column added. Panels read a slice of the cube instead
+    of scanning raw rows. The partial hours (or days) at either end of a
+    period are rolled up from the raw frame on the spot, so counts are
+    exact; medians and other quantiles come from the merged histograms
+    (see SKETCHES) and unique visitors from the merged HyperLogLog
+    registers. update() only rebuilds the buckets a refresh touched.
+    """
+
+    def __init__(self, tables, daily_before=None, precision=HLL_PRECISION, backend=None):
+        self.tables = tables
+        self.daily_before = daily_before
+        self.precision = precision
+        self.backend = backend or get_backend()
+
+    @classmethod
+    def build(cls, df, precision=HLL_PRECISION, backend=None):
+        backend = backend or get_backend()
+        daily_before = daily_boundary(df)
+        return cls(rollup_tables(df, daily_before, precision, backend), daily_before, precision, backend)
+
+    def memory(self):
+        # Bytes held by every table, register arrays included
+        return sum(frame_memory(table) for table in self.tables.values())
+
+    def update(self, df, since):
+        # Rows of df before `since` are the ones this cube was built from
+        daily_before = daily_boundary(df)
+        if self.daily_before is None or daily_before is None or daily_before < self.daily_before:
+            return self.build(df, self.precision, self.backend)
+        since = pd.Timestamp(since)
+        boundary = since.floor('h') if since >= self.daily_before else since.floor('D')
+        # Hours that have since aged into the daily range are rolled up again by day
+        boundary = min(boundary, self.daily_before) if daily_before > self.daily_before else boundary
+        start = df[WATERMARK_COLUMN].searchsorted(boundary, side='left')
+        fresh = rollup_tables(df.iloc[start:], daily_before, self.precision, self.backend)
+        return RollupCube({
+            name: concat_frames(table.iloc[:table['hour'].searchsorted(boundary, side='left')], fresh[name])
+            for name, table in self.tables.items()
+        }, daily_before, self.precision, self.backend)
+
+    def _window(self, df, start, end, lo, hi, names, hourly=False):
+        # The `names` cube tables for rows lo:hi of df: whole buckets sliced
+        # from the cube, the partial ones at either end rolled up from the raw
+        # rows. hourly=True rolls any daily range from raw rows too.
+        start, end = pd.Timestamp(start), pd.Timestamp(end)
+        first, last = start.ceil('h'), end.floor('h')
+        if self.daily_before is not None:
+            if hourly:
+                first = max(first, self.daily_before)
+            else:
+                first = start.ceil('D') if start < self.daily_before else first
+                last = end.floor('D') if end < self.daily_before else last
+        parts = {name: [] for name in names}
+        edges = [(lo, hi)]
+        if first < last:
+            for name in names:
+                hours = self.tables[name]['hour']
+                parts[name].append(self.tables[name].iloc[hours.searchsorted(first, side='left'):
+                                                          hours.searchsorted(last, side='left')])
+            times = df[WATERMARK_COLUMN]
+            edges = [(lo, max(lo, times.searchsorted(first, side='left'))),
+                     (min(hi, times.searchsorted(last, side='left')), hi)]
+        for a, b in edges:
+            if b > a:
+                # Edge slices are usually a few hours of rows, too small to be
+                # worth a DuckDB round trip; they are kept hourly
+                for name, table in rollup_tables(df.iloc[a:b], None, self.precision, get_backend('pandas'),
+                                                 names).items():
+                    parts[name].append(table)
+        return {name: reduce(concat_frames, found) if found else self.tables[name].iloc[:0]
+                for name, found in parts.items()}
+
+    def query(self, df, start, end, state=None, by=(), freq=None, closed='both', dropna=True,
+              quantiles=(), visitors=False, exact=False):
+        """Summed MEASURES for the rows of df between start and end.
+
+        df is the frame the cube was built from (see data.time_bounds for
+        `closed`). `state` is a FilterState applied to the cells, `by` lists
+        columns to group on, any FILTER_DIMENSIONS and at most one of
+        BREAKDOWNS, and `freq` adds a leading 'bucket' key.
+        `quantiles` adds columns estimated from the sketches, such as
+        MEDIANS (per SKETCHED_BREAKDOWNS group at most), and visitors=True a
+        'unique_visitors' column (not per breakdown). With
+        exact=True both are computed from the raw rows instead, to check
+        the estimates; small windows count raw user ids regardless.
+        Without grouping keys a dict of totals comes back.
+        """
+        lo, hi = time_bounds(df, start, end, closed)
+        breakdown = _breakdown(by)
+        exact_visitors = visitors and (exact or hi - lo <= EXACT_VISITOR_ROWS)
+        sketches = [] if exact else sorted({sketch for _, sketch, _ in quantiles})
+        names = [table_name(table, breakdown) for table in ['cells', *sketches]]
+        if visitors and not exact_visitors:
+            names.append('visitors')
+        missing = [name for name in names if name not in self.tables or (name == 'visitors' and breakdown)]
+        if missing:
+            raise ValueError(f"the cube has no {', '.join(missing)} table for {breakdown}")
+        tables = self._window(df, start, end, lo, hi, names, hourly=_finer_than_day(freq))
+        totals = _grouped(tables[names[0]], state, by, freq, dropna)[MEASURES].sum()
+        if (exact and quantiles) or exact_visitors:
+            rows = df.iloc[lo:hi]
+            if state is not None:
+                rows = rows[state_mask(rows, state)]
+            inputs = metric_inputs(rows).join(rows[[WATERMARK_COLUMN, *by]])
+            inputs['user_id'] = rows['user_id'] if 'user_id' in rows.columns else np.nan
+            grouped = _grouped(inputs, None, by, freq, dropna, time_column=WATERMARK_COLUMN)
+        for name, sketch, q in quantiles:
+            column, sketch_edges = SKETCHES[sketch]
+            if exact:
+                totals[name] = grouped[column].quantile(q).reindex(totals.index)
+                continue
+            counts = _grouped(tables[table_name(sketch, breakdown)], state, by, freq, dropna,
+                              extra=['bin'])['count'].sum()
+            if counts.empty:
+                totals[name] = np.nan
+                continue
+            counts = counts.unstack('bin', fill_value=0)
+            values = sketch_edges[1:][counts.columns.to_numpy()]
+            estimate = pd.Series(sketch_quantile(counts.to_numpy(), values, q), index=counts.index)
+            totals[name] = estimate.reindex(totals.index)
+
+        if exact_visitors:
+            totals['unique_visitors'] = grouped['user_id'].nunique().reindex(totals.index).fillna(0).astype('int64')
+        elif visitors:
+            grouped = _grouped(tables['visitors'], state, by, freq, dropna)
+            index = grouped.size().index
+            group = grouped.ngroup().fillna(-1).to_numpy('int64')
+            merged = merge_registers(grouped.obj['registers'].to_numpy(), group, len(index), self.precision)
+            filled = (merged > 0).sum(axis=1)
+            inverse_sum = np.where(merged > 0, np.ldexp(1.0, -merged.astype('int64')), 0).sum(axis=1)
+            estimate = pd.Series(hll_estimate(filled, inverse_sum, self.precision), index=index)
+            totals['unique_visitors'] = estimate.reindex(totals.index).fillna(0).round().astype('int64')
+
+        if by or freq is not None:
+            return totals
+        if totals.empty:
+            return {column: np.nan if column in [name for name, _, _ in quantiles] else 0
+                    for column in totals.columns}
+        return {column: totals[column].iloc[0] for column in totals.columns}
+
+    def distribution(self, df, start, end, sketch, edges, state=None, closed='both'):
+        """Row counts of a sketched input (see SKETCHES) between consecutive
+        `edges`, for the rows of df between start and end.
+
+        Bins are closed on the right like the sketch's own, and counts are
+        exact as long as every edge is also a sketch edge. Values outside
+        the edges are left out. Returns a Series indexed by IntervalIndex.
+        """
+        lo, hi = time_bounds(df, start, end, closed)
+        table = self._window(df, start, end, lo, hi, [sketch])[sketch]
+        if state is not None:
+            table = table[state_mask(table, state)]
+        counts = table.groupby('bin')['count'].sum()
+        return histogram(SKETCHES[sketch][1][1:][counts.index.to_numpy()], counts.to_numpy(), edges)
@@ -0,0 +1,149 @@
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+
+log = logging.getLogger(__name__)
+
+SNAPSHOT_DIR = Path(os.environ.get('SITENUDGE_SNAPSHOT_DIR', '.cache/snapshots'))
+SNAPSHOT_FORMAT = 2
+MAX_SNAPSHOTS = 3
+MAX_BYTES = 1024 ** 3
+ORPHAN_AGE = 600
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class SnapshotCache:
+    """Arrow IPC copies of the sessions frame, each with a JSON sidecar.
+
+    The sidecar is written last, so a snapshot only counts once both files
+    are complete. Loads check size, checksum and row count before trusting
+    the data, and anything that fails is deleted. Each snapshot also
+    records when its frame last matched the whole table (see
+    data.SessionStore), and loads can skip ones reconciled too long ago.
+    """
+
+    def __init__(self, directory=SNAPSHOT_DIR, keep=MAX_SNAPSHOTS, max_bytes=MAX_BYTES):
+        self.directory = Path(directory)
+        self.keep = keep
+        self.max_bytes = max_bytes
+
+    def save(self, df, watermark, reconciled_at=None):
+        self.directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+        name = f"sessions-{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+        data_path = self.directory / f'{name}.arrow'
+        tmp_path = self.directory / f'{name}.arrow.tmp'
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            # Uncompressed, so a load is a checksum pass over the file and one
+            # copy into pandas with nothing to decompress
+            with pa.OSFile(str(tmp_path), 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        except (pa.ArrowException, OSError) as e:
+            log.warning("Skipping session snapshot: %s", e)
+            tmp_path.unlink(missing_ok=True)
+            return None
+
+        size = tmp_path.stat().st_size
+        if size > self.max_bytes:
+            log.warning("Session snapshot is %d bytes, over the %d byte limit", size, self.max_bytes)
+            tmp_path.unlink(missing_ok=True)
+            return None
+
+        meta = {
+            'format': SNAPSHOT_FORMAT,
+            'file': data_path.name,
+            'bytes': size,
+            'sha256': _sha256(tmp_path),
+            'rows': len(df),
+            'columns': list(df.columns),
+            'watermark': watermark.isoformat() if watermark is not None else None,
+            'reconciled_at': reconciled_at.isoformat() if reconciled_at is not None else None,
+            'created_at': datetime.now(timezone.utc).isoformat(),
+        }
+        os.replace(tmp_path, data_path)
+        meta_tmp = self.directory / f'{name}.json.tmp'
+        meta_tmp.write_text(json.dumps(meta))
+        os.replace(meta_tmp, self.directory / f'{name}.json')
+        self.prune()
+        return data_path
+
+    def load(self, columns=None, reconciled_since=None):
+        # Newest valid snapshot as (df, watermark, reconciled_at), or None.
+        # With reconciled_since, older reconciles don't count as valid.
+        for meta_path, meta in self._snapshots():
+            if meta.get('format') != SNAPSHOT_FORMAT:
+                continue
+            if columns is not None and not set(columns) <= set(meta['columns']):
+                continue
+            reconciled_at = pd.Timestamp(meta['reconciled_at']) if meta['reconciled_at'] else None
+            if reconciled_since is not None and (reconciled_at is None or reconciled_at < reconciled_since):
+                continue
+            data_path = self.directory / meta['file']
+            try:
+                if data_path.stat().st_size != meta['bytes'] or _sha256(data_path) != meta['sha256']:
+                    raise ValueError("checksum mismatch")
+                with pa.memory_map(str(data_path)) as source:
+                    df = pa.ipc.open_file(source).read_all().to_pandas()
+                if len(df) != meta['rows']:
+                    raise ValueError("row count mismatch")
+            except (OSError, ValueError, pa.ArrowException) as e:
+                log.warning("Discarding session snapshot %s: %s", data_path.name, e)
+                self._remove(meta_path, data_path)
+                continue
+            watermark = pd.Timestamp(meta['watermark']) if meta['watermark'] else None
+            return (df[list(columns)] if columns is not None else df), watermark, reconciled_at
+        return None
+
+    def prune(self):
+        # Keep the newest snapshots within both the count and byte budgets
+        total = 0
+        kept = set()
+        for i, (meta_path, meta) in enumerate(self._snapshots()):
+            total += meta.get('bytes', 0)
+            if i >= self.keep or total > self.max_bytes:
+                self._remove(meta_path, self.directory / meta['file'])
+            else:
+                kept.add(meta['file'])
+
+        # Data files left behind by a crashed save; the age check leaves
+        # another process's in-flight save alone
+        cutoff = time.time() - ORPHAN_AGE
+        for path in self.directory.glob('sessions-*.arrow*'):
+            try:
+                if path.name not in kept and path.stat().st_mtime < cutoff:
+                    path.unlink()
+            except OSError:
+                pass
+
+    def _snapshots(self):
+        if not self.directory.is_dir():
+            return []
+        found = []
+        for meta_path in self.directory.glob('sessions-*.json'):
+            try:
+                found.append((meta_path, json.loads(meta_path.read_text())))
+            except (OSError, ValueError):
+                continue
+        return sorted(found, key=lambda item: item[1].get('created_at', ''), reverse=True)
+
+    def _remove(self, meta_path, data_path):
+        for path in (meta_path, data_path):
+            try:
+                path.unlink()
+            except OSError:
+                pass
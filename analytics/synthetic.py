@@ -0,0 +1,230 @@
+from datetime import timedelta
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+from postgrest.exceptions import APIError
+
+from analytics.data import SESSION_COLUMNS, UNDEFINED_COLUMN, VERSION_LAUNCHES, WATERMARK_COLUMN, classify_versions
+
+# Last session of a generated table unless told otherwise, so a seed always
+# gives the same rows
+SYNTHETIC_END = pd.Timestamp('2026-02-01', tz='UTC')
+
+# Older rows were written before the tracker recorded a version and are
+# backfilled on load (see data.fill_versions)
+VERSION_TRACKED_FROM = VERSION_LAUNCHES[-1][0] - timedelta(days=14)
+
+# Test rounds by start date, oldest first, keyed on the hero test id
+TEST_ROUNDS = (
+    (pd.Timestamp('2000-01-01', tz='UTC'), 'hero-price-001'),
+    (VERSION_LAUNCHES[-1][0], 'headline-001'),
+)
+
+UTM_SOURCES = (['tiktok', 'direct', 'google', 'instagram', None], [0.45, 0.25, 0.1, 0.05, 0.15])
+DEVICES = (['mobile', 'desktop', 'tablet'], [0.7, 0.25, 0.05])
+PRICES = ([17.0, 27.0, np.nan], [0.45, 0.45, 0.1])
+# A long tail of cities by rank, plus blank and missing geolocation
+_CITY_NAMES = ['London', 'New York', 'Los Angeles', 'Toronto', 'Sydney', 'Manchester', 'Chicago', 'Dublin',
+               'Berlin', 'Paris', 'Amsterdam', 'Melbourne', 'Austin', 'Seattle', 'Madrid', 'Birmingham']
+_CITY_RANKS = 1 / np.arange(1, len(_CITY_NAMES) + 1)
+CITIES = (_CITY_NAMES + ['', None], list(0.82 * _CITY_RANKS / _CITY_RANKS.sum()) + [0.1, 0.08])
+BOT_RATE = 0.08
+BOUNCE_RATE = 0.3
+# Funnel rates for real, non-bounced sessions; the hero 'test' arm gets
+# TEST_LIFT times the control's buy-click rate
+CLICK_RATE, CHECKOUT_RATE, PURCHASE_RATE = 0.08, 0.35, 0.4
+TEST_LIFT = 1.15
+# Hours of the day weighted toward the evening, when the ads run
+HOUR_WEIGHTS = np.array([2, 1, 1, 1, 1, 1, 2, 3, 4, 5, 5, 5, 6, 6, 6, 6, 7, 8, 9, 10, 10, 9, 6, 4], dtype='float64')
+
+# Variant arms by assignment flag; indexing shares the two strings across rows
+ARMS = np.array(['control', 'test'], dtype=object)
+HEX_DIGITS = np.frombuffer(b'0123456789abcdef', dtype='S1')
+# Rows drawn at a time, so a 10M-row table never holds more than one chunk
+# of temporaries next to its columns
+CHUNK_ROWS = 1_000_000
+
+
+def _uuids(rng, n):
+    # Random UUID-shaped strings without a Python call per row, CHUNK_ROWS at a time
+    uuids = np.empty(n, dtype=object)
+    for lo in range(0, n, CHUNK_ROWS):
+        digits = HEX_DIGITS[rng.integers(0, 16, (min(CHUNK_ROWS, n - lo), 36), dtype=np.uint8)]
+        digits[:, [8, 13, 18, 23]] = b'-'
+        digits[:, 14] = b'4'
+        uuids[lo:lo + len(digits)] = digits.view('S36').ravel().astype(str)
+    return uuids
+
+
+def _choice(rng, n, options):
+    values, weights = options
+    picked = np.empty(n, dtype=object)
+    picked[:] = np.asarray(values, dtype=object)[rng.choice(len(values), n, p=weights)]
+    return picked
+
+
+def _maybe(flags, rng, missing):
+    # Nullable flag column as it comes off the wire: True/False with some None
+    values = flags.astype(object)
+    values[rng.random(len(flags)) < missing] = None
+    return values
+
+
+def generate_sessions(n, seed=0, end=SYNTHETIC_END, days=120):
+    """n synthetic session_sessions rows, shaped like rows_to_frame() output.
+
+    Sessions spread over `days` up to `end` with an evening-heavy daily
+    cycle and come back sorted by started_at. Columns are SESSION_COLUMNS
+    with the nulls, versions, test rounds, prices, bot share and
+    visit_number spread of the live table. The same n and seed always give
+    the same frame.
+    """
+    rng = np.random.default_rng(seed)
+    start = end - timedelta(days=days)
+    offsets = np.empty(n, dtype='int64')
+    for lo in range(0, n, CHUNK_ROWS):
+        size = min(CHUNK_ROWS, n - lo)
+        day = rng.integers(0, days, size)
+        hour = rng.choice(24, size, p=HOUR_WEIGHTS / HOUR_WEIGHTS.sum())
+        offsets[lo:lo + size] = (day * 86400 + hour * 3600 + rng.integers(0, 3600, size)) * 10 ** 9
+    offsets.sort()
+    started_at = pd.DatetimeIndex(start.value + offsets, tz='UTC')
+    del offsets
+
+    users = _uuids(rng, max(1, int(n * 0.75)))
+    columns = {}
+    for lo in range(0, max(n, 1), CHUNK_ROWS):
+        chunk = _session_columns(rng, started_at[lo:lo + CHUNK_ROWS], users)
+        for name, values in chunk.items():
+            if name not in columns:
+                columns[name] = np.empty(n, dtype=values.dtype)
+            columns[name][lo:lo + len(values)] = values
+    columns['started_at'] = started_at
+    # copy=False keeps each column's array as is rather than consolidating them
+    return pd.DataFrame({name: columns[name] for name in SESSION_COLUMNS}, copy=False)
+
+
+def _session_columns(rng, started_at, users):
+    # Every column but started_at for one chunk of sessions
+    n = len(started_at)
+    is_bot = rng.random(n) < BOT_RATE
+    bounced = is_bot | (rng.random(n) < BOUNCE_RATE)
+    variants = {col: rng.random(n) < 0.5 for col in ('hero_variant', 'social_proof_variant', 'scroll_hook_variant')}
+
+    # Time and scroll are zero for bounces; a few tabs are left open for hours
+    time_on_site = np.where(bounced, 0, np.ceil(rng.lognormal(np.log(25), 1.2, n)))
+    time_on_site = np.where(~bounced & (rng.random(n) < 0.01), rng.integers(1800, 20000, n), time_on_site)
+    scroll = np.where(bounced, 0, np.clip(np.ceil(rng.beta(1.5, 2, n) * 100), 1, 100)).astype('int64')
+    clicks = np.where(bounced, 0, rng.poisson(1 + scroll / 40))
+
+    buy_rate = CLICK_RATE * np.where(variants['hero_variant'], TEST_LIFT, 1)
+    clicked_buy = ~bounced & (rng.random(n) < buy_rate)
+    checkout = clicked_buy & (rng.random(n) < CHECKOUT_RATE)
+    purchased = checkout & (rng.random(n) < PURCHASE_RATE)
+
+    version = np.asarray(classify_versions(started_at), dtype=object)
+    version[started_at < VERSION_TRACKED_FROM] = None
+    round_starts = pd.DatetimeIndex([started for started, _ in TEST_ROUNDS])
+    test_ids = np.asarray([test_id for _, test_id in TEST_ROUNDS], dtype=object)
+
+    return {
+        'session_id': _uuids(rng, n),
+        'user_id': users[rng.integers(0, len(users), n)],
+        'visit_number': np.minimum(rng.geometric(0.75, n), 50),
+        'is_bot': _maybe(is_bot, rng, 0.02),
+        'utm_source': _choice(rng, n, UTM_SOURCES),
+        'device_type': _choice(rng, n, DEVICES),
+        'city': _choice(rng, n, CITIES),
+        'price_shown': np.asarray(PRICES[0])[rng.choice(len(PRICES[0]), n, p=PRICES[1])],
+        'version': version,
+        'hero_test_id': test_ids[round_starts.searchsorted(started_at, side='right') - 1],
+        **{col: ARMS[test.astype('int8')] for col, test in variants.items()},
+        'time_on_site_sec': time_on_site.astype('int64'),
+        'scroll_depth_pct': scroll,
+        'clicks_total': clicks,
+        'clicked_buy': clicked_buy,
+        'initiated_checkout': checkout,
+        'purchased': purchased,
+    }
+
+
+class SyntheticClient:
+    """Just enough of the supabase client for data.fetch_rows() to page
+    through a generated frame, so loads run the real SessionStore path.
+
+    Pages are served as JSON-style records with ISO timestamps, which keeps
+    the decode and parse work of a real fetch in the measurement. Records
+    are built a page at a time, so the client holds nothing besides df.
+    """
+
+    def __init__(self, df):
+        self.df = df
+
+    def table(self, name):
+        return _SyntheticQuery(self)
+
+
+class _SyntheticQuery:
+    def __init__(self, client):
+        self.client = client
+        self.columns = None
+        self.count = None
+        self.lo, self.hi = 0, len(client.df)
+        self.page = (0, None)
+        self.desc = False
+
+    def select(self, columns, count=None):
+        self.columns = None if columns == '*' else [c.strip() for c in columns.split(',')]
+        self.count = count
+        return self
+
+    # Only the started_at filters fetch_rows() sends
+    def gt(self, column, value):
+        return self._from(value, 'right')
+
+    def gte(self, column, value):
+        return self._from(value, 'left')
+
+    def lt(self, column, value):
+        return self._until(value, 'left')
+
+    def lte(self, column, value):
+        return self._until(value, 'right')
+
+    def _from(self, value, side):
+        self.lo = max(self.lo, int(self.client.df[WATERMARK_COLUMN].searchsorted(pd.Timestamp(value), side=side)))
+        return self
+
+    def _until(self, value, side):
+        self.hi = min(self.hi, int(self.client.df[WATERMARK_COLUMN].searchsorted(pd.Timestamp(value), side=side)))
+        return self
+
+    def order(self, column, desc=False):
+        # Generated frames are already in started_at order
+        if column == WATERMARK_COLUMN:
+            self.desc = desc
+        return self
+
+    def range(self, start, end):
+        self.page = (start, end + 1)
+        return self
+
+    def limit(self, size):
+        self.page = (0, size)
+        return self
+
+    def execute(self):
+        start, stop = self.page
+        rows = self.client.df.iloc[self.lo:self.hi]
+        if self.desc:
+            rows = rows.iloc[::-1]
+        page = rows.iloc[start:stop]
+        page = page.assign(started_at=page['started_at'].dt.strftime('%Y-%m-%dT%H:%M:%S.%f+00:00'))
+        if self.columns is not None:
+            unknown = [c for c in self.columns if c not in page.columns]
+            if unknown:
+                # What PostgREST answers for a column the table doesn't have
+                raise APIError({'code': UNDEFINED_COLUMN, 'message': f'column {unknown[0]} does not exist'})
+            page = page[self.columns]
+        return SimpleNamespace(data=page.to_dict('records'), count=len(rows) if self.count else None)
@@ -2,11 +2,21 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-from plotly.subplots import make_subplots
 from supabase import create_client
 from datetime import datetime, timedelta
+from typing import NamedTuple
 import pytz
 
+from analytics.aggregates import AGGREGATE_SOURCE, CubeAggregates, FunctionStatus, SupabaseAggregates
+from analytics.cache import CachedAggregates, ResultCache
+from analytics.charts import TREND_PANELS, trend_figure
+from analytics.data import SECTION_COLUMNS, SESSION_COLUMNS, SessionRefresher, SessionSnapshot, SessionStore
+from analytics.downsample import downsample
+from analytics.filters import FilterEngine, FilterState
+from analytics.metrics import ab_table, metrics_row
+from analytics.rollup import RollupCube
+from analytics.snapshot import SnapshotCache
+
 # Page config
 st.set_page_config(
     page_title="SiteNudge Analytics",
@@ -109,6 +119,10 @@ plotly_layout = dict(
     yaxis=dict(gridcolor='rgba(148,163,184,0.1)', zerolinecolor='rgba(148,163,184,0.1)'),
 )
 
+# Rough chart widths in pixels at the page's 1400px max width; line charts
+# get a point budget from these (see analytics.downsample)
+HALF_WIDTH, THIRD_WIDTH = 680, 450
+
 colors = {
     'primary': '#3b82f6',
     'secondary': '#8b5cf6', 
@@ -124,76 +138,113 @@ colors = {
 def get_supabase():
     return create_client(st.secrets["SUPABASE_URL"], st.secrets["SUPABASE_KEY"])
 
-@st.cache_data(ttl=15)
-def fetch_all_sessions():
-    response = get_supabase().table('session_sessions').select('*').order('started_at', desc=True).execute()
-    if response.data:
-        df = pd.DataFrame(response.data)
-        df['started_at'] = pd.to_datetime(df['started_at'], utc=True)
-        return df
-    return pd.DataFrame()
-
-def calculate_metrics(df):
-    if df.empty:
-        return {'sessions': 0, 'median_time': 0, 'median_scroll': 0, 'total_clicks': 0,
-                'clicked_buy': 0, 'initiated_checkout': 0, 'purchased': 0, 'bounce_rate': 0, 'engaged_sessions': 0}
-    
-    time_col = df.get('time_on_site_sec', pd.Series([0]))
-    valid_time = time_col[(time_col > 0) & (time_col <= 1800)]
-    scroll_col = df.get('scroll_depth_pct', pd.Series([0]))
-    valid_scroll = scroll_col[scroll_col > 0]
-    bounces = len(df[(time_col == 0) | (scroll_col == 0)])
-    engaged = len(df[(time_col > 10) & (scroll_col > 25)])
-    
-    return {
-        'sessions': len(df),
-        'median_time': valid_time.median() if len(valid_time) > 0 else 0,
-        'median_scroll': valid_scroll.median() if len(valid_scroll) > 0 else 0,
-        'total_clicks': df.get('clicks_total', pd.Series([0])).sum(),
-        'clicked_buy': df.get('clicked_buy', pd.Series([0])).sum(),
-        'initiated_checkout': df.get('initiated_checkout', pd.Series([0])).sum(),
-        'purchased': df.get('purchased', pd.Series([0])).sum(),
-        'bounce_rate': (bounces / len(df) * 100) if len(df) > 0 else 0,
-        'engaged_sessions': engaged,
-    }
+@st.cache_resource
+def get_refresher():
+    # One background thread per process owns the data and every browser
+    # session reads its latest frame. Cold starts load the on-disk snapshot,
+    # then each refresh only pulls rows past the watermark and re-rolls
+    # only the hours it touched. With the aggregates in Postgres there are no
+    # rows or cube to keep, just the table's status to poll.
+    if AGGREGATE_SOURCE == 'rpc':
+        return SessionRefresher(FunctionStatus(SupabaseAggregates(get_supabase()))).start()
+    store = SessionStore(get_supabase(), snapshots=SnapshotCache())
+    return SessionRefresher(store, rollup=RollupCube).start()
+
+@st.cache_resource
+def get_filter_engine():
+    # Shared so every browser session reuses the same per-predicate masks
+    return FilterEngine()
+
+@st.cache_resource
+def get_result_cache():
+    # Metrics and tables already computed for this snapshot, by any session
+    return ResultCache()
+
+@st.cache_resource
+def get_figure_cache():
+    # Plotly figure of every chart already drawn for this snapshot
+    return ResultCache()
+
+class View(NamedTuple):
+    """The snapshot, period and global filters every section reads.
+
+    Sections are fragments (st.fragment) taking a View plus their own
+    inputs: a widget inside a section reruns just that section, while the
+    global filters rebuild the View and rerun them all.
+    """
+    snapshot: SessionSnapshot
+    aggregates: CachedAggregates
+    filters: FilterState
+    period: str
+    start: datetime
+    end: datetime
+    prev_start: datetime
+    prev_end: datetime
+    exact: bool
+
+    @property
+    def columns(self):
+        # Session columns the panels can read; in rpc mode the functions read the table itself
+        return SESSION_COLUMNS if AGGREGATE_SOURCE == 'rpc' else self.snapshot.df.columns
+
+    @property
+    def key(self):
+        # What every chart depends on besides the data; charts add their own extras
+        return (self.period, self.aggregates.period_key(self.start, self.end), self.filters, AGGREGATE_SOURCE, self.exact)
+
+    @property
+    def empty(self):
+        return self.aggregates.counts(self.start, self.end, self.filters)['sessions'] == 0
+
+    def chart(self, chart_id, build, *extra):
+        # st.plotly_chart(build(), use_container_width=True), except that the
+        # figure is cached per snapshot under (chart_id, *key, *extra), so a
+        # repeat view skips building it. `extra` lists any other input the
+        # figure depends on. plotly_chart copies the figure, never changes it.
+        fig = get_figure_cache().get(self.snapshot.version, (chart_id,) + self.key + extra, build)
+        st.plotly_chart(fig, use_container_width=True)
+
+def require_columns(section):
+    # Sections pull any extra columns they need the first time they are shown
+    if get_refresher().require(SECTION_COLUMNS[section]):
+        st.rerun()
 
-def calculate_ab_stats(df, variant_col):
-    if variant_col not in df.columns or df.empty:
-        return None
-    results = []
-    for variant in df[variant_col].dropna().unique():
-        vdf = df[df[variant_col] == variant]
-        m = calculate_metrics(vdf)
-        click_rate = (m['clicked_buy'] / m['sessions'] * 100) if m['sessions'] > 0 else 0
-        results.append({
-            'variant': variant, 'sessions': m['sessions'], 'median_time': m['median_time'],
-            'median_scroll': m['median_scroll'], 'clicked_buy': m['clicked_buy'],
-            'click_rate': click_rate, 'bounce_rate': m['bounce_rate'], 'engaged': m['engaged_sessions']
-        })
-    return pd.DataFrame(results)
+def section_open(label, key):
+    # Below-the-fold sections compute nothing until opened. The toggle lives
+    # in the section's fragment, so opening one reruns only that section
+    return st.toggle(label, value=False, key=f"open_{key}")
 
 def calc_delta(current, prev):
     if prev == 0: return None
     return ((current - prev) / prev) * 100
 
+def get_aggregates(snapshot, exact):
+    # Panels read the rollup cube instead of the raw rows, or run their
+    # aggregates in Postgres instead (SITENUDGE_AGGREGATES=rpc), where the
+    # snapshot holds only the table's status. Either way results are cached
+    # per snapshot, so revisiting a view is free.
+    if AGGREGATE_SOURCE == 'rpc':
+        return CachedAggregates(SupabaseAggregates(get_supabase()), get_result_cache(), None, snapshot.version,
+                                tag=(AGGREGATE_SOURCE, exact), latest=snapshot.df['last_started_at'].iloc[0])
+    source = CubeAggregates(snapshot.rollup, snapshot.df, exact=exact, masks=get_filter_engine())
+    return CachedAggregates(source, get_result_cache(), snapshot.df, snapshot.version, tag=(AGGREGATE_SOURCE, exact))
+
 # Load data
-df_all = fetch_all_sessions()
-if df_all.empty:
+snapshot = get_refresher().latest()
+if snapshot is None or snapshot.df.empty:
     st.error("No data available")
     st.stop()
-
-# Ensure version column exists (fallback for old data)
-if 'version' not in df_all.columns:
-    # Fallback: classify old data
-    V2_LAUNCH = datetime(2025, 12, 10, 12, 0, 0, tzinfo=pytz.UTC)
-    df_all['version'] = df_all['started_at'].apply(lambda x: 'V2.0' if x >= V2_LAUNCH else 'V1.0')
-elif df_all['version'].isna().any():
-    # Fill any missing version values
-    V2_LAUNCH = datetime(2025, 12, 10, 12, 0, 0, tzinfo=pytz.UTC)
-    df_all['version'] = df_all.apply(
-        lambda row: row['version'] if pd.notna(row['version']) else ('V2.0' if row['started_at'] >= V2_LAUNCH else 'V1.0'),
-        axis=1
-    )
+# Sections left open get their columns before anything is drawn, so
+# require_columns only reruns the page when a section is first opened
+for section, columns in SECTION_COLUMNS.items():
+    if st.session_state.get(f"open_{section}") and get_refresher().require(columns):
+        snapshot = get_refresher().latest()
+if AGGREGATE_SOURCE == 'rpc':
+    first_started_at, last_started_at = snapshot.df['first_started_at'].iloc[0], snapshot.df['last_started_at'].iloc[0]
+else:
+    first_started_at, last_started_at = snapshot.df['started_at'].iloc[0], snapshot.df['started_at'].iloc[-1]
+# Whole-table lookups: price options, version counts, table stats
+table = get_aggregates(snapshot, exact=False)
 
 # Time calculations
 now = datetime.now(pytz.UTC)
@@ -201,7 +252,10 @@ today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
 
 # ============== HEADER & FILTERS ==============
 st.title("Analytics Dashboard")
-st.caption(f"Last updated: {now.strftime('%H:%M:%S')}")
+data_age = (now - snapshot.refreshed_at).total_seconds()
+st.caption(f"Data as of {snapshot.refreshed_at.strftime('%H:%M:%S')} ({data_age:.0f}s ago)")
+if get_refresher().error is not None:
+    st.caption(f"⚠️ Refresh failing, showing the last good data: {get_refresher().error}")
 st.markdown("---")
 
 # Primary filters at top
@@ -210,18 +264,22 @@ col1, col2, col3, col4, col5 = st.columns([2, 1, 1, 1, 1])
 with col1:
     period = st.radio(
         "📅 Time Period",
-        ["Today", "Last 7 Days", "Last 30 Days", "All Time"],
+        ["Today", "Last 7 Days", "Last 30 Days", "All Time", "Custom"],
         index=3,  # Default to "All Time"
         horizontal=True
     )
+    if period == "Custom":
+        first_day = first_started_at.date()
+        custom_range = st.date_input(
+            "Date range",
+            value=(max(first_day, today_start.date() - timedelta(days=7)), today_start.date()),
+            min_value=first_day,
+            max_value=now.date(),
+        )
 
 with col2:
     # Get unique prices from data
-    price_options = ["All Prices"]
-    if 'price_shown' in df_all.columns:
-        unique_prices = df_all['price_shown'].dropna().unique()
-        unique_prices = sorted([p for p in unique_prices if p > 0])
-        price_options += [f"${int(p)}" for p in unique_prices]
+    price_options = ["All Prices"] + [f"${int(p)}" for p in table.prices()]
     
     selected_price = st.selectbox("💰 Price", price_options, index=0)
 
@@ -236,7 +294,9 @@ with col5:
 
 # Version filter (V1.0 vs V2.0)
 st.markdown("---")
-col1, col2, col3 = st.columns([1, 2, 2])
+version_counts = table.counts(first_started_at, last_started_at, None, by=['version'])['sessions']
+v1_count, v2_count = int(version_counts.get('V1.0', 0)), int(version_counts.get('V2.0', 0))
+col1, col2 = st.columns([1, 4])
 with col1:
     version_filter = st.selectbox(
         "🚀 Version",
@@ -245,17 +305,11 @@ with col1:
     )
 with col2:
     if version_filter == "V2.0 (Outcome-Focused)":
-        v2_count = len(df_all[df_all['version'] == 'V2.0'])
         st.caption(f"✨ New positioning: '$3k/Month Skill' • {v2_count} sessions • Launched Dec 10")
     elif version_filter == "V1.0 (Feature-Focused)":
-        v1_count = len(df_all[df_all['version'] == 'V1.0'])
         st.caption(f"📦 Old positioning: 'Automation Scripts' • {v1_count} sessions • Before Dec 10")
     else:
-        v1_count = len(df_all[df_all['version'] == 'V1.0'])
-        v2_count = len(df_all[df_all['version'] == 'V2.0'])
         st.caption(f"📊 Compare both: V1.0 ({v1_count}) vs V2.0 ({v2_count}) • Side-by-side analysis")
-with col3:
-    show_version_comparison = st.checkbox("Show version comparison charts", value=False)
 
 # Test round filter
 st.markdown("---")
@@ -280,809 +334,672 @@ with st.sidebar:
     st.markdown("---")
     
     auto_refresh = st.checkbox("Auto-refresh (15s)", value=False)
+    exact_estimates = st.checkbox("Exact estimates", value=False,
+                                  help="Compute medians and unique visitors from raw sessions instead of the rollup sketches (slower; for checking accuracy)")
+    if st.button("Full reload", help="Drop the cached sessions and re-download the whole table"):
+        get_refresher().invalidate()
     
     st.markdown("---")
     st.markdown("**Stats**")
-    st.caption(f"Total DB rows: {len(df_all):,}")
-    st.caption(f"Earliest: {df_all['started_at'].min().strftime('%Y-%m-%d')}")
-    st.caption(f"Latest: {df_all['started_at'].max().strftime('%Y-%m-%d')}")
+    # Every session has a version once backfilled, so the version counts cover the table
+    st.caption(f"Total DB rows: {int(version_counts.sum()):,}")
+    st.caption(f"Earliest: {first_started_at.strftime('%Y-%m-%d')}")
+    st.caption(f"Latest: {last_started_at.strftime('%Y-%m-%d')}")
+    memory = get_refresher().store.memory
+    if memory['typed']:
+        raw = f" (raw {memory['raw'] / 1e6:,.1f} MB)" if memory['raw'] else ""
+        st.caption(f"Memory: {memory['typed'] / 1e6:,.1f} MB{raw}")
+    if snapshot.rollup is not None:
+        st.caption(f"Rollup cube: {snapshot.rollup.memory() / 1e6:,.1f} MB")
+    cached = get_result_cache().stats
+    st.caption(f"Result cache: {cached['entries']} entries, {cached['bytes'] / 1e6:,.1f} MB, "
+               f"{cached['hits']:,} hits / {cached['misses']:,} misses")
+    cached = get_figure_cache().stats
+    st.caption(f"Figure cache: {cached['entries']} entries, {cached['bytes'] / 1e6:,.1f} MB, "
+               f"{cached['hits']:,} hits / {cached['misses']:,} misses")
 
 # Period calculations
 periods = {
     "Today": (today_start, now, today_start - timedelta(days=1), today_start),
     "Last 7 Days": (now - timedelta(days=7), now, now - timedelta(days=14), now - timedelta(days=7)),
     "Last 30 Days": (now - timedelta(days=30), now, now - timedelta(days=60), now - timedelta(days=30)),
-    "All Time": (df_all['started_at'].min(), now, df_all['started_at'].min(), df_all['started_at'].min()),
+    "All Time": (first_started_at, now, first_started_at, first_started_at),
 }
+if period == "Custom":
+    # Whole days, compared against the same number of days just before
+    range_start = datetime.combine(custom_range[0], datetime.min.time(), tzinfo=pytz.UTC)
+    range_end = datetime.combine(custom_range[-1], datetime.min.time(), tzinfo=pytz.UTC) + timedelta(days=1)
+    periods["Custom"] = (range_start, range_end - timedelta(microseconds=1),
+                         range_start - (range_end - range_start), range_start)
 current_start, current_end, prev_start, prev_end = periods[period]
 
-# Filter data
-df_period = df_all[(df_all['started_at'] >= current_start) & (df_all['started_at'] <= current_end)]
-df_filtered = df_period.copy()
-if exclude_bots: df_filtered = df_filtered[df_filtered['is_bot'] != True]
-if show_tiktok_only: df_filtered = df_filtered[df_filtered['utm_source'] == 'tiktok']
-
-# Apply price filter
-if selected_price != "All Prices" and 'price_shown' in df_filtered.columns:
-    price_value = float(selected_price.replace('$', ''))
-    df_filtered = df_filtered[df_filtered['price_shown'] == price_value]
-
-# Apply version filter
-if version_filter == "V2.0 (Outcome-Focused)":
-    df_filtered = df_filtered[df_filtered['version'] == 'V2.0']
-elif version_filter == "V1.0 (Feature-Focused)":
-    df_filtered = df_filtered[df_filtered['version'] == 'V1.0']
-# If "Both Versions", don't filter - keep all data
-
-# Apply test round filter
 selected_test_ids = test_rounds[selected_round]
-if selected_test_ids and 'hero_test_id' in df_filtered.columns:
-    hero_id, social_id, scroll_id = selected_test_ids
-    df_filtered = df_filtered[df_filtered['hero_test_id'] == hero_id]
-
-df_prev = df_all[(df_all['started_at'] >= prev_start) & (df_all['started_at'] < prev_end)]
-if exclude_bots: df_prev = df_prev[df_prev['is_bot'] != True]
-if show_tiktok_only: df_prev = df_prev[df_prev['utm_source'] == 'tiktok']
-
-# Apply price filter to comparison period too
-if selected_price != "All Prices" and 'price_shown' in df_prev.columns:
-    price_value = float(selected_price.replace('$', ''))
-    df_prev = df_prev[df_prev['price_shown'] == price_value]
-
-# Apply test round filter to comparison period
-if selected_test_ids and 'hero_test_id' in df_prev.columns:
-    hero_id, social_id, scroll_id = selected_test_ids
-    df_prev = df_prev[df_prev['hero_test_id'] == hero_id]
+filters = FilterState(
+    exclude_bots=exclude_bots,
+    tiktok_only=show_tiktok_only,
+    price=float(selected_price.replace('$', '')) if selected_price != "All Prices" else None,
+    version={"V2.0 (Outcome-Focused)": 'V2.0', "V1.0 (Feature-Focused)": 'V1.0'}.get(version_filter),
+    test_id=selected_test_ids[0] if selected_test_ids else None,  # rounds are keyed on the hero test id
+)
 
-metrics = calculate_metrics(df_filtered)
-prev_metrics = calculate_metrics(df_prev)
+view = View(
+    snapshot=snapshot,
+    aggregates=get_aggregates(snapshot, exact_estimates),
+    filters=filters,
+    period=period,
+    start=current_start, end=current_end, prev_start=prev_start, prev_end=prev_end,
+    exact=exact_estimates,
+)
+metrics = view.aggregates.metrics(view.start, view.end, filters)
+prev_metrics = view.aggregates.metrics(view.prev_start, view.prev_end, filters, closed='left')
 
 # ============== TRAFFIC OVERVIEW ==============
-st.markdown("---")
-st.markdown('<p class="section-header">Traffic Overview</p>', unsafe_allow_html=True)
-
-total_all = len(df_period)
-total_bots = len(df_period[df_period['is_bot'] == True])
-total_real = total_all - total_bots
-total_tiktok = len(df_period[(df_period['utm_source'] == 'tiktok') & (df_period['is_bot'] != True)])
-
-c1, c2, c3, c4, c5 = st.columns(5)
-c1.metric("Total", f"{total_all:,}", help="All page sessions (time period filtered only)")
-c2.metric("Real", f"{total_real:,}", f"{total_bots} bots" if total_bots > 0 else None, delta_color="off", help="Non-bot sessions (excludes crawlers/monitors)")
-c3.metric("TikTok", f"{total_tiktok:,}", f"{(total_tiktok/total_real*100):.2f}% of real" if total_real > 0 else None, delta_color="off", help="Sessions from TikTok ads (utm_source=tiktok)")
-c4.metric("Other", f"{total_real - total_tiktok:,}", help="Non-TikTok real sessions (direct, organic, etc)")
-c5.metric("Bot Rate", f"{(total_bots/total_all*100):.2f}%" if total_all > 0 else "0.00%", help="% of total sessions flagged as bots")
-
-# Unique Visitors Row
-st.markdown("")  # Small spacing
-unique_visitors = df_period['user_id'].nunique() if 'user_id' in df_period.columns else 0
-new_visitors = len(df_period[df_period['visit_number'] == 1]) if 'visit_number' in df_period.columns else 0
-returning_visitors = len(df_period[df_period['visit_number'] > 1]) if 'visit_number' in df_period.columns else 0
-sessions_per_visitor = total_all / unique_visitors if unique_visitors > 0 else 0
-
-u1, u2, u3, u4, u5 = st.columns(5)
-u1.metric("Unique Visitors", f"{unique_visitors:,}", help="Distinct people (tracked via browser localStorage, NOT IP)")
-u2.metric("New Visitors", f"{new_visitors:,}", f"{(new_visitors/total_all*100):.1f}% of sessions" if total_all > 0 else None, delta_color="off", help="Sessions where visit_number = 1 (first-time visitors)")
-u3.metric("Returning", f"{returning_visitors:,}", f"{(returning_visitors/total_all*100):.1f}% of sessions" if total_all > 0 else None, delta_color="off", help="Sessions where visit_number > 1 (repeat visitors)")
-u4.metric("Sessions/Visitor", f"{sessions_per_visitor:.2f}", help="Average # of sessions per unique person (higher = more engagement)")
-u5.metric("Return Rate", f"{(returning_visitors/total_all*100):.2f}%" if total_all > 0 else "0.00%", help="% of sessions from returning visitors (loyalty metric)")
+@st.fragment
+def traffic_overview(view):
+    st.markdown("---")
+    st.markdown('<p class="section-header">Traffic Overview</p>', unsafe_allow_html=True)
+
+    period_counts = view.aggregates.counts(view.start, view.end, None, by=['is_bot', 'utm_source'], dropna=False)
+    is_bot = period_counts.index.get_level_values('is_bot') == True
+    source = period_counts.index.get_level_values('utm_source')
+    total_all = int(period_counts['sessions'].sum())
+    total_bots = int(period_counts['sessions'][is_bot].sum())
+    total_real = total_all - total_bots
+    total_tiktok = int(period_counts['sessions'][~is_bot & (source == 'tiktok')].sum())
+
+    c1, c2, c3, c4, c5 = st.columns(5)
+    c1.metric("Total", f"{total_all:,}", help="All page sessions (time period filtered only)")
+    c2.metric("Real", f"{total_real:,}", f"{total_bots} bots" if total_bots > 0 else None, delta_color="off", help="Non-bot sessions (excludes crawlers/monitors)")
+    c3.metric("TikTok", f"{total_tiktok:,}", f"{(total_tiktok/total_real*100):.2f}% of real" if total_real > 0 else None, delta_color="off", help="Sessions from TikTok ads (utm_source=tiktok)")
+    c4.metric("Other", f"{total_real - total_tiktok:,}", help="Non-TikTok real sessions (direct, organic, etc)")
+    c5.metric("Bot Rate", f"{(total_bots/total_all*100):.2f}%" if total_all > 0 else "0.00%", help="% of total sessions flagged as bots")
+
+    # Unique Visitors Row
+    st.markdown("")  # Small spacing
+    unique_visitors = view.aggregates.visitors(view.start, view.end)
+    new_visitors = int(period_counts['new_visitors'].sum())
+    returning_visitors = int(period_counts['returning_visitors'].sum())
+    sessions_per_visitor = total_all / unique_visitors if unique_visitors > 0 else 0
+
+    u1, u2, u3, u4, u5 = st.columns(5)
+    u1.metric("Unique Visitors", f"{unique_visitors:,}", help="Distinct people (tracked via browser localStorage, NOT IP)")
+    u2.metric("New Visitors", f"{new_visitors:,}", f"{(new_visitors/total_all*100):.1f}% of sessions" if total_all > 0 else None, delta_color="off", help="Sessions where visit_number = 1 (first-time visitors)")
+    u3.metric("Returning", f"{returning_visitors:,}", f"{(returning_visitors/total_all*100):.1f}% of sessions" if total_all > 0 else None, delta_color="off", help="Sessions where visit_number > 1 (repeat visitors)")
+    u4.metric("Sessions/Visitor", f"{sessions_per_visitor:.2f}", help="Average # of sessions per unique person (higher = more engagement)")
+    u5.metric("Return Rate", f"{(returning_visitors/total_all*100):.2f}%" if total_all > 0 else "0.00%", help="% of sessions from returning visitors (loyalty metric)")
+
 
 # ============== VERSION COMPARISON ==============
-if show_version_comparison and version_filter == "Both Versions":
-    st.markdown("---")
-    st.markdown('<p class="section-header">🚀 V1.0 vs V2.0 Comparison</p>', unsafe_allow_html=True)
-    
-    # Calculate metrics for each version
-    df_v1 = df_filtered[df_filtered['version'] == 'V1.0'] if 'version' in df_filtered.columns else pd.DataFrame()
-    df_v2 = df_filtered[df_filtered['version'] == 'V2.0'] if 'version' in df_filtered.columns else pd.DataFrame()
-    
-    if not df_v1.empty and not df_v2.empty:
-        metrics_v1 = calculate_metrics(df_v1)
-        metrics_v2 = calculate_metrics(df_v2)
-        
-        # Key comparison metrics
-        col1, col2, col3, col4, col5, col6 = st.columns(6)
-        
-        # Sessions
-        sessions_lift = ((metrics_v2['sessions'] - metrics_v1['sessions']) / metrics_v1['sessions'] * 100) if metrics_v1['sessions'] > 0 else 0
-        col1.metric("Sessions", f"V1: {metrics_v1['sessions']:,}\nV2: {metrics_v2['sessions']:,}", f"{sessions_lift:+.1f}%")
-        
-        # CTR
-        ctr_v1 = (metrics_v1['clicked_buy'] / metrics_v1['sessions'] * 100) if metrics_v1['sessions'] > 0 else 0
-        ctr_v2 = (metrics_v2['clicked_buy'] / metrics_v2['sessions'] * 100) if metrics_v2['sessions'] > 0 else 0
-        ctr_lift = ctr_v2 - ctr_v1
-        col2.metric("CTR", f"V1: {ctr_v1:.2f}%\nV2: {ctr_v2:.2f}%", f"{ctr_lift:+.2f}pp")
-        
-        # Checkout Rate
-        checkout_v1 = (metrics_v1['initiated_checkout'] / metrics_v1['sessions'] * 100) if metrics_v1['sessions'] > 0 else 0
-        checkout_v2 = (metrics_v2['initiated_checkout'] / metrics_v2['sessions'] * 100) if metrics_v2['sessions'] > 0 else 0
-        checkout_lift = checkout_v2 - checkout_v1
-        col3.metric("Checkout Rate", f"V1: {checkout_v1:.2f}%\nV2: {checkout_v2:.2f}%", f"{checkout_lift:+.2f}pp")
-        
-        # Time on Site
-        time_lift = metrics_v2['median_time'] - metrics_v1['median_time']
-        col4.metric("Median Time", f"V1: {metrics_v1['median_time']:.2f}s\nV2: {metrics_v2['median_time']:.2f}s", f"{time_lift:+.2f}s")
-        
-        # Scroll Depth
-        scroll_lift = metrics_v2['median_scroll'] - metrics_v1['median_scroll']
-        col5.metric("Median Scroll", f"V1: {metrics_v1['median_scroll']:.2f}%\nV2: {metrics_v2['median_scroll']:.2f}%", f"{scroll_lift:+.2f}%")
-        
-        # Purchases
-        purchases_v1 = metrics_v1['purchased']
-        purchases_v2 = metrics_v2['purchased']
-        col6.metric("Purchases", f"V1: {purchases_v1}\nV2: {purchases_v2}", f"+{purchases_v2 - purchases_v1}" if purchases_v2 > purchases_v1 else f"{purchases_v2 - purchases_v1}")
-        
-        # Comparison charts
-        st.markdown("**📊 Side-by-Side Comparison**")
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            # CTR Comparison
-            fig = go.Figure()
-            fig.add_trace(go.Bar(
-                name='V1.0',
-                x=['CTR %'],
-                y=[ctr_v1],
-                marker_color='#3b82f6',
-                text=[f"{ctr_v1:.2f}%"],
-                textposition='outside'
-            ))
-            fig.add_trace(go.Bar(
-                name='V2.0',
-                x=['CTR %'],
-                y=[ctr_v2],
-                marker_color='#10b981',
-                text=[f"{ctr_v2:.2f}%"],
-                textposition='outside'
-            ))
-            fig.update_layout(**plotly_layout, height=200, title=dict(text="Click-Through Rate Comparison", font=dict(size=12)))
-            st.plotly_chart(fig, use_container_width=True)
-        
-        with col2:
-            # Checkout Rate Comparison
-            fig = go.Figure()
-            fig.add_trace(go.Bar(
-                name='V1.0',
-                x=['Checkout %'],
-                y=[checkout_v1],
-                marker_color='#3b82f6',
-                text=[f"{checkout_v1:.2f}%"],
-                textposition='outside'
-            ))
-            fig.add_trace(go.Bar(
-                name='V2.0',
-                x=['Checkout %'],
-                y=[checkout_v2],
-                marker_color='#10b981',
-                text=[f"{checkout_v2:.2f}%"],
-                textposition='outside'
-            ))
-            fig.update_layout(**plotly_layout, height=200, title=dict(text="Checkout Rate Comparison", font=dict(size=12)))
-            st.plotly_chart(fig, use_container_width=True)
-        
-        # Winner callout
-        if ctr_v2 > ctr_v1:
-            st.success(f"📈 **V2.0 (Outcome-Focused) is winning!** CTR is {ctr_lift:+.2f} percentage points higher ({(ctr_lift/ctr_v1*100):+.1f}% relative improvement)")
-        elif ctr_v1 > ctr_v2:
-            st.warning(f"📉 V1.0 is performing better. CTR is {abs(ctr_lift):.2f} percentage points higher than V2.0")
+@st.fragment
+def version_comparison(view):
+    if view.filters.version is None:  # Both Versions
+        if not st.checkbox("Show version comparison charts", value=False):
+            return
+        st.markdown("---")
+        st.markdown('<p class="section-header">🚀 V1.0 vs V2.0 Comparison</p>', unsafe_allow_html=True)
+
+        # Calculate metrics for each version in one grouped pass
+        version_metrics = view.aggregates.metrics(view.start, view.end, view.filters, by='version')
+
+        if 'V1.0' in version_metrics.index and 'V2.0' in version_metrics.index:
+            metrics_v1 = metrics_row(version_metrics, 'V1.0')
+            metrics_v2 = metrics_row(version_metrics, 'V2.0')
+
+            # Key comparison metrics
+            col1, col2, col3, col4, col5, col6 = st.columns(6)
+
+            # Sessions
+            sessions_lift = ((metrics_v2['sessions'] - metrics_v1['sessions']) / metrics_v1['sessions'] * 100) if metrics_v1['sessions'] > 0 else 0
+            col1.metric("Sessions", f"V1: {metrics_v1['sessions']:,}\nV2: {metrics_v2['sessions']:,}", f"{sessions_lift:+.1f}%")
+
+            # CTR
+            ctr_v1 = (metrics_v1['clicked_buy'] / metrics_v1['sessions'] * 100) if metrics_v1['sessions'] > 0 else 0
+            ctr_v2 = (metrics_v2['clicked_buy'] / metrics_v2['sessions'] * 100) if metrics_v2['sessions'] > 0 else 0
+            ctr_lift = ctr_v2 - ctr_v1
+            col2.metric("CTR", f"V1: {ctr_v1:.2f}%\nV2: {ctr_v2:.2f}%", f"{ctr_lift:+.2f}pp")
+
+            # Checkout Rate
+            checkout_v1 = (metrics_v1['initiated_checkout'] / metrics_v1['sessions'] * 100) if metrics_v1['sessions'] > 0 else 0
+            checkout_v2 = (metrics_v2['initiated_checkout'] / metrics_v2['sessions'] * 100) if metrics_v2['sessions'] > 0 else 0
+            checkout_lift = checkout_v2 - checkout_v1
+            col3.metric("Checkout Rate", f"V1: {checkout_v1:.2f}%\nV2: {checkout_v2:.2f}%", f"{checkout_lift:+.2f}pp")
+
+            # Time on Site
+            time_lift = metrics_v2['median_time'] - metrics_v1['median_time']
+            col4.metric("Median Time", f"V1: {metrics_v1['median_time']:.2f}s\nV2: {metrics_v2['median_time']:.2f}s", f"{time_lift:+.2f}s")
+
+            # Scroll Depth
+            scroll_lift = metrics_v2['median_scroll'] - metrics_v1['median_scroll']
+            col5.metric("Median Scroll", f"V1: {metrics_v1['median_scroll']:.2f}%\nV2: {metrics_v2['median_scroll']:.2f}%", f"{scroll_lift:+.2f}%")
+
+            # Purchases
+            purchases_v1 = metrics_v1['purchased']
+            purchases_v2 = metrics_v2['purchased']
+            col6.metric("Purchases", f"V1: {purchases_v1}\nV2: {purchases_v2}", f"+{purchases_v2 - purchases_v1}" if purchases_v2 > purchases_v1 else f"{purchases_v2 - purchases_v1}")
+
+            # Comparison charts
+            st.markdown("**📊 Side-by-Side Comparison**")
+            col1, col2 = st.columns(2)
+
+            with col1:
+                # CTR Comparison
+                def build():
+                    fig = go.Figure()
+                    fig.add_trace(go.Bar(
+                        name='V1.0',
+                        x=['CTR %'],
+                        y=[ctr_v1],
+                        marker_color='#3b82f6',
+                        text=[f"{ctr_v1:.2f}%"],
+                        textposition='outside'
+                    ))
+                    fig.add_trace(go.Bar(
+                        name='V2.0',
+                        x=['CTR %'],
+                        y=[ctr_v2],
+                        marker_color='#10b981',
+                        text=[f"{ctr_v2:.2f}%"],
+                        textposition='outside'
+                    ))
+                    fig.update_layout(**plotly_layout, height=200, title=dict(text="Click-Through Rate Comparison", font=dict(size=12)))
+                    return fig
+                view.chart('version_ctr', build)
+
+            with col2:
+                # Checkout Rate Comparison
+                def build():
+                    fig = go.Figure()
+                    fig.add_trace(go.Bar(
+                        name='V1.0',
+                        x=['Checkout %'],
+                        y=[checkout_v1],
+                        marker_color='#3b82f6',
+                        text=[f"{checkout_v1:.2f}%"],
+                        textposition='outside'
+                    ))
+                    fig.add_trace(go.Bar(
+                        name='V2.0',
+                        x=['Checkout %'],
+                        y=[checkout_v2],
+                        marker_color='#10b981',
+                        text=[f"{checkout_v2:.2f}%"],
+                        textposition='outside'
+                    ))
+                    fig.update_layout(**plotly_layout, height=200, title=dict(text="Checkout Rate Comparison", font=dict(size=12)))
+                    return fig
+                view.chart('version_checkout', build)
+
+            # Winner callout
+            if ctr_v2 > ctr_v1:
+                st.success(f"📈 **V2.0 (Outcome-Focused) is winning!** CTR is {ctr_lift:+.2f} percentage points higher ({(ctr_lift/ctr_v1*100):+.1f}% relative improvement)")
+            elif ctr_v1 > ctr_v2:
+                st.warning(f"📉 V1.0 is performing better. CTR is {abs(ctr_lift):.2f} percentage points higher than V2.0")
+            else:
+                st.info("⚖️ Both versions performing similarly so far")
         else:
-            st.info("⚖️ Both versions performing similarly so far")
-    else:
-        st.caption("⏳ Not enough data yet for version comparison. Keep monitoring!")
+            st.caption("⏳ Not enough data yet for version comparison. Keep monitoring!")
+
 
 # ============== ENGAGEMENT ==============
-st.markdown("---")
-st.markdown('<p class="section-header">Engagement Metrics</p>', unsafe_allow_html=True)
+@st.fragment
+def engagement(view, metrics, prev_metrics, compare):
+    st.markdown("---")
+    st.markdown('<p class="section-header">Engagement Metrics</p>', unsafe_allow_html=True)
+
+    c1, c2, c3, c4, c5, c6 = st.columns(6)
 
-c1, c2, c3, c4, c5, c6 = st.columns(6)
+    delta = calc_delta(metrics['sessions'], prev_metrics['sessions']) if compare and view.period != "All Time" else None
+    c1.metric("Sessions", f"{metrics['sessions']:,}", f"{delta:+.2f}%" if delta else None, help="Session-based (all filters applied: time, price, version, test round, TikTok, bots)")
 
-delta = calc_delta(metrics['sessions'], prev_metrics['sessions']) if compare and period != "All Time" else None
-c1.metric("Sessions", f"{metrics['sessions']:,}", f"{delta:+.2f}%" if delta else None, help="Session-based (all filters applied: time, price, version, test round, TikTok, bots)")
+    delta = calc_delta(metrics['median_time'], prev_metrics['median_time']) if compare and view.period != "All Time" else None
+    c2.metric("Median Time", f"{metrics['median_time']:.2f}s", f"{delta:+.2f}%" if delta else None, help="Median time per session (excludes 0s & outliers >30min)")
 
-delta = calc_delta(metrics['median_time'], prev_metrics['median_time']) if compare and period != "All Time" else None
-c2.metric("Median Time", f"{metrics['median_time']:.2f}s", f"{delta:+.2f}%" if delta else None, help="Median time per session (excludes 0s & outliers >30min)")
+    delta = calc_delta(metrics['median_scroll'], prev_metrics['median_scroll']) if compare and view.period != "All Time" else None
+    c3.metric("Median Scroll", f"{metrics['median_scroll']:.2f}%", f"{delta:+.2f}%" if delta else None, help="Median scroll depth per session (0-100%)")
 
-delta = calc_delta(metrics['median_scroll'], prev_metrics['median_scroll']) if compare and period != "All Time" else None
-c3.metric("Median Scroll", f"{metrics['median_scroll']:.2f}%", f"{delta:+.2f}%" if delta else None, help="Median scroll depth per session (0-100%)")
+    c4.metric("Bounce Rate", f"{metrics['bounce_rate']:.2f}%", help="% of sessions with 0 time or 0 scroll (instant exits)")
 
-c4.metric("Bounce Rate", f"{metrics['bounce_rate']:.2f}%", help="% of sessions with 0 time or 0 scroll (instant exits)")
+    engaged_rate = (metrics['engaged_sessions'] / metrics['sessions'] * 100) if metrics['sessions'] > 0 else 0
+    c5.metric("Engaged", f"{engaged_rate:.2f}%", help="% of sessions with >10s time AND >25% scroll (quality visits)")
 
-engaged_rate = (metrics['engaged_sessions'] / metrics['sessions'] * 100) if metrics['sessions'] > 0 else 0
-c5.metric("Engaged", f"{engaged_rate:.2f}%", help="% of sessions with >10s time AND >25% scroll (quality visits)")
+    c6.metric("Clicks", f"{int(metrics['total_clicks']):,}", help="Total clicks across all filtered sessions")
 
-c6.metric("Clicks", f"{int(metrics['total_clicks']):,}", help="Total clicks across all filtered sessions")
 
 # ============== CONVERSION FUNNEL ==============
-st.markdown("---")
-st.markdown('<p class="section-header">Conversion Funnel</p>', unsafe_allow_html=True)
-
-sessions = metrics['sessions']
-clicked = int(metrics['clicked_buy'])
-checkout = int(metrics['initiated_checkout'])
-purchased = int(metrics['purchased'])
-
-c1, c2, c3, c4 = st.columns(4)
-c1.metric("Sessions", f"{sessions:,}", help="Total filtered sessions (all filters applied)")
-c2.metric("Clicked Buy", f"{clicked:,}", f"{(clicked/sessions*100):.2f}%" if sessions > 0 else "0.00%", delta_color="off", help="Sessions that clicked any buy button (CTR)")
-c3.metric("Checkout", f"{checkout:,}", f"{(checkout/sessions*100):.2f}%" if sessions > 0 else "0.00%", delta_color="off", help="Sessions that landed on Stripe checkout page")
-c4.metric("Purchased", f"{purchased:,}", f"{(purchased/sessions*100):.2f}%" if sessions > 0 else "0.00%", delta_color="off", help="Sessions that completed payment (conversion rate)")
-
-# Funnel chart
-fig = go.Figure(go.Funnel(
-    y=['Sessions', 'Buy Click', 'Checkout', 'Purchase'],
-    x=[sessions, clicked, checkout, purchased],
-    textinfo="value+percent initial",
-    marker=dict(color=[colors['primary'], colors['secondary'], colors['info'], colors['success']]),
-    connector=dict(line=dict(color="#334155", width=1))
-))
-fig.update_layout(**plotly_layout, height=200, showlegend=False)
-st.plotly_chart(fig, use_container_width=True)
+@st.fragment
+def conversion_funnel(view, metrics):
+    st.markdown("---")
+    st.markdown('<p class="section-header">Conversion Funnel</p>', unsafe_allow_html=True)
+
+    sessions = metrics['sessions']
+    clicked = int(metrics['clicked_buy'])
+    checkout = int(metrics['initiated_checkout'])
+    purchased = int(metrics['purchased'])
+
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Sessions", f"{sessions:,}", help="Total filtered sessions (all filters applied)")
+    c2.metric("Clicked Buy", f"{clicked:,}", f"{(clicked/sessions*100):.2f}%" if sessions > 0 else "0.00%", delta_color="off", help="Sessions that clicked any buy button (CTR)")
+    c3.metric("Checkout", f"{checkout:,}", f"{(checkout/sessions*100):.2f}%" if sessions > 0 else "0.00%", delta_color="off", help="Sessions that landed on Stripe checkout page")
+    c4.metric("Purchased", f"{purchased:,}", f"{(purchased/sessions*100):.2f}%" if sessions > 0 else "0.00%", delta_color="off", help="Sessions that completed payment (conversion rate)")
+
+    # Funnel chart
+    def build():
+        fig = go.Figure(go.Funnel(
+            y=['Sessions', 'Buy Click', 'Checkout', 'Purchase'],
+            x=[sessions, clicked, checkout, purchased],
+            textinfo="value+percent initial",
+            marker=dict(color=[colors['primary'], colors['secondary'], colors['info'], colors['success']]),
+            connector=dict(line=dict(color="#334155", width=1))
+        ))
+        fig.update_layout(**plotly_layout, height=200, showlegend=False)
+        return fig
+    view.chart('funnel', build)
+
 
 # ============== TREND ANALYSIS ==============
-st.markdown("---")
-st.markdown('<p class="section-header">📈 Trend Analysis - Key Metrics Over Time</p>', unsafe_allow_html=True)
+@st.fragment
+def trend_analysis(view):
+    st.markdown("---")
+    st.markdown('<p class="section-header">📈 Trend Analysis - Key Metrics Over Time</p>', unsafe_allow_html=True)
+    if not section_open("Show trends", 'trends'):
+        return
+
+    if view.empty:
+        st.caption("No data available for trend analysis")
+        return
+
+    panels = st.multiselect("Panels", list(TREND_PANELS), default=list(TREND_PANELS), key='trend_panels')
+    if not panels:
+        st.caption("Pick at least one panel")
+        return
 
-if not df_filtered.empty:
-    # Prepare data with time buckets
-    df_trends = df_filtered.copy()
-    time_bucket = 'H' if period == 'Today' else 'D'
-    df_trends['bucket'] = df_trends['started_at'].dt.floor(time_bucket)
-    
     # Calculate metrics per time bucket
-    trend_data = df_trends.groupby('bucket').agg({
-        'session_id': 'count',  # Total sessions
-        'time_on_site_sec': [
-            lambda x: x[(x > 0) & (x <= 1800)].median() if len(x[(x > 0) & (x <= 1800)]) > 0 else 0,
-            lambda x: len(x[x > 5]),  # Count of users with >5 sec
-            lambda x: len(x[x > 10]),  # Count of users with >10 sec
-        ],
-        'scroll_depth_pct': [
-            lambda x: x[x > 0].median() if len(x[x > 0]) > 0 else 0,
-            lambda x: len(x[x > 25]),  # Count of users with >25% scroll
-            lambda x: len(x[x > 50]),  # Count of users with >50% scroll
-        ],
-        'clicks_total': 'sum',
-        'clicked_buy': 'sum',
-        'initiated_checkout': 'sum',
-    }).reset_index()
-    
-    # Flatten column names
-    trend_data.columns = ['date', 'sessions', 'median_time', 'users_5sec', 'users_10sec', 
-                          'median_scroll', 'users_25scroll', 'users_50scroll', 
-                          'clicks', 'buy_clicks', 'checkouts']
-    
-    # Calculate rates
-    trend_data['ctr'] = (trend_data['buy_clicks'] / trend_data['sessions'] * 100).fillna(0)
-    trend_data['checkout_rate'] = (trend_data['checkouts'] / trend_data['buy_clicks'] * 100).fillna(0)
-    trend_data['engaged_rate'] = (trend_data['users_10sec'] / trend_data['sessions'] * 100).fillna(0)
-    
-    # Create 4 rows of 2 columns for 8 charts
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        st.markdown("**Sessions Over Time**")
-        fig = go.Figure()
-        fig.add_trace(go.Scatter(
-            x=trend_data['date'], y=trend_data['sessions'],
-            mode='lines+markers',
-            line=dict(color='#3b82f6', width=3),
-            marker=dict(size=8, color='#60a5fa'),
-            fill='tozeroy',
-            fillcolor='rgba(59, 130, 246, 0.15)',
-            hovertemplate='%{y} sessions<extra></extra>'
-        ))
-        fig.update_layout(**plotly_layout, height=200, showlegend=False)
-        st.plotly_chart(fig, use_container_width=True)
-    
-    with col2:
-        st.markdown("**Median Time on Site (seconds)**")
-        fig = go.Figure()
-        fig.add_trace(go.Scatter(
-            x=trend_data['date'], y=trend_data['median_time'],
-            mode='lines+markers',
-            line=dict(color='#10b981', width=3),
-            marker=dict(size=8, color='#34d399'),
-            fill='tozeroy',
-            fillcolor='rgba(16, 185, 129, 0.15)',
-            hovertemplate='%{y:.2f}s<extra></extra>'
-        ))
-        fig.update_layout(**plotly_layout, height=200, showlegend=False)
-        st.plotly_chart(fig, use_container_width=True)
-    
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        st.markdown("**Median Scroll Depth (%)**")
-        fig = go.Figure()
-        fig.add_trace(go.Scatter(
-            x=trend_data['date'], y=trend_data['median_scroll'],
-            mode='lines+markers',
-            line=dict(color='#8b5cf6', width=3),
-            marker=dict(size=8, color='#a78bfa'),
-            fill='tozeroy',
-            fillcolor='rgba(139, 92, 246, 0.15)',
-            hovertemplate='%{y:.2f}%<extra></extra>'
-        ))
-        fig.update_layout(**plotly_layout, height=200, showlegend=False)
-        st.plotly_chart(fig, use_container_width=True)
-    
-    with col2:
-        st.markdown("**Total Clicks Over Time**")
-        fig = go.Figure()
-        fig.add_trace(go.Scatter(
-            x=trend_data['date'], y=trend_data['clicks'],
-            mode='lines+markers',
-            line=dict(color='#f59e0b', width=3),
-            marker=dict(size=8, color='#fbbf24'),
-            fill='tozeroy',
-            fillcolor='rgba(245, 158, 11, 0.15)',
-            hovertemplate='%{y} clicks<extra></extra>'
-        ))
-        fig.update_layout(**plotly_layout, height=200, showlegend=False)
-        st.plotly_chart(fig, use_container_width=True)
-    
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        st.markdown("**Buy Button Clicks Over Time**")
-        fig = go.Figure()
-        fig.add_trace(go.Scatter(
-            x=trend_data['date'], y=trend_data['buy_clicks'],
-            mode='lines+markers',
-            line=dict(color='#06b6d4', width=3),
-            marker=dict(size=8, color='#22d3ee'),
-            fill='tozeroy',
-            fillcolor='rgba(6, 182, 212, 0.15)',
-            hovertemplate='%{y} buy clicks<extra></extra>'
-        ))
-        fig.update_layout(**plotly_layout, height=200, showlegend=False)
-        st.plotly_chart(fig, use_container_width=True)
-    
-    with col2:
-        st.markdown("**Checkouts Over Time**")
-        fig = go.Figure()
-        fig.add_trace(go.Scatter(
-            x=trend_data['date'], y=trend_data['checkouts'],
-            mode='lines+markers',
-            line=dict(color='#ef4444', width=3),
-            marker=dict(size=8, color='#f87171'),
-            fill='tozeroy',
-            fillcolor='rgba(239, 68, 68, 0.15)',
-            hovertemplate='%{y} checkouts<extra></extra>'
-        ))
-        fig.update_layout(**plotly_layout, height=200, showlegend=False)
-        st.plotly_chart(fig, use_container_width=True)
-    
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        st.markdown("**Click-Through Rate (CTR) %**")
-        fig = go.Figure()
-        fig.add_trace(go.Scatter(
-            x=trend_data['date'], y=trend_data['ctr'],
-            mode='lines+markers',
-            line=dict(color='#ec4899', width=3),
-            marker=dict(size=8, color='#f472b6'),
-            fill='tozeroy',
-            fillcolor='rgba(236, 72, 153, 0.15)',
-            hovertemplate='%{y:.2f}%<extra></extra>'
-        ))
-        fig.update_layout(**plotly_layout, height=200, showlegend=False)
-        st.plotly_chart(fig, use_container_width=True)
-    
-    with col2:
-        st.markdown("**Checkout Rate (% of buy clicks)**")
-        fig = go.Figure()
-        fig.add_trace(go.Scatter(
-            x=trend_data['date'], y=trend_data['checkout_rate'],
-            mode='lines+markers',
-            line=dict(color='#14b8a6', width=3),
-            marker=dict(size=8, color='#2dd4bf'),
-            fill='tozeroy',
-            fillcolor='rgba(20, 184, 166, 0.15)',
-            hovertemplate='%{y:.2f}%<extra></extra>'
-        ))
-        fig.update_layout(**plotly_layout, height=200, showlegend=False)
-        st.plotly_chart(fig, use_container_width=True)
-    
-    # Additional engagement metrics
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        st.markdown("**Users Who Spend Time (>10 sec)**")
-        fig = go.Figure()
-        fig.add_trace(go.Scatter(
-            x=trend_data['date'], y=trend_data['users_10sec'],
-            mode='lines+markers',
-            line=dict(color='#22c55e', width=3),
-            marker=dict(size=8, color='#4ade80'),
-            fill='tozeroy',
-            fillcolor='rgba(34, 197, 94, 0.15)',
-            name='Users >10s',
-            hovertemplate='%{y} users<extra></extra>'
-        ))
-        fig.add_trace(go.Scatter(
-            x=trend_data['date'], y=trend_data['users_5sec'],
-            mode='lines',
-            line=dict(color='#86efac', width=2, dash='dash'),
-            name='Users >5s',
-            hovertemplate='%{y} users<extra></extra>'
-        ))
-        fig.update_layout(**plotly_layout, height=200, showlegend=True, 
-                         legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1))
-        st.plotly_chart(fig, use_container_width=True)
-    
-    with col2:
-        st.markdown("**Users Who Scroll (>25% depth)**")
-        fig = go.Figure()
-        fig.add_trace(go.Scatter(
-            x=trend_data['date'], y=trend_data['users_25scroll'],
-            mode='lines+markers',
-            line=dict(color='#a855f7', width=3),
-            marker=dict(size=8, color='#c084fc'),
-            fill='tozeroy',
-            fillcolor='rgba(168, 85, 247, 0.15)',
-            name='Users >25%',
-            hovertemplate='%{y} users<extra></extra>'
-        ))
-        fig.add_trace(go.Scatter(
-            x=trend_data['date'], y=trend_data['users_50scroll'],
-            mode='lines',
-            line=dict(color='#d8b4fe', width=2, dash='dash'),
-            name='Users >50%',
-            hovertemplate='%{y} users<extra></extra>'
-        ))
-        fig.update_layout(**plotly_layout, height=200, showlegend=True,
-                         legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1))
-        st.plotly_chart(fig, use_container_width=True)
-    
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        st.markdown("**Engagement Rate (% >10 sec)**")
-        fig = go.Figure()
-        fig.add_trace(go.Scatter(
-            x=trend_data['date'], y=trend_data['engaged_rate'],
-            mode='lines+markers',
-            line=dict(color='#0ea5e9', width=3),
-            marker=dict(size=8, color='#38bdf8'),
-            fill='tozeroy',
-            fillcolor='rgba(14, 165, 233, 0.15)',
-            hovertemplate='%{y:.2f}%<extra></extra>'
-        ))
-        fig.update_layout(**plotly_layout, height=200, showlegend=False)
-        st.plotly_chart(fig, use_container_width=True)
-    
-    with col2:
-        st.markdown("**Quality Score Trend**")
-        st.caption("Combined metric: (Engaged Rate × CTR) / 100")
-        # Quality score = engagement × conversion
-        trend_data['quality_score'] = (trend_data['engaged_rate'] * trend_data['ctr']) / 100
-        fig = go.Figure()
-        fig.add_trace(go.Scatter(
-            x=trend_data['date'], y=trend_data['quality_score'],
-            mode='lines+markers',
-            line=dict(color='#f97316', width=3),
-            marker=dict(size=8, color='#fb923c'),
-            fill='tozeroy',
-            fillcolor='rgba(249, 115, 22, 0.15)',
-            hovertemplate='%{y:.2f}<extra></extra>'
-        ))
-        fig.update_layout(**plotly_layout, height=200, showlegend=False)
-        st.plotly_chart(fig, use_container_width=True)
-    
+    trend_data = view.aggregates.trend(view.start, view.end, view.filters, 'h' if view.period == 'Today' else 'D')
+    view.chart('trends', lambda: trend_figure(trend_data, panels, plotly_layout, HALF_WIDTH), tuple(panels))
+
     st.caption("💡 Track these trends over time to see if your optimizations and A/B test winners are improving performance")
-else:
-    st.caption("No data available for trend analysis")
+
 
 # ============== PRICE TEST RESULTS ==============
-st.markdown("---")
-st.markdown('<p class="section-header">Price Test Results</p>', unsafe_allow_html=True)
-
-if 'price_shown' in df_filtered.columns:
-    # Get price breakdown
-    price_stats = df_filtered.groupby('price_shown').agg({
-        'session_id': 'count',
-        'clicked_buy': 'sum',
-        'initiated_checkout': 'sum',
-        'purchased': 'sum',
-        'time_on_site_sec': 'median',
-        'scroll_depth_pct': 'median'
-    }).reset_index()
-    price_stats.columns = ['Price', 'Sessions', 'Clicked Buy', 'Checkouts', 'Purchases', 'Median Time', 'Median Scroll']
-    
-    if len(price_stats) > 0:
-        col1, col2 = st.columns([2, 1])
-        
-        with col1:
-            # Price comparison chart
-            fig = go.Figure()
-            
-            for i, row in price_stats.iterrows():
-                price = f"${row['Price']:.0f}" if pd.notna(row['Price']) else "Unknown"
-                sessions = row['Sessions']
-                ctr = (row['Clicked Buy'] / sessions * 100) if sessions > 0 else 0
-                
-                fig.add_trace(go.Bar(
-                    name=price,
-                    x=['Sessions', 'CTR %', 'Checkout %'],
-                    y=[sessions, ctr, (row['Checkouts'] / sessions * 100) if sessions > 0 else 0],
-                    text=[f"{sessions}", f"{ctr:.2f}%", f"{(row['Checkouts'] / sessions * 100):.2f}%" if sessions > 0 else "0%"],
-                    textposition='outside',
-                    marker_color='#10b981' if row['Price'] == 17 else '#3b82f6'
-                ))
-            
-            fig.update_layout(**plotly_layout, height=220, barmode='group', title=dict(text="Performance by Price Point", font=dict(size=12)))
-            st.plotly_chart(fig, use_container_width=True)
-        
-        with col2:
-            st.markdown("**Price Breakdown**")
-            for _, row in price_stats.iterrows():
-                price = f"${row['Price']:.0f}" if pd.notna(row['Price']) else "Unknown"
-                sessions = row['Sessions']
-                ctr = (row['Clicked Buy'] / sessions * 100) if sessions > 0 else 0
-                purchases = int(row['Purchases'])
-                
-                st.markdown(f"""
-                **{price}**: {sessions} sessions
-                - CTR: {ctr:.2f}%
-                - Purchases: {purchases}
-                """)
+@st.fragment
+def price_test(view):
+    st.markdown("---")
+    st.markdown('<p class="section-header">Price Test Results</p>', unsafe_allow_html=True)
+    if not section_open("Show price test", 'price_test'):
+        return
+
+    if 'price_shown' in view.columns:
+        # Get price breakdown
+        price_stats = view.aggregates.price_stats(view.start, view.end, view.filters).set_axis(
+            ['Price', 'Sessions', 'Clicked Buy', 'Checkouts', 'Purchases'], axis=1)
+
+        if len(price_stats) > 0:
+            col1, col2 = st.columns([2, 1])
+
+            with col1:
+                # Price comparison chart
+                def build():
+                    fig = go.Figure()
+
+                    for i, row in price_stats.iterrows():
+                        price = f"${row['Price']:.0f}" if pd.notna(row['Price']) else "Unknown"
+                        sessions = int(row['Sessions'])
+                        ctr = (row['Clicked Buy'] / sessions * 100) if sessions > 0 else 0
+
+                        fig.add_trace(go.Bar(
+                            name=price,
+                            x=['Sessions', 'CTR %', 'Checkout %'],
+                            y=[sessions, ctr, (row['Checkouts'] / sessions * 100) if sessions > 0 else 0],
+                            text=[f"{sessions}", f"{ctr:.2f}%", f"{(row['Checkouts'] / sessions * 100):.2f}%" if sessions > 0 else "0%"],
+                            textposition='outside',
+                            marker_color='#10b981' if row['Price'] == 17 else '#3b82f6'
+                        ))
+
+                    fig.update_layout(**plotly_layout, height=220, barmode='group', title=dict(text="Performance by Price Point", font=dict(size=12)))
+                    return fig
+                view.chart('price', build)
+
+            with col2:
+                st.markdown("**Price Breakdown**")
+                for _, row in price_stats.iterrows():
+                    price = f"${row['Price']:.0f}" if pd.notna(row['Price']) else "Unknown"
+                    sessions = int(row['Sessions'])
+                    ctr = (row['Clicked Buy'] / sessions * 100) if sessions > 0 else 0
+                    purchases = int(row['Purchases'])
+
+                    st.markdown(f"""
+                    **{price}**: {sessions} sessions
+                    - CTR: {ctr:.2f}%
+                    - Purchases: {purchases}
+                    """)
+        else:
+            st.caption("No price data available yet")
     else:
-        st.caption("No price data available yet")
-else:
-    st.caption("Price tracking not yet active - new sessions will include price data")
+        st.caption("Price tracking not yet active - new sessions will include price data")
+
 
 # ============== A/B TESTING ==============
-st.markdown("---")
-st.markdown('<p class="section-header">A/B Test Results</p>', unsafe_allow_html=True)
-
-# Test definitions per round
-if selected_round == "Round 2 (Current)":
-    tests = [
-        ('📝 Headline Copy', 'hero_variant', '#3b82f6', '#f59e0b', 'Product Name', 'Pain-Focused'),
-        ('⭐ Social Proof Copy', 'social_proof_variant', '#8b5cf6', '#10b981', '"200+ sold"', '"327 this week"'),
-        ('🔘 CTA Button Copy', 'scroll_hook_variant', '#06b6d4', '#ef4444', '"Get Instant Access"', '"Download Now - $17"'),
-    ]
-elif selected_round == "Round 1 (Completed)":
-    tests = [
-        ('🦸 Hero Layout', 'hero_variant', '#3b82f6', '#f59e0b', 'Price Visible', 'Hook-First'),
-        ('👥 Social Proof', 'social_proof_variant', '#8b5cf6', '#10b981', 'Hidden', 'Stars Visible'),
-        ('🎣 Scroll Hook', 'scroll_hook_variant', '#06b6d4', '#ef4444', 'Generic', 'Curiosity'),
-    ]
-else:  # All Rounds
-    tests = [
-        ('🧪 Hero Test', 'hero_variant', '#3b82f6', '#f59e0b', 'Control', 'Test'),
-        ('🧪 Social Proof Test', 'social_proof_variant', '#8b5cf6', '#10b981', 'Control', 'Test'),
-        ('🧪 Scroll Hook Test', 'scroll_hook_variant', '#06b6d4', '#ef4444', 'Control', 'Test'),
-    ]
-
-for name, variant_col, color1, color2, control_label, test_label in tests:
-    stats = calculate_ab_stats(df_filtered, variant_col)
-    
-    if stats is None or len(stats) < 2:
-        continue
-    
-    control = stats[stats['variant'] == 'control'].iloc[0] if 'control' in stats['variant'].values else None
-    test = stats[stats['variant'] == 'test'].iloc[0] if 'test' in stats['variant'].values else None
-    
-    if control is None or test is None:
-        continue
-    
-    lift = ((test['click_rate'] - control['click_rate']) / control['click_rate'] * 100) if control['click_rate'] > 0 else 0
-    
-    st.markdown(f"### {name}")
-    st.caption(f"**A:** {control_label} vs **B:** {test_label}")
-    
-    col1, col2, col3, col4 = st.columns(4)
-    
-    # Key metrics with descriptive labels
-    with col1:
-        st.metric(f"A: {control_label[:15]}", f"{int(control['sessions'])} sess")
-    with col2:
-        st.metric(f"B: {test_label[:15]}", f"{int(test['sessions'])} sess")
-    with col3:
-        st.metric("A CTR", f"{control['click_rate']:.2f}%")
-    with col4:
-        st.metric("B CTR", f"{test['click_rate']:.2f}%")
-    
-    # Charts
-    col1, col2, col3 = st.columns(3)
-    
-    with col1:
-        # Click Rate comparison
-        fig = go.Figure(go.Bar(
-            x=[control_label[:12], test_label[:12]],
-            y=[control['click_rate'], test['click_rate']],
-            marker=dict(color=[color1, color2]),
-            text=[f"{control['click_rate']:.2f}%", f"{test['click_rate']:.2f}%"],
-            textposition='outside'
-        ))
-        fig.update_layout(**plotly_layout, height=180, title=dict(text="Click Rate %", font=dict(size=12)))
-        st.plotly_chart(fig, use_container_width=True)
-    
-    with col2:
-        # Time comparison
-        fig = go.Figure(go.Bar(
-            x=[control_label[:12], test_label[:12]],
-            y=[control['median_time'], test['median_time']],
-            marker=dict(color=[color1, color2]),
-            text=[f"{control['median_time']:.2f}s", f"{test['median_time']:.2f}s"],
-            textposition='outside'
-        ))
-        fig.update_layout(**plotly_layout, height=180, title=dict(text="Median Time (s)", font=dict(size=12)))
-        st.plotly_chart(fig, use_container_width=True)
-    
-    with col3:
-        # Scroll comparison
-        fig = go.Figure(go.Bar(
-            x=[control_label[:12], test_label[:12]],
-            y=[control['median_scroll'], test['median_scroll']],
-            marker=dict(color=[color1, color2]),
-            text=[f"{control['median_scroll']:.2f}%", f"{test['median_scroll']:.2f}%"],
-            textposition='outside'
-        ))
-        fig.update_layout(**plotly_layout, height=180, title=dict(text="Median Scroll %", font=dict(size=12)))
-        st.plotly_chart(fig, use_container_width=True)
-    
-    # Winner callout
-    if lift > 5:
-        st.success(f"📈 **{test_label}** winning with +{lift:.2f}% lift in click rate")
-    elif lift < -5:
-        st.error(f"📉 **{control_label}** winning - {test_label} has {lift:.2f}% lower click rate")
-    else:
-        st.info("⚖️ **No clear winner yet** - Results within margin")
-    
+@st.fragment
+def ab_tests(view, selected_round):
     st.markdown("---")
+    st.markdown('<p class="section-header">A/B Test Results</p>', unsafe_allow_html=True)
+    if not section_open("Show A/B tests", 'ab_tests'):
+        return
 
-# ============== CHARTS ROW 1 ==============
-col1, col2, col3 = st.columns(3)
+    # Test definitions per round
+    if selected_round == "Round 2 (Current)":
+        tests = [
+            ('📝 Headline Copy', 'hero_variant', '#3b82f6', '#f59e0b', 'Product Name', 'Pain-Focused'),
+            ('⭐ Social Proof Copy', 'social_proof_variant', '#8b5cf6', '#10b981', '"200+ sold"', '"327 this week"'),
+            ('🔘 CTA Button Copy', 'scroll_hook_variant', '#06b6d4', '#ef4444', '"Get Instant Access"', '"Download Now - $17"'),
+        ]
+    elif selected_round == "Round 1 (Completed)":
+        tests = [
+            ('🦸 Hero Layout', 'hero_variant', '#3b82f6', '#f59e0b', 'Price Visible', 'Hook-First'),
+            ('👥 Social Proof', 'social_proof_variant', '#8b5cf6', '#10b981', 'Hidden', 'Stars Visible'),
+            ('🎣 Scroll Hook', 'scroll_hook_variant', '#06b6d4', '#ef4444', 'Generic', 'Curiosity'),
+        ]
+    else:  # All Rounds
+        tests = [
+            ('🧪 Hero Test', 'hero_variant', '#3b82f6', '#f59e0b', 'Control', 'Test'),
+            ('🧪 Social Proof Test', 'social_proof_variant', '#8b5cf6', '#10b981', 'Control', 'Test'),
+            ('🧪 Scroll Hook Test', 'scroll_hook_variant', '#06b6d4', '#ef4444', 'Control', 'Test'),
+        ]
 
-with col1:
-    st.markdown('<p class="section-header">Sessions Over Time</p>', unsafe_allow_html=True)
-    if not df_filtered.empty:
-        df_temp = df_filtered.copy()
-        df_temp['bucket'] = df_temp['started_at'].dt.floor('H' if period == 'Today' else 'D')
-        
-        fig = go.Figure()
-        
-        # If comparing versions, show both
-        if show_version_comparison and version_filter == "Both Versions" and 'version' in df_temp.columns:
-            # V1.0 line
-            v1_data = df_temp[df_temp['version'] == 'V1.0'].groupby('bucket').size().reset_index(name='sessions')
-            if not v1_data.empty:
-                fig.add_trace(go.Scatter(
-                    x=v1_data['bucket'], y=v1_data['sessions'],
-                    mode='lines+markers', fill='tozeroy',
-                    name='V1.0 (Feature)',
-                    line=dict(color='#3b82f6', width=3),
-                    marker=dict(size=8, color='#60a5fa'),
-                    fillcolor='rgba(59, 130, 246, 0.15)'
+    for name, variant_col, color1, color2, control_label, test_label in tests:
+        if variant_col not in view.columns or view.empty:
+            continue
+        stats = ab_table(view.aggregates.metrics(view.start, view.end, view.filters, by=variant_col))
+
+        if len(stats) < 2:
+            continue
+
+        control = stats[stats['variant'] == 'control'].iloc[0] if 'control' in stats['variant'].values else None
+        test = stats[stats['variant'] == 'test'].iloc[0] if 'test' in stats['variant'].values else None
+
+        if control is None or test is None:
+            continue
+
+        lift = ((test['click_rate'] - control['click_rate']) / control['click_rate'] * 100) if control['click_rate'] > 0 else 0
+
+        st.markdown(f"### {name}")
+        st.caption(f"**A:** {control_label} vs **B:** {test_label}")
+
+        col1, col2, col3, col4 = st.columns(4)
+
+        # Key metrics with descriptive labels
+        with col1:
+            st.metric(f"A: {control_label[:15]}", f"{int(control['sessions'])} sess")
+        with col2:
+            st.metric(f"B: {test_label[:15]}", f"{int(test['sessions'])} sess")
+        with col3:
+            st.metric("A CTR", f"{control['click_rate']:.2f}%")
+        with col4:
+            st.metric("B CTR", f"{test['click_rate']:.2f}%")
+
+        # Charts
+        col1, col2, col3 = st.columns(3)
+
+        with col1:
+            # Click Rate comparison
+            def build():
+                fig = go.Figure(go.Bar(
+                    x=[control_label[:12], test_label[:12]],
+                    y=[control['click_rate'], test['click_rate']],
+                    marker=dict(color=[color1, color2]),
+                    text=[f"{control['click_rate']:.2f}%", f"{test['click_rate']:.2f}%"],
+                    textposition='outside'
                 ))
-            
-            # V2.0 line
-            v2_data = df_temp[df_temp['version'] == 'V2.0'].groupby('bucket').size().reset_index(name='sessions')
-            if not v2_data.empty:
-                fig.add_trace(go.Scatter(
-                    x=v2_data['bucket'], y=v2_data['sessions'],
-                    mode='lines+markers', fill='tozeroy',
-                    name='V2.0 (Outcome)',
-                    line=dict(color='#10b981', width=3),
-                    marker=dict(size=8, color='#34d399'),
-                    fillcolor='rgba(16, 185, 129, 0.15)'
+                fig.update_layout(**plotly_layout, height=180, title=dict(text="Click Rate %", font=dict(size=12)))
+                return fig
+            view.chart('ab_click_rate', build, selected_round, variant_col)
+
+        with col2:
+            # Time comparison
+            def build():
+                fig = go.Figure(go.Bar(
+                    x=[control_label[:12], test_label[:12]],
+                    y=[control['median_time'], test['median_time']],
+                    marker=dict(color=[color1, color2]),
+                    text=[f"{control['median_time']:.2f}s", f"{test['median_time']:.2f}s"],
+                    textposition='outside'
+                ))
+                fig.update_layout(**plotly_layout, height=180, title=dict(text="Median Time (s)", font=dict(size=12)))
+                return fig
+            view.chart('ab_median_time', build, selected_round, variant_col)
+
+        with col3:
+            # Scroll comparison
+            def build():
+                fig = go.Figure(go.Bar(
+                    x=[control_label[:12], test_label[:12]],
+                    y=[control['median_scroll'], test['median_scroll']],
+                    marker=dict(color=[color1, color2]),
+                    text=[f"{control['median_scroll']:.2f}%", f"{test['median_scroll']:.2f}%"],
+                    textposition='outside'
                 ))
+                fig.update_layout(**plotly_layout, height=180, title=dict(text="Median Scroll %", font=dict(size=12)))
+                return fig
+            view.chart('ab_median_scroll', build, selected_round, variant_col)
+
+        # Winner callout
+        if lift > 5:
+            st.success(f"📈 **{test_label}** winning with +{lift:.2f}% lift in click rate")
+        elif lift < -5:
+            st.error(f"📉 **{control_label}** winning - {test_label} has {lift:.2f}% lower click rate")
         else:
-            # Single version
-            time_data = df_temp.groupby('bucket').size().reset_index(name='sessions')
-            color = '#10b981' if version_filter == "V2.0 (Outcome-Focused)" else '#3b82f6'
-            fig.add_trace(go.Scatter(
-                x=time_data['bucket'], y=time_data['sessions'],
-                mode='lines+markers', fill='tozeroy',
-                line=dict(color=color, width=3),
-                marker=dict(size=8, color=color),
-                fillcolor=f'rgba({16 if color == "#10b981" else 59}, {185 if color == "#10b981" else 130}, {129 if color == "#10b981" else 246}, 0.2)'
-            ))
-        
-        fig.update_layout(**plotly_layout, height=220, showlegend=show_version_comparison and version_filter == "Both Versions")
-        st.plotly_chart(fig, use_container_width=True)
+            st.info("⚖️ **No clear winner yet** - Results within margin")
 
-with col2:
-    st.markdown('<p class="section-header">Device Breakdown</p>', unsafe_allow_html=True)
-    if 'device_type' in df_filtered.columns:
-        device_data = df_filtered['device_type'].value_counts()
-        fig = go.Figure(go.Pie(
-            labels=device_data.index, values=device_data.values,
-            hole=0.5, 
-            marker=dict(colors=['#8b5cf6', '#3b82f6', '#06b6d4']),
-            textinfo='percent+label', textposition='inside',
-            textfont=dict(size=12, color='white')
-        ))
-        fig.update_layout(**plotly_layout, height=220, showlegend=False)
-        st.plotly_chart(fig, use_container_width=True)
+        st.markdown("---")
+
+
+# ============== CHARTS ROW 1 ==============
+@st.fragment
+def traffic_charts(view):
+    if not section_open("Show traffic charts", 'traffic_charts'):
+        return
+    col1, col2, col3 = st.columns(3)
+
+    with col1:
+        st.markdown('<p class="section-header">Sessions Over Time</p>', unsafe_allow_html=True)
+        by_version = view.filters.version is None and st.checkbox("Split by version", value=False)
+        if not view.empty:
+            bucket_counts = view.aggregates.counts(view.start, view.end, view.filters,
+                                                   by=['version'], freq='h' if view.period == 'Today' else 'D')['sessions']
+            versions = bucket_counts.index.get_level_values('version')
+
+            def build():
+                fig = go.Figure()
+
+                # If comparing versions, show both
+                if by_version and 'version' in view.columns:
+                    # V1.0 line
+                    v1_data = bucket_counts[versions == 'V1.0'].droplevel('version').reset_index(name='sessions')
+                    if not v1_data.empty:
+                        x, y = downsample(v1_data['bucket'], v1_data['sessions'], THIRD_WIDTH)
+                        fig.add_trace(go.Scatter(
+                            x=x, y=y,
+                            mode='lines+markers', fill='tozeroy',
+                            name='V1.0 (Feature)',
+                            line=dict(color='#3b82f6', width=3),
+                            marker=dict(size=8, color='#60a5fa'),
+                            fillcolor='rgba(59, 130, 246, 0.15)'
+                        ))
+
+                    # V2.0 line
+                    v2_data = bucket_counts[versions == 'V2.0'].droplevel('version').reset_index(name='sessions')
+                    if not v2_data.empty:
+                        x, y = downsample(v2_data['bucket'], v2_data['sessions'], THIRD_WIDTH)
+                        fig.add_trace(go.Scatter(
+                            x=x, y=y,
+                            mode='lines+markers', fill='tozeroy',
+                            name='V2.0 (Outcome)',
+                            line=dict(color='#10b981', width=3),
+                            marker=dict(size=8, color='#34d399'),
+                            fillcolor='rgba(16, 185, 129, 0.15)'
+                        ))
+                else:
+                    # Single version
+                    time_data = bucket_counts.groupby(level='bucket').sum().reset_index(name='sessions')
+                    color = '#10b981' if view.filters.version == 'V2.0' else '#3b82f6'
+                    x, y = downsample(time_data['bucket'], time_data['sessions'], THIRD_WIDTH)
+                    fig.add_trace(go.Scatter(
+                        x=x, y=y,
+                        mode='lines+markers', fill='tozeroy',
+                        line=dict(color=color, width=3),
+                        marker=dict(size=8, color=color),
+                        fillcolor=f'rgba({16 if color == "#10b981" else 59}, {185 if color == "#10b981" else 130}, {129 if color == "#10b981" else 246}, 0.2)'
+                    ))
+
+                fig.update_layout(**plotly_layout, height=220, showlegend=by_version)
+                return fig
+            view.chart('sessions_over_time', build, by_version)
+
+    with col2:
+        st.markdown('<p class="section-header">Device Breakdown</p>', unsafe_allow_html=True)
+        if 'device_type' in view.columns:
+            device_data = view.aggregates.counts(view.start, view.end, view.filters, by=['device_type'])['sessions']
+            device_data = device_data[device_data > 0].sort_values(ascending=False, kind='stable')
+            def build():
+                fig = go.Figure(go.Pie(
+                    labels=device_data.index, values=device_data.values,
+                    hole=0.5, 
+                    marker=dict(colors=['#8b5cf6', '#3b82f6', '#06b6d4']),
+                    textinfo='percent+label', textposition='inside',
+                    textfont=dict(size=12, color='white')
+                ))
+                fig.update_layout(**plotly_layout, height=220, showlegend=False)
+                return fig
+            view.chart('devices', build)
+
+    with col3:
+        st.markdown('<p class="section-header">Traffic Sources</p>', unsafe_allow_html=True)
+        if 'utm_source' in view.columns:
+            # Get real sessions only
+            source_data = view.aggregates.counts(view.start, view.end, FilterState(exclude_bots=True),
+                                                 by=['utm_source'])['sessions']
+            source_data = source_data[source_data > 0].sort_values(ascending=False, kind='stable').head(5)
+
+            color_map = {'tiktok': '#ff0050', 'direct': '#10b981', 'google': '#f59e0b'}
+            bar_colors = [color_map.get(s, '#64748b') for s in source_data.index]
+
+            def build():
+                fig = go.Figure(go.Bar(
+                    x=source_data.index, y=source_data.values,
+                    marker=dict(color=bar_colors),
+                    text=source_data.values, textposition='outside'
+                ))
+                fig.update_layout(**plotly_layout, height=220)
+                return fig
+            view.chart('sources', build)
 
-with col3:
-    st.markdown('<p class="section-header">Traffic Sources</p>', unsafe_allow_html=True)
-    if 'utm_source' in df_period.columns:
-        # Get real sessions only
-        real_sessions = df_period[df_period['is_bot'] != True]
-        source_data = real_sessions['utm_source'].value_counts().head(5)
-        
-        color_map = {'tiktok': '#ff0050', 'direct': '#10b981', 'google': '#f59e0b'}
-        bar_colors = [color_map.get(s, '#64748b') for s in source_data.index]
-        
-        fig = go.Figure(go.Bar(
-            x=source_data.index, y=source_data.values,
-            marker=dict(color=bar_colors),
-            text=source_data.values, textposition='outside'
-        ))
-        fig.update_layout(**plotly_layout, height=220)
-        st.plotly_chart(fig, use_container_width=True)
 
 # ============== CHARTS ROW 2 ==============
-st.markdown("---")
-col1, col2, col3 = st.columns(3)
+@st.fragment
+def distribution_charts(view):
+    st.markdown("---")
+    if not section_open("Show distribution charts", 'distribution_charts'):
+        return
+    require_columns('distribution_charts')
+    col1, col2, col3 = st.columns(3)
 
-with col1:
-    st.markdown('<p class="section-header">Top Locations</p>', unsafe_allow_html=True)
-    if 'city' in df_filtered.columns:
-        cities = df_filtered[df_filtered['city'].notna() & (df_filtered['city'] != '')]['city'].value_counts().head(6)
-        if len(cities) > 0:
-            # Gradient colors
-            n = len(cities)
-            bar_colors = [f'rgba(59, 130, 246, {0.4 + 0.6*i/n})' for i in range(n)]
-            
-            fig = go.Figure(go.Bar(
-                x=cities.values, y=cities.index, orientation='h',
-                marker=dict(color=bar_colors[::-1]),
-                text=cities.values, textposition='outside'
-            ))
-            layout = plotly_layout.copy()
-            layout['yaxis'] = dict(categoryorder='total ascending', gridcolor='rgba(148,163,184,0.1)')
-            fig.update_layout(**layout, height=220)
-            st.plotly_chart(fig, use_container_width=True)
+    with col1:
+        st.markdown('<p class="section-header">Top Locations</p>', unsafe_allow_html=True)
+        if 'city' in view.columns:
+            cities = view.aggregates.top_cities(view.start, view.end, view.filters, 6)
+            if len(cities) > 0:
+                # Gradient colors
+                n = len(cities)
+                bar_colors = [f'rgba(59, 130, 246, {0.4 + 0.6*i/n})' for i in range(n)]
+
+                def build():
+                    fig = go.Figure(go.Bar(
+                        x=cities.values, y=cities.index, orientation='h',
+                        marker=dict(color=bar_colors[::-1]),
+                        text=cities.values, textposition='outside'
+                    ))
+                    layout = plotly_layout.copy()
+                    layout['yaxis'] = dict(categoryorder='total ascending', gridcolor='rgba(148,163,184,0.1)')
+                    fig.update_layout(**layout, height=220)
+                    return fig
+                view.chart('locations', build)
 
-with col2:
-    st.markdown('<p class="section-header">Scroll Depth Distribution</p>', unsafe_allow_html=True)
-    if 'scroll_depth_pct' in df_filtered.columns:
-        scroll_data = df_filtered[df_filtered['scroll_depth_pct'] > 0]['scroll_depth_pct']
-        if len(scroll_data) > 0:
-            fig = go.Figure(go.Histogram(
-                x=scroll_data, nbinsx=10,
-                marker=dict(color='#8b5cf6', line=dict(color='#a78bfa', width=1))
-            ))
-            fig.update_layout(**plotly_layout, height=220, xaxis_title="Scroll %")
-            st.plotly_chart(fig, use_container_width=True)
-        else:
-            st.caption("No scroll data")
+    with col2:
+        st.markdown('<p class="section-header">Scroll Depth Distribution</p>', unsafe_allow_html=True)
+        if 'scroll_depth_pct' in view.columns:
+            # Binned from the rollup sketches (or per value in Postgres), so the
+            # chart is ten bars however many sessions
+            scroll_counts = view.aggregates.distribution(view.start, view.end, 'scroll', tuple(range(0, 101, 10)),
+                                                         view.filters)
+            if scroll_counts.sum() > 0:
+                def build():
+                    fig = go.Figure(go.Bar(
+                        x=scroll_counts.index.mid, y=scroll_counts.values, width=scroll_counts.index.length,
+                        customdata=list(zip(scroll_counts.index.left, scroll_counts.index.right)),
+                        hovertemplate='%{customdata[0]}-%{customdata[1]}%: %{y} sessions<extra></extra>',
+                        marker=dict(color='#8b5cf6', line=dict(color='#a78bfa', width=1))
+                    ))
+                    fig.update_layout(**plotly_layout, height=220, xaxis_title="Scroll %")
+                    return fig
+                view.chart('scroll_distribution', build)
+            else:
+                st.caption("No scroll data")
 
-with col3:
-    st.markdown('<p class="section-header">Time on Site Distribution</p>', unsafe_allow_html=True)
-    if 'time_on_site_sec' in df_filtered.columns:
-        time_data = df_filtered[(df_filtered['time_on_site_sec'] > 0) & (df_filtered['time_on_site_sec'] <= 120)]['time_on_site_sec']
-        if len(time_data) > 0:
-            fig = go.Figure(go.Histogram(
-                x=time_data, nbinsx=12,
-                marker=dict(color='#10b981', line=dict(color='#34d399', width=1))
-            ))
-            fig.update_layout(**plotly_layout, height=220, xaxis_title="Seconds")
-            st.plotly_chart(fig, use_container_width=True)
-        else:
-            st.caption("No time data")
+    with col3:
+        st.markdown('<p class="section-header">Time on Site Distribution</p>', unsafe_allow_html=True)
+        if 'time_on_site_sec' in view.columns:
+            time_counts = view.aggregates.distribution(view.start, view.end, 'time', tuple(range(0, 121, 10)),
+                                                       view.filters)
+            if time_counts.sum() > 0:
+                def build():
+                    fig = go.Figure(go.Bar(
+                        x=time_counts.index.mid, y=time_counts.values, width=time_counts.index.length,
+                        customdata=list(zip(time_counts.index.left, time_counts.index.right)),
+                        hovertemplate='%{customdata[0]}-%{customdata[1]}s: %{y} sessions<extra></extra>',
+                        marker=dict(color='#10b981', line=dict(color='#34d399', width=1))
+                    ))
+                    fig.update_layout(**plotly_layout, height=220, xaxis_title="Seconds")
+                    return fig
+                view.chart('time_distribution', build)
+            else:
+                st.caption("No time data")
 
-# ============== RECENT SESSIONS ==============
-st.markdown("---")
-st.markdown('<p class="section-header">Recent Sessions</p>', unsafe_allow_html=True)
 
-if not df_filtered.empty:
-    cols = ['started_at', 'device_type', 'city', 'time_on_site_sec', 'scroll_depth_pct', 
-            'clicked_buy', 'hero_variant', 'social_proof_variant']
-    cols = [c for c in cols if c in df_filtered.columns]
-    recent = df_filtered[cols].head(15).copy()
-    recent['started_at'] = recent['started_at'].dt.strftime('%H:%M:%S')
-    st.dataframe(recent, use_container_width=True, hide_index=True)
+# ============== RECENT SESSIONS ==============
+@st.fragment
+def recent_sessions(view):
+    st.markdown("---")
+    st.markdown('<p class="section-header">Recent Sessions</p>', unsafe_allow_html=True)
+    if not section_open("Show recent sessions", 'recent_sessions'):
+        return
+
+    require_columns('recent_sessions')
+    if not view.empty:
+        recent = view.aggregates.recent_sessions(view.start, view.end, view.filters, 15).copy()
+        recent['started_at'] = recent['started_at'].dt.strftime('%H:%M:%S')
+        st.dataframe(recent, use_container_width=True, hide_index=True)
+
+
+# ============== LAYOUT ==============
+traffic_overview(view)
+version_comparison(view)
+engagement(view, metrics, prev_metrics, compare)
+conversion_funnel(view, metrics)
+trend_analysis(view)
+price_test(view)
+ab_tests(view, selected_round)
+traffic_charts(view)
+distribution_charts(view)
+recent_sessions(view)
 
 # Auto refresh
+@st.fragment(run_every=15)
+def watch_snapshot(version):
+    # The browser schedules these reruns, so no script thread sleeps per
+    # viewer; the page only reruns once the refresher has published new data
+    latest = get_refresher().latest()
+    if latest is not None and latest.version != version:
+        st.rerun()
+
 if auto_refresh:
-    import time
-    time.sleep(15)
-    st.rerun()
+    watch_snapshot(snapshot.version)
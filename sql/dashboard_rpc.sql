@@ -0,0 +1,188 @@
+-- Generated by analytics.aggregates.render_postgres(); edit FUNCTIONS there.
+
+CREATE OR REPLACE FUNCTION dashboard_metrics(p_start timestamptz, p_end timestamptz, p_end_inclusive boolean, p_exclude_bots boolean, p_tiktok_only boolean, p_price double precision, p_version text, p_test_id text, p_group text)
+RETURNS TABLE (group_key text, sessions bigint, median_time double precision, median_scroll double precision, total_clicks bigint, clicked_buy bigint, initiated_checkout bigint, purchased bigint, bounces bigint, engaged_sessions bigint)
+LANGUAGE sql STABLE AS $$
+    SELECT CASE p_group WHEN 'version' THEN coalesce(version::text, CASE WHEN started_at >= '2025-12-10T12:00:00+00:00' THEN 'V2.0' ELSE 'V1.0' END) WHEN 'is_bot' THEN is_bot::text WHEN 'utm_source' THEN utm_source::text WHEN 'device_type' THEN device_type::text WHEN 'hero_variant' THEN hero_variant::text WHEN 'social_proof_variant' THEN social_proof_variant::text WHEN 'scroll_hook_variant' THEN scroll_hook_variant::text END AS group_key,
+           count(*)::bigint AS sessions,
+           (percentile_cont(0.5) WITHIN GROUP (ORDER BY time_on_site_sec) FILTER (WHERE time_on_site_sec > 0 AND time_on_site_sec <= 1800))::double precision AS median_time,
+           (percentile_cont(0.5) WITHIN GROUP (ORDER BY scroll_depth_pct) FILTER (WHERE scroll_depth_pct > 0))::double precision AS median_scroll,
+           coalesce(sum(clicks_total), 0)::bigint AS total_clicks,
+           (count(*) FILTER (WHERE clicked_buy))::bigint AS clicked_buy,
+           (count(*) FILTER (WHERE initiated_checkout))::bigint AS initiated_checkout,
+           (count(*) FILTER (WHERE purchased))::bigint AS purchased,
+           (count(*) FILTER (WHERE time_on_site_sec = 0 OR scroll_depth_pct = 0))::bigint AS bounces,
+           (count(*) FILTER (WHERE time_on_site_sec > 10 AND scroll_depth_pct > 25))::bigint AS engaged_sessions
+    FROM session_sessions
+    WHERE started_at >= p_start
+      AND (started_at < p_end OR (p_end_inclusive AND started_at = p_end))
+      AND (NOT p_exclude_bots OR is_bot IS NOT TRUE)
+      AND (NOT p_tiktok_only OR utm_source::text = 'tiktok')
+      AND (p_price IS NULL OR price_shown = p_price)
+      AND (p_version IS NULL OR coalesce(version::text, CASE WHEN started_at >= '2025-12-10T12:00:00+00:00' THEN 'V2.0' ELSE 'V1.0' END) = p_version)
+      AND (p_test_id IS NULL OR hero_test_id::text = p_test_id)
+    GROUP BY 1
+    ORDER BY 1 NULLS LAST
+$$;
+
+CREATE OR REPLACE FUNCTION dashboard_price_stats(p_start timestamptz, p_end timestamptz, p_end_inclusive boolean, p_exclude_bots boolean, p_tiktok_only boolean, p_price double precision, p_version text, p_test_id text)
+RETURNS TABLE (price_shown double precision, sessions bigint, clicked_buy bigint, initiated_checkout bigint, purchased bigint)
+LANGUAGE sql STABLE AS $$
+    SELECT price_shown::double precision AS price_shown,
+           count(*)::bigint AS sessions,
+           (count(*) FILTER (WHERE clicked_buy))::bigint AS clicked_buy,
+           (count(*) FILTER (WHERE initiated_checkout))::bigint AS initiated_checkout,
+           (count(*) FILTER (WHERE purchased))::bigint AS purchased
+    FROM session_sessions
+    WHERE started_at >= p_start
+      AND (started_at < p_end OR (p_end_inclusive AND started_at = p_end))
+      AND (NOT p_exclude_bots OR is_bot IS NOT TRUE)
+      AND (NOT p_tiktok_only OR utm_source::text = 'tiktok')
+      AND (p_price IS NULL OR price_shown = p_price)
+      AND (p_version IS NULL OR coalesce(version::text, CASE WHEN started_at >= '2025-12-10T12:00:00+00:00' THEN 'V2.0' ELSE 'V1.0' END) = p_version)
+      AND (p_test_id IS NULL OR hero_test_id::text = p_test_id)
+      AND price_shown IS NOT NULL
+    GROUP BY 1
+    ORDER BY 1
+$$;
+
+CREATE OR REPLACE FUNCTION dashboard_trend(p_start timestamptz, p_end timestamptz, p_end_inclusive boolean, p_exclude_bots boolean, p_tiktok_only boolean, p_price double precision, p_version text, p_test_id text, p_bucket text)
+RETURNS TABLE (bucket timestamptz, sessions bigint, median_time double precision, users_5sec bigint, users_10sec bigint, median_scroll double precision, users_25scroll bigint, users_50scroll bigint, total_clicks bigint, clicked_buy bigint, initiated_checkout bigint)
+LANGUAGE sql STABLE AS $$
+    SELECT date_trunc(p_bucket, started_at) AS bucket,
+           count(*)::bigint AS sessions,
+           (percentile_cont(0.5) WITHIN GROUP (ORDER BY time_on_site_sec) FILTER (WHERE time_on_site_sec > 0 AND time_on_site_sec <= 1800))::double precision AS median_time,
+           (count(*) FILTER (WHERE time_on_site_sec > 5))::bigint AS users_5sec,
+           (count(*) FILTER (WHERE time_on_site_sec > 10))::bigint AS users_10sec,
+           (percentile_cont(0.5) WITHIN GROUP (ORDER BY scroll_depth_pct) FILTER (WHERE scroll_depth_pct > 0))::double precision AS median_scroll,
+           (count(*) FILTER (WHERE scroll_depth_pct > 25))::bigint AS users_25scroll,
+           (count(*) FILTER (WHERE scroll_depth_pct > 50))::bigint AS users_50scroll,
+           coalesce(sum(clicks_total), 0)::bigint AS total_clicks,
+           (count(*) FILTER (WHERE clicked_buy))::bigint AS clicked_buy,
+           (count(*) FILTER (WHERE initiated_checkout))::bigint AS initiated_checkout
+    FROM session_sessions
+    WHERE started_at >= p_start
+      AND (started_at < p_end OR (p_end_inclusive AND started_at = p_end))
+      AND (NOT p_exclude_bots OR is_bot IS NOT TRUE)
+      AND (NOT p_tiktok_only OR utm_source::text = 'tiktok')
+      AND (p_price IS NULL OR price_shown = p_price)
+      AND (p_version IS NULL OR coalesce(version::text, CASE WHEN started_at >= '2025-12-10T12:00:00+00:00' THEN 'V2.0' ELSE 'V1.0' END) = p_version)
+      AND (p_test_id IS NULL OR hero_test_id::text = p_test_id)
+    GROUP BY 1
+    ORDER BY 1
+$$;
+
+CREATE OR REPLACE FUNCTION dashboard_counts(p_start timestamptz, p_end timestamptz, p_end_inclusive boolean, p_exclude_bots boolean, p_tiktok_only boolean, p_price double precision, p_version text, p_test_id text, p_group1 text, p_group2 text, p_bucket text)
+RETURNS TABLE (bucket timestamptz, group1 text, group2 text, sessions bigint, new_visitors bigint, returning_visitors bigint)
+LANGUAGE sql STABLE AS $$
+    SELECT date_trunc(p_bucket, started_at) AS bucket,
+           CASE p_group1 WHEN 'version' THEN coalesce(version::text, CASE WHEN started_at >= '2025-12-10T12:00:00+00:00' THEN 'V2.0' ELSE 'V1.0' END) WHEN 'is_bot' THEN is_bot::text WHEN 'utm_source' THEN utm_source::text WHEN 'device_type' THEN device_type::text WHEN 'hero_variant' THEN hero_variant::text WHEN 'social_proof_variant' THEN social_proof_variant::text WHEN 'scroll_hook_variant' THEN scroll_hook_variant::text END AS group1,
+           CASE p_group2 WHEN 'version' THEN coalesce(version::text, CASE WHEN started_at >= '2025-12-10T12:00:00+00:00' THEN 'V2.0' ELSE 'V1.0' END) WHEN 'is_bot' THEN is_bot::text WHEN 'utm_source' THEN utm_source::text WHEN 'device_type' THEN device_type::text WHEN 'hero_variant' THEN hero_variant::text WHEN 'social_proof_variant' THEN social_proof_variant::text WHEN 'scroll_hook_variant' THEN scroll_hook_variant::text END AS group2,
+           count(*)::bigint AS sessions,
+           (count(*) FILTER (WHERE visit_number = 1))::bigint AS new_visitors,
+           (count(*) FILTER (WHERE visit_number > 1))::bigint AS returning_visitors
+    FROM session_sessions
+    WHERE started_at >= p_start
+      AND (started_at < p_end OR (p_end_inclusive AND started_at = p_end))
+      AND (NOT p_exclude_bots OR is_bot IS NOT TRUE)
+      AND (NOT p_tiktok_only OR utm_source::text = 'tiktok')
+      AND (p_price IS NULL OR price_shown = p_price)
+      AND (p_version IS NULL OR coalesce(version::text, CASE WHEN started_at >= '2025-12-10T12:00:00+00:00' THEN 'V2.0' ELSE 'V1.0' END) = p_version)
+      AND (p_test_id IS NULL OR hero_test_id::text = p_test_id)
+    GROUP BY 1, 2, 3
+    ORDER BY 1 NULLS LAST, 2 NULLS LAST, 3 NULLS LAST
+$$;
+
+CREATE OR REPLACE FUNCTION dashboard_visitors(p_start timestamptz, p_end timestamptz, p_end_inclusive boolean, p_exclude_bots boolean, p_tiktok_only boolean, p_price double precision, p_version text, p_test_id text)
+RETURNS TABLE (unique_visitors bigint)
+LANGUAGE sql STABLE AS $$
+    SELECT count(DISTINCT user_id)::bigint AS unique_visitors
+    FROM session_sessions
+    WHERE started_at >= p_start
+      AND (started_at < p_end OR (p_end_inclusive AND started_at = p_end))
+      AND (NOT p_exclude_bots OR is_bot IS NOT TRUE)
+      AND (NOT p_tiktok_only OR utm_source::text = 'tiktok')
+      AND (p_price IS NULL OR price_shown = p_price)
+      AND (p_version IS NULL OR coalesce(version::text, CASE WHEN started_at >= '2025-12-10T12:00:00+00:00' THEN 'V2.0' ELSE 'V1.0' END) = p_version)
+      AND (p_test_id IS NULL OR hero_test_id::text = p_test_id)
+$$;
+
+CREATE OR REPLACE FUNCTION dashboard_distribution(p_start timestamptz, p_end timestamptz, p_end_inclusive boolean, p_exclude_bots boolean, p_tiktok_only boolean, p_price double precision, p_version text, p_test_id text, p_sketch text)
+RETURNS TABLE (value double precision, sessions bigint)
+LANGUAGE sql STABLE AS $$
+    SELECT (CASE p_sketch WHEN 'time' THEN time_on_site_sec WHEN 'scroll' THEN scroll_depth_pct END)::double precision AS value,
+           count(*)::bigint AS sessions
+    FROM session_sessions
+    WHERE started_at >= p_start
+      AND (started_at < p_end OR (p_end_inclusive AND started_at = p_end))
+      AND (NOT p_exclude_bots OR is_bot IS NOT TRUE)
+      AND (NOT p_tiktok_only OR utm_source::text = 'tiktok')
+      AND (p_price IS NULL OR price_shown = p_price)
+      AND (p_version IS NULL OR coalesce(version::text, CASE WHEN started_at >= '2025-12-10T12:00:00+00:00' THEN 'V2.0' ELSE 'V1.0' END) = p_version)
+      AND (p_test_id IS NULL OR hero_test_id::text = p_test_id)
+      AND CASE p_sketch WHEN 'time' THEN time_on_site_sec > 0 AND time_on_site_sec <= 1800 WHEN 'scroll' THEN scroll_depth_pct > 0 END
+    GROUP BY 1
+    ORDER BY 1
+$$;
+
+CREATE OR REPLACE FUNCTION dashboard_cities(p_start timestamptz, p_end timestamptz, p_end_inclusive boolean, p_exclude_bots boolean, p_tiktok_only boolean, p_price double precision, p_version text, p_test_id text, p_limit integer)
+RETURNS TABLE (city text, sessions bigint)
+LANGUAGE sql STABLE AS $$
+    SELECT city::text AS city,
+           count(*)::bigint AS sessions
+    FROM session_sessions
+    WHERE started_at >= p_start
+      AND (started_at < p_end OR (p_end_inclusive AND started_at = p_end))
+      AND (NOT p_exclude_bots OR is_bot IS NOT TRUE)
+      AND (NOT p_tiktok_only OR utm_source::text = 'tiktok')
+      AND (p_price IS NULL OR price_shown = p_price)
+      AND (p_version IS NULL OR coalesce(version::text, CASE WHEN started_at >= '2025-12-10T12:00:00+00:00' THEN 'V2.0' ELSE 'V1.0' END) = p_version)
+      AND (p_test_id IS NULL OR hero_test_id::text = p_test_id)
+      AND city IS NOT NULL AND city::text <> ''
+    GROUP BY 1
+    ORDER BY 2 DESC, 1
+    LIMIT p_limit
+$$;
+
+CREATE OR REPLACE FUNCTION dashboard_recent_sessions(p_start timestamptz, p_end timestamptz, p_end_inclusive boolean, p_exclude_bots boolean, p_tiktok_only boolean, p_price double precision, p_version text, p_test_id text, p_limit integer)
+RETURNS TABLE (started_at timestamptz, device_type text, city text, time_on_site_sec double precision, scroll_depth_pct integer, clicked_buy boolean, hero_variant text, social_proof_variant text)
+LANGUAGE sql STABLE AS $$
+    SELECT started_at,
+           device_type::text AS device_type,
+           city::text AS city,
+           time_on_site_sec::double precision AS time_on_site_sec,
+           scroll_depth_pct::integer AS scroll_depth_pct,
+           clicked_buy,
+           hero_variant::text AS hero_variant,
+           social_proof_variant::text AS social_proof_variant
+    FROM session_sessions
+    WHERE started_at >= p_start
+      AND (started_at < p_end OR (p_end_inclusive AND started_at = p_end))
+      AND (NOT p_exclude_bots OR is_bot IS NOT TRUE)
+      AND (NOT p_tiktok_only OR utm_source::text = 'tiktok')
+      AND (p_price IS NULL OR price_shown = p_price)
+      AND (p_version IS NULL OR coalesce(version::text, CASE WHEN started_at >= '2025-12-10T12:00:00+00:00' THEN 'V2.0' ELSE 'V1.0' END) = p_version)
+      AND (p_test_id IS NULL OR hero_test_id::text = p_test_id)
+    ORDER BY started_at DESC
+    LIMIT p_limit
+$$;
+
+CREATE OR REPLACE FUNCTION dashboard_prices()
+RETURNS TABLE (price_shown double precision)
+LANGUAGE sql STABLE AS $$
+    SELECT DISTINCT price_shown::double precision AS price_shown
+    FROM session_sessions
+    WHERE price_shown > 0
+    ORDER BY 1
+$$;
+
+CREATE OR REPLACE FUNCTION dashboard_status(p_since timestamptz)
+RETURNS TABLE (first_started_at timestamptz, last_started_at timestamptz, recent_sessions bigint, recent_activity double precision)
+LANGUAGE sql STABLE AS $$
+    SELECT (SELECT min(started_at) FROM session_sessions) AS first_started_at,
+           (SELECT max(started_at) FROM session_sessions) AS last_started_at,
+           count(*)::bigint AS recent_sessions,
+           coalesce(sum(coalesce(time_on_site_sec, 0) + coalesce(scroll_depth_pct, 0) + coalesce(clicks_total, 0) + (clicked_buy IS TRUE)::integer + (initiated_checkout IS TRUE)::integer + (purchased IS TRUE)::integer), 0)::double precision AS recent_activity
+    FROM session_sessions
+    WHERE started_at >= p_since
+$$;
@@ -0,0 +1,39 @@
+from datetime import timedelta
+
+import pytest
+
+from analytics.aggregates import CubeAggregates
+from analytics.data import apply_schema, fill_versions
+from analytics.filters import FilterState
+from analytics.rollup import RollupCube
+from analytics.synthetic import SYNTHETIC_END, generate_sessions
+
+STATES = [
+    FilterState(),
+    FilterState(exclude_bots=False),
+    FilterState(tiktok_only=True, price=17.0),
+    FilterState(version='V2.0', test_id='headline-001'),
+    FilterState(version='V1.0', price=27.0),
+]
+
+# Whole table, a week and a few hours with ragged edges, a stretch of the
+# daily cells only, and no rows at all
+WINDOWS = [
+    (SYNTHETIC_END - timedelta(days=40), SYNTHETIC_END),
+    (SYNTHETIC_END - timedelta(days=7, minutes=17), SYNTHETIC_END - timedelta(minutes=43)),
+    (SYNTHETIC_END - timedelta(hours=5, minutes=30), SYNTHETIC_END - timedelta(hours=1, minutes=10)),
+    (SYNTHETIC_END - timedelta(days=12, hours=7), SYNTHETIC_END - timedelta(days=4, hours=2, minutes=5)),
+    (SYNTHETIC_END + timedelta(days=1), SYNTHETIC_END + timedelta(days=2)),
+]
+
+
+@pytest.fixture(scope='session')
+def sessions():
+    # Typed and backfilled like SessionStore's frame: 20k rows over 30 days
+    return apply_schema(fill_versions(generate_sessions(20_000, seed=1, days=30)))
+
+
+@pytest.fixture(scope='session')
+def exact(sessions):
+    # The cube over `sessions`, reading raw rows for the medians
+    return CubeAggregates(RollupCube.build(sessions), sessions, exact=True)
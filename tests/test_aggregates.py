@@ -0,0 +1,94 @@
+from datetime import timedelta
+
+import pandas as pd
+import pytest
+
+from analytics.aggregates import DuckDBAggregates, FunctionStatus
+from analytics.data import SessionRefresher
+from conftest import STATES, WINDOWS
+
+
+@pytest.fixture(scope='module')
+def rpc(sessions):
+    pytest.importorskip('duckdb')
+    return DuckDBAggregates(sessions)
+
+
+def same_frame(actual, expected):
+    # Group keys come back as text from SQL and as categoricals from the cube,
+    # missing values as None and NaN
+    actual, expected = actual.reset_index(), expected.reset_index()
+    for column in actual.columns:
+        if not pd.api.types.is_numeric_dtype(expected[column]) or expected[column].dtype == bool:
+            for frame in (actual, expected):
+                frame[column] = frame[column].astype(object).where(frame[column].notna(), None)
+    pd.testing.assert_frame_equal(actual, expected, check_dtype=False, check_index_type=False)
+
+
+@pytest.mark.parametrize('state', STATES)
+@pytest.mark.parametrize('start, end', WINDOWS)
+def test_rpc_metrics_match_the_cube(exact, rpc, start, end, state):
+    expected = exact.metrics(start, end, state)
+    assert rpc.metrics(start, end, state) == pytest.approx(expected, nan_ok=True)
+    for by in ('version', 'hero_variant'):
+        same_frame(rpc.metrics(start, end, state, by=by), exact.metrics(start, end, state, by=by))
+    same_frame(rpc.price_stats(start, end, state), exact.price_stats(start, end, state))
+    same_frame(rpc.trend(start, end, state, 'D'), exact.trend(start, end, state, 'D'))
+
+
+@pytest.mark.parametrize('state', [None] + STATES)
+@pytest.mark.parametrize('start, end', WINDOWS)
+def test_rpc_counts_match_the_cube(exact, rpc, start, end, state):
+    for by, freq, dropna in ((['is_bot', 'utm_source'], None, False), (['version'], 'D', True),
+                             (['device_type'], None, True), (['utm_source'], 'h', True)):
+        same_frame(rpc.counts(start, end, state, by=by, freq=freq, dropna=dropna),
+                   exact.counts(start, end, state, by=by, freq=freq, dropna=dropna))
+    assert rpc.counts(start, end, state) == exact.counts(start, end, state)
+    assert rpc.visitors(start, end, state) == exact.visitors(start, end, state)
+
+
+@pytest.mark.parametrize('state', [None] + STATES)
+@pytest.mark.parametrize('start, end', WINDOWS)
+def test_rpc_distributions_match_the_cube(exact, rpc, start, end, state):
+    for sketch, edges in (('scroll', tuple(range(0, 101, 10))), ('time', tuple(range(0, 121, 10)))):
+        pd.testing.assert_series_equal(rpc.distribution(start, end, sketch, edges, state),
+                                       exact.distribution(start, end, sketch, edges, state))
+
+
+@pytest.mark.parametrize('state', STATES)
+@pytest.mark.parametrize('start, end', WINDOWS)
+def test_rpc_row_panels_match_the_cube(exact, rpc, start, end, state):
+    same_frame(rpc.top_cities(start, end, state, 6), exact.top_cities(start, end, state, 6))
+    same_frame(rpc.recent_sessions(start, end, state, 15), exact.recent_sessions(start, end, state, 15))
+
+
+def test_rpc_table_lookups_match_the_cube(exact, rpc, sessions):
+    assert rpc.prices() == exact.prices() == [17.0, 27.0]
+    since = sessions['started_at'].iloc[-100]
+    status = rpc.status(since)
+    assert pd.Timestamp(status['first_started_at']) == sessions['started_at'].iloc[0]
+    assert pd.Timestamp(status['last_started_at']) == sessions['started_at'].iloc[-1]
+    assert status['recent_sessions'] == (sessions['started_at'] >= since).sum()
+
+
+def test_function_status_publishes_only_when_the_table_changes(sessions):
+    pytest.importorskip('duckdb')
+    local = DuckDBAggregates(sessions.tail(500))
+    # Every fixture session counts as recent
+    status = FunctionStatus(local, lookback=timedelta(days=36500))
+    refresher = SessionRefresher(status)
+    refresher._publish(status.refresh())
+    refresher._publish(status.refresh())
+    assert refresher.snapshot.version == 1
+    assert refresher.snapshot.df['last_started_at'].iloc[0] == sessions['started_at'].iloc[-1]
+
+    # A recent session that clicks again changes the status
+    local._con.execute("UPDATE session_sessions SET clicks_total = clicks_total + 1 "
+                       "WHERE started_at = (SELECT max(started_at) FROM session_sessions)")
+    refresher._publish(status.refresh())
+    assert refresher.snapshot.version == 2
+
+    status.invalidate()
+    refresher._publish(status.refresh())
+    assert refresher.snapshot.version == 3
+    assert FunctionStatus(DuckDBAggregates(sessions.iloc[:0])).refresh().empty
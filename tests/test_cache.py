@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+
+from analytics.cache import CachedAggregates, ResultCache, result_size
+
+
+def frame(rows):
+    return pd.DataFrame({'value': np.arange(rows, dtype='int64')})
+
+
+def test_hits_skip_compute():
+    cache = ResultCache()
+    calls = []
+    compute = lambda: calls.append(1) or frame(10)
+    first = cache.get(1, ('metrics',), compute)
+    assert cache.get(1, ('metrics',), compute) is first
+    assert len(calls) == 1
+    assert cache.stats['hits'] == 1 and cache.stats['misses'] == 1
+
+
+def test_evicts_least_recently_used_past_the_byte_budget():
+    size = result_size(frame(1000))
+    cache = ResultCache(max_bytes=size * 2)
+    cache.get(1, 'a', lambda: frame(1000))
+    cache.get(1, 'b', lambda: frame(1000))
+    cache.get(1, 'a', lambda: frame(1000))
+    cache.get(1, 'c', lambda: frame(1000))
+    assert cache.stats['entries'] == 2 and cache.stats['bytes'] <= size * 2
+    # 'b' was the least recently used, so it went and 'a' is still a hit
+    hits = cache.stats['hits']
+    cache.get(1, 'a', lambda: frame(1000))
+    assert cache.stats['hits'] == hits + 1
+    cache.get(1, 'b', lambda: frame(1000))
+    assert cache.stats['hits'] == hits + 1
+
+
+def test_results_larger_than_the_budget_are_not_stored():
+    cache = ResultCache(max_bytes=result_size(frame(10)))
+    cache.get(1, 'big', lambda: frame(1000))
+    assert cache.stats['entries'] == 0 and cache.stats['bytes'] == 0
+
+
+def test_newer_version_clears_the_old_entries():
+    cache = ResultCache()
+    cache.get(1, 'a', lambda: frame(10))
+    cache.get(1, 'b', lambda: frame(10))
+    assert cache.get(2, 'a', lambda: 'recomputed') == 'recomputed'
+    assert cache.version == 2
+    assert cache.stats['entries'] == 1
+
+
+def test_older_version_computes_without_storing():
+    cache = ResultCache()
+    cache.get(2, 'a', lambda: 'current')
+    assert cache.get(1, 'a', lambda: 'stale') == 'stale'
+    assert cache.get(1, 'b', lambda: 'stale') == 'stale'
+    assert cache.version == 2
+    assert cache.stats['entries'] == 1
+    assert cache.get(2, 'a', lambda: 'recomputed') == 'current'
+
+
+def test_version_moving_on_during_compute_skips_the_store():
+    cache = ResultCache()
+
+    def compute():
+        # Another session sees a newer snapshot while this one computes
+        cache.get(2, 'other', lambda: 'newer')
+        return 'older'
+
+    assert cache.get(1, 'a', compute) == 'older'
+    assert cache.get(2, 'a', lambda: 'recomputed') == 'recomputed'
+
+
+def test_periods_without_rows_are_keyed_on_their_bounds():
+    latest = pd.Timestamp('2026-01-31 12:00', tz='UTC')
+    cached = CachedAggregates(None, ResultCache(), None, 1, latest=latest)
+    start = latest - pd.Timedelta(days=7)
+    # Any end past the newest session covers the same sessions
+    assert cached.period_key(start, latest + pd.Timedelta(minutes=5)) == \
+        cached.period_key(start, latest + pd.Timedelta(hours=1), closed='left')
+    assert cached.period_key(start, latest - pd.Timedelta(hours=1)) != cached.period_key(start, latest - pd.Timedelta(hours=2))
@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+
+from analytics.downsample import downsample, lttb, point_budget
+
+
+def brute_force_lttb(x, y, threshold):
+    # LTTB one point at a time over the same buckets as lttb()
+    n = len(y)
+    edges = np.linspace(1, n - 1, threshold - 1).astype('int64')
+    keep, a = [0], 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            cx, cy = np.mean(x[hi:edges[i + 2]]), np.mean(y[hi:edges[i + 2]])
+        else:
+            cx, cy = x[n - 1], y[n - 1]
+        areas = [abs((x[a] - cx) * (y[j] - y[a]) - (x[a] - x[j]) * (cy - y[a])) for j in range(lo, hi)]
+        a = lo + int(np.argmax(areas))
+        keep.append(a)
+    return keep + [n - 1]
+
+
+def test_short_series_are_kept_whole():
+    assert list(lttb(np.arange(5), np.arange(5), 5)) == [0, 1, 2, 3, 4]
+    assert list(lttb(np.arange(5), np.arange(5), 10)) == [0, 1, 2, 3, 4]
+    assert list(lttb(np.arange(5), np.arange(5), 2)) == [0, 1, 2, 3, 4]
+
+
+def test_keeps_threshold_points_in_order_with_both_ends():
+    rng = np.random.default_rng(0)
+    x, y = np.arange(1000), rng.normal(size=1000).cumsum()
+    for threshold in (3, 4, 50, 999):
+        keep = lttb(x, y, threshold)
+        assert len(keep) == threshold
+        assert keep[0] == 0 and keep[-1] == 999
+        assert (np.diff(keep) > 0).all()
+
+
+def test_matches_a_point_by_point_lttb():
+    rng = np.random.default_rng(1)
+    x = np.sort(rng.uniform(0, 100, 500))
+    y = rng.normal(size=500)
+    for threshold in (3, 17, 100):
+        assert list(lttb(x, y, threshold)) == brute_force_lttb(x, y, threshold)
+
+
+def test_keeps_isolated_spikes():
+    y = np.zeros(1000)
+    y[137], y[600] = 50, -40
+    keep = lttb(np.arange(1000), y, 20)
+    assert 137 in keep and 600 in keep
+
+
+def test_missing_values_count_as_zero():
+    y = np.sin(np.linspace(0, 20, 300))
+    y[::7] = np.nan
+    keep = lttb(np.arange(300), y, 30)
+    assert len(keep) == 30 and (np.diff(keep) > 0).all()
+
+
+def test_downsample_thins_datetime_series_to_the_point_budget():
+    x = pd.Series(pd.date_range('2026-01-01', periods=2000, freq='h', tz='UTC'), index=np.arange(2000) + 500)
+    y = pd.Series(np.arange(2000.0), index=x.index)
+    thin_x, thin_y = downsample(x, y, width=400)
+    assert len(thin_x) == len(thin_y) == point_budget(400)
+    assert thin_x.iloc[0] == x.iloc[0] and thin_x.iloc[-1] == x.iloc[-1]
+    assert (thin_y.to_numpy() == y.to_numpy()[thin_x.index]).all()
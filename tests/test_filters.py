@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from analytics.filters import PREDICATES, FilterEngine, FilterState, select, state_mask
+from conftest import STATES
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    # Predicate evaluations by filter name
+    counted = {}
+    for name, (column, predicate) in PREDICATES.items():
+        def counting(col, value, name=name, predicate=predicate):
+            counted[name] = counted.get(name, 0) + 1
+            return predicate(col, value)
+        monkeypatch.setitem(PREDICATES, name, (column, counting))
+    return counted
+
+
+@pytest.mark.parametrize('state', STATES)
+def test_mask_matches_the_uncached_mask(sessions, state):
+    engine = FilterEngine()
+    np.testing.assert_array_equal(engine.mask(sessions, state), state_mask(sessions, state))
+
+
+def test_each_predicate_runs_once_per_frame(sessions, calls):
+    engine = FilterEngine()
+    engine.mask(sessions, FilterState(tiktok_only=True, price=17.0))
+    engine.mask(sessions, FilterState(tiktok_only=True, price=27.0))
+    engine.mask(sessions, FilterState(tiktok_only=True, price=17.0, version='V2.0'))
+    # Flipping price and adding version only evaluated the new values
+    assert calls == {'exclude_bots': 1, 'tiktok_only': 1, 'price': 2, 'version': 1}
+
+
+def test_repeated_states_reuse_the_combined_mask(sessions, calls):
+    engine = FilterEngine()
+    state = FilterState(tiktok_only=True)
+    first = engine.mask(sessions, state)
+    assert engine.mask(sessions, FilterState(tiktok_only=True)) is first
+    assert calls == {'exclude_bots': 1, 'tiktok_only': 1}
+
+
+def test_new_frame_drops_the_cached_masks(sessions, calls):
+    engine = FilterEngine()
+    state = FilterState(tiktok_only=True)
+    engine.mask(sessions, state)
+    newer = sessions.iloc[: len(sessions) // 2]
+    mask = engine.mask(newer, state)
+    assert calls == {'exclude_bots': 2, 'tiktok_only': 2}
+    np.testing.assert_array_equal(mask, state_mask(newer, state))
+
+
+def test_filters_on_missing_columns_are_skipped(sessions):
+    older = sessions.drop(columns=['version'])
+    mask = FilterEngine().mask(older, FilterState(version='V2.0'))
+    np.testing.assert_array_equal(mask, state_mask(older, FilterState()))
+
+
+def test_windows_share_the_full_frame_mask(sessions):
+    state = FilterState(tiktok_only=True)
+    mask = FilterEngine().mask(sessions, state)
+    bounds = (len(sessions) // 3, len(sessions) // 2)
+    window = select(sessions, bounds, mask)
+    expected = sessions.iloc[bounds[0]:bounds[1]]
+    assert window.equals(expected[state_mask(expected, state)])
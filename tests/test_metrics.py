@@ -0,0 +1,123 @@
+import pandas as pd
+import pytest
+
+from analytics.metrics import build_trend, calculate_ab_stats, calculate_metrics, grouped_metrics
+
+
+# The scalar, per-variant and lambda versions these functions replaced, kept
+# as the reference the grouped paths have to match
+
+
+def reference_metrics(df):
+    if df.empty:
+        return {'sessions': 0, 'median_time': 0, 'median_scroll': 0, 'total_clicks': 0,
+                'clicked_buy': 0, 'initiated_checkout': 0, 'purchased': 0, 'bounce_rate': 0, 'engaged_sessions': 0}
+    time_col = df.get('time_on_site_sec', pd.Series([0]))
+    valid_time = time_col[(time_col > 0) & (time_col <= 1800)]
+    scroll_col = df.get('scroll_depth_pct', pd.Series([0]))
+    valid_scroll = scroll_col[scroll_col > 0]
+    bounces = len(df[(time_col == 0) | (scroll_col == 0)])
+    engaged = len(df[(time_col > 10) & (scroll_col > 25)])
+    return {
+        'sessions': len(df),
+        'median_time': valid_time.median() if len(valid_time) > 0 else 0,
+        'median_scroll': valid_scroll.median() if len(valid_scroll) > 0 else 0,
+        'total_clicks': df.get('clicks_total', pd.Series([0])).sum(),
+        'clicked_buy': df.get('clicked_buy', pd.Series([0])).sum(),
+        'initiated_checkout': df.get('initiated_checkout', pd.Series([0])).sum(),
+        'purchased': df.get('purchased', pd.Series([0])).sum(),
+        'bounce_rate': (bounces / len(df) * 100) if len(df) > 0 else 0,
+        'engaged_sessions': engaged,
+    }
+
+
+def reference_ab_stats(df, variant_col):
+    if variant_col not in df.columns or df.empty:
+        return None
+    results = []
+    for variant in df[variant_col].dropna().unique():
+        m = reference_metrics(df[df[variant_col] == variant])
+        click_rate = (m['clicked_buy'] / m['sessions'] * 100) if m['sessions'] > 0 else 0
+        results.append({
+            'variant': variant, 'sessions': m['sessions'], 'median_time': m['median_time'],
+            'median_scroll': m['median_scroll'], 'clicked_buy': m['clicked_buy'],
+            'click_rate': click_rate, 'bounce_rate': m['bounce_rate'], 'engaged': m['engaged_sessions']
+        })
+    return pd.DataFrame(results)
+
+
+def reference_trend(df, freq):
+    df_trends = df.copy()
+    df_trends['bucket'] = df_trends['started_at'].dt.floor(freq)
+    trend_data = df_trends.groupby('bucket').agg({
+        'session_id': 'count',
+        'time_on_site_sec': [
+            lambda x: x[(x > 0) & (x <= 1800)].median() if len(x[(x > 0) & (x <= 1800)]) > 0 else 0,
+            lambda x: len(x[x > 5]),
+            lambda x: len(x[x > 10]),
+        ],
+        'scroll_depth_pct': [
+            lambda x: x[x > 0].median() if len(x[x > 0]) > 0 else 0,
+            lambda x: len(x[x > 25]),
+            lambda x: len(x[x > 50]),
+        ],
+        'clicks_total': 'sum',
+        'clicked_buy': 'sum',
+        'initiated_checkout': 'sum',
+    }).reset_index()
+    trend_data.columns = ['date', 'sessions', 'median_time', 'users_5sec', 'users_10sec',
+                          'median_scroll', 'users_25scroll', 'users_50scroll',
+                          'clicks', 'buy_clicks', 'checkouts']
+    trend_data['ctr'] = (trend_data['buy_clicks'] / trend_data['sessions'] * 100).fillna(0)
+    trend_data['checkout_rate'] = (trend_data['checkouts'] / trend_data['buy_clicks'] * 100).fillna(0)
+    trend_data['engaged_rate'] = (trend_data['users_10sec'] / trend_data['sessions'] * 100).fillna(0)
+    return trend_data
+
+
+@pytest.fixture(scope='module', params=['all', 'tiktok', 'last day', 'empty'])
+def frame(request, sessions):
+    if request.param == 'all':
+        return sessions
+    if request.param == 'tiktok':
+        return sessions[sessions['utm_source'] == 'tiktok']
+    if request.param == 'last day':
+        return sessions[sessions['started_at'] >= sessions['started_at'].max() - pd.Timedelta(days=1)]
+    return sessions.iloc[:0]
+
+
+def test_calculate_metrics_matches_the_scalar_version(frame):
+    assert calculate_metrics(frame) == pytest.approx(reference_metrics(frame))
+
+
+@pytest.mark.parametrize('by', ['version', 'hero_variant', 'price_shown', 'device_type', 'utm_source'])
+def test_grouped_metrics_match_the_scalar_version_per_group(sessions, by):
+    table = grouped_metrics(sessions, by)
+    groups = sessions[by].dropna().unique()
+    assert len(table) == len(groups)
+    for key in groups:
+        expected = reference_metrics(sessions[sessions[by] == key])
+        assert table.loc[key].to_dict() == pytest.approx(expected)
+
+
+@pytest.mark.parametrize('variant_col', ['hero_variant', 'scroll_hook_variant', 'not_a_column'])
+def test_calculate_ab_stats_matches_the_per_variant_loop(frame, variant_col):
+    expected = reference_ab_stats(frame, variant_col)
+    actual = calculate_ab_stats(frame, variant_col)
+    if expected is None:
+        assert actual is None
+        return
+    expected = expected.sort_values('variant', ignore_index=True)
+    actual = actual.assign(variant=actual['variant'].astype(object))
+    pd.testing.assert_frame_equal(actual, expected.astype({'variant': object}), check_dtype=False)
+
+
+@pytest.mark.parametrize('freq', ['D', 'h'])
+def test_build_trend_matches_the_lambda_version(frame, freq):
+    if frame.empty:
+        assert build_trend(frame, freq).empty
+        return
+    # The lambda version ran on plain bool flags; nullable ones turn its 0/0
+    # checkout rates into NA, which its fillna(0) misses
+    flags = {name: bool for name in ('clicked_buy', 'initiated_checkout')}
+    expected = reference_trend(frame.astype(flags), freq)
+    pd.testing.assert_frame_equal(build_trend(frame, freq), expected, check_dtype=False)
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from analytics.backends import compare_backends
+from analytics.data import time_bounds
+from analytics.filters import FilterState, select, state_mask
+from analytics.metrics import build_trend, calculate_metrics
+from conftest import STATES, WINDOWS
+
+
+def raw_rows(df, start, end, state):
+    lo, hi = time_bounds(df, start, end)
+    return select(df, (lo, hi), state_mask(df, state))
+
+
+def test_backends_build_identical_cubes(sessions):
+    assert compare_backends(sessions) == []
+
+
+@pytest.mark.parametrize('state', STATES)
+@pytest.mark.parametrize('start, end', WINDOWS)
+def test_cube_metrics_match_raw_rows(sessions, exact, start, end, state):
+    expected = calculate_metrics(raw_rows(sessions, start, end, state))
+    actual = exact.metrics(start, end, state)
+    assert actual.keys() == expected.keys()
+    for name, value in expected.items():
+        assert actual[name] == pytest.approx(value), name
+
+
+@pytest.mark.parametrize('state', STATES)
+@pytest.mark.parametrize('start, end', WINDOWS[:4])
+@pytest.mark.parametrize('freq', ['D', 'h'])
+def test_cube_trend_matches_raw_rows(sessions, exact, start, end, state, freq):
+    expected = build_trend(raw_rows(sessions, start, end, state), freq)
+    actual = exact.trend(start, end, state, freq)
+    pd.testing.assert_frame_equal(actual.reset_index(drop=True), expected.reset_index(drop=True),
+                                  check_dtype=False, check_index_type=False)
+
+
+def test_grouped_metrics_match_raw_rows(sessions, exact):
+    start, end = WINDOWS[1]
+    rows = raw_rows(sessions, start, end, FilterState())
+    table = exact.metrics(start, end, FilterState(), by='hero_variant')
+    for variant, group in rows.groupby('hero_variant', observed=True):
+        expected = calculate_metrics(group)
+        assert {name: table.loc[variant, name] for name in expected} == pytest.approx(expected)
+    assert np.isclose(table['sessions'].sum(), len(rows))
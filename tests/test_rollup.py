@@ -0,0 +1,67 @@
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from analytics.filters import FilterState
+from analytics.metrics import calculate_metrics
+from analytics.rollup import HLL_PRECISION, MEDIANS, RollupCube, merge_registers
+from analytics.synthetic import SYNTHETIC_END
+
+START, END = SYNTHETIC_END - timedelta(days=40), SYNTHETIC_END
+
+
+def test_values_past_the_top_edge_fall_in_the_top_bin(sessions):
+    df = sessions.copy()
+    df.loc[df['scroll_depth_pct'] > 0, 'scroll_depth_pct'] = np.int8(100)
+    df.loc[df.index[df['scroll_depth_pct'] > 0][0], 'scroll_depth_pct'] = np.int8(105)
+    cube = RollupCube.build(df)
+
+    totals = cube.query(df, START, END, quantiles=MEDIANS)
+    assert totals['median_scroll'] == 100
+
+    counts = cube.distribution(df, START, END, 'scroll', tuple(range(0, 101, 10)))
+    assert counts.iloc[-1] == (df['scroll_depth_pct'] > 0).sum()
+
+
+def test_sketch_medians_match_raw_rows(sessions):
+    # Whole seconds under two minutes and every scroll percentage are exact bins
+    df = sessions[sessions['time_on_site_sec'] < 120]
+    totals = RollupCube.build(df).query(df, START, END, state=FilterState(), quantiles=MEDIANS)
+    expected = calculate_metrics(df[df['is_bot'] != True])
+    assert totals['median_time'] == expected['median_time']
+    assert totals['median_scroll'] == expected['median_scroll']
+
+
+def test_update_matches_a_fresh_build(sessions):
+    # A refresh within the same day, and one that ages two days of hours into daily cells
+    for since in (SYNTHETIC_END - timedelta(hours=3, minutes=20), SYNTHETIC_END - timedelta(days=2, hours=6)):
+        cube = RollupCube.build(sessions[sessions['started_at'] < since]).update(sessions, since)
+        expected = RollupCube.build(sessions)
+        assert cube.daily_before == expected.daily_before
+        assert cube.tables.keys() == expected.tables.keys()
+        for name, table in expected.tables.items():
+            pd.testing.assert_frame_equal(cube.tables[name].reset_index(drop=True), table.reset_index(drop=True))
+
+
+def test_merged_registers_estimate_unique_visitors(sessions):
+    cube = RollupCube.build(sessions)
+    assert len(cube.tables['visitors']) == len(cube.tables['cells'])
+    totals = cube.query(sessions, START, END, by=['is_bot'], dropna=False, visitors=True)
+    expected = sessions.groupby('is_bot', observed=True, dropna=False)['user_id'].nunique()
+    assert np.allclose(totals['unique_visitors'], expected.reindex(totals.index), rtol=0.03)
+
+
+def test_packed_registers_merge_like_dense_ones(sessions):
+    cells = RollupCube.build(sessions).tables['visitors']['registers'].to_numpy()
+    dense = np.empty(len(cells), dtype=object)
+    for i, cell in enumerate(cells):
+        dense[i] = cell
+        if cell.dtype != np.uint8:
+            dense[i] = np.zeros(1 << HLL_PRECISION, dtype='uint8')
+            dense[i][cell >> 8] = cell.astype('uint8')
+    # A mix of packed and dense cells in each group, and some cells left out
+    mixed = np.where(np.arange(len(cells)) % 2 == 0, cells, dense)
+    group = np.random.default_rng(0).integers(-1, 4, len(cells))
+    np.testing.assert_array_equal(merge_registers(mixed, group, 4), merge_registers(dense, group, 4))
+    assert sum(cell.nbytes for cell in cells) < sum(cell.nbytes for cell in dense) / 4
@@ -0,0 +1,112 @@
+from analytics.aggregates import CubeAggregates
+from analytics.data import SECTION_COLUMNS, SNAPSHOT_MAX_AGE, SessionRefresher, SessionStore, fetch_rows
+from analytics.rollup import RollupCube
+from analytics.snapshot import SnapshotCache
+from analytics.synthetic import SyntheticClient, generate_sessions
+
+
+def edited(raw, row, **values):
+    raw = raw.copy()
+    for column, value in values.items():
+        raw.loc[row, column] = value
+    return raw
+
+
+def test_reconcile_picks_up_rows_past_the_lookback():
+    raw = generate_sessions(3_000, seed=2, days=10)
+    store = SessionStore(SyntheticClient(raw))
+    df = store.refresh()
+
+    # An old row changes: the delta never looks that far back
+    store.client = SyntheticClient(edited(raw, 10, clicks_total=999))
+    assert store.refresh() is df
+
+    store.reconciled_at -= store.reconcile
+    df = store.refresh()
+    assert df.loc[10, 'clicks_total'] == 999
+    assert store.changed_since is None
+
+
+def test_reconcile_keeps_an_unchanged_frame():
+    raw = generate_sessions(3_000, seed=2, days=10)
+    store = SessionStore(SyntheticClient(raw))
+    df = store.refresh()
+    reconciled_at = store.reconciled_at
+    store.reconciled_at -= store.reconcile
+    assert store.refresh() is df
+    assert store.reconciled_at >= reconciled_at
+
+
+def test_cold_start_trusts_only_recently_reconciled_snapshots(tmp_path):
+    raw = generate_sessions(3_000, seed=2, days=10)
+    first = SessionStore(SyntheticClient(raw), snapshots=SnapshotCache(tmp_path / 'fresh'))
+    first.refresh()
+    changed = SyntheticClient(edited(raw, 10, clicks_total=999))
+
+    # Served from the snapshot as of its last reconcile
+    store = SessionStore(changed, snapshots=SnapshotCache(tmp_path / 'fresh'))
+    assert store.refresh().loc[10, 'clicks_total'] != 999
+    assert store.reconciled_at == first.reconciled_at
+
+    SnapshotCache(tmp_path / 'stale').save(first.df, first.watermark, first.reconciled_at - SNAPSHOT_MAX_AGE)
+    store = SessionStore(changed, snapshots=SnapshotCache(tmp_path / 'stale'))
+    assert store.refresh().loc[10, 'clicks_total'] == 999
+
+
+def test_lazy_columns_arrive_on_require():
+    raw = generate_sessions(3_000, seed=2, days=10)
+    store = SessionStore(SyntheticClient(raw))
+    assert 'city' not in store.refresh().columns
+    assert store.require(SECTION_COLUMNS['distribution_charts'])
+    assert store.df['city'].dtype == 'category'
+    assert store.df['city'].astype(object).equals(raw['city'])
+    assert not store.require(SECTION_COLUMNS['distribution_charts'])
+
+
+def test_require_skips_columns_an_older_table_lacks():
+    raw = generate_sessions(3_000, seed=2, days=10).drop(columns=['city', 'hero_variant'])
+    store = SessionStore(SyntheticClient(raw))
+    assert 'hero_variant' not in store.refresh().columns
+    for section in ('distribution_charts', 'recent_sessions'):
+        assert not store.require(SECTION_COLUMNS[section])
+    assert store.absent == {'city', 'hero_variant'}
+    assert 'city' not in store.columns and 'city' not in store.df.columns
+
+def test_require_never_publishes_a_stale_rollup():
+    raw = generate_sessions(3_000, seed=2, days=10)
+    store = SessionStore(SyntheticClient(raw.iloc[:2_500]))
+    refresher = SessionRefresher(store, rollup=RollupCube)
+    df = store.refresh()
+    refresher._publish(df, refresher._rollup(df))
+
+    # The refresher has swapped in new rows but not published them when a section asks for city
+    store.client = SyntheticClient(raw)
+    df = store.refresh()
+    assert refresher.require(SECTION_COLUMNS['distribution_charts'])
+    assert refresher.snapshot.version == 1
+    refresher._publish(store.df, refresher._rollup(df))
+
+    snapshot = refresher.snapshot
+    assert snapshot.version == 2 and 'city' in snapshot.df.columns
+    start, end = raw['started_at'].min(), raw['started_at'].max()
+    assert CubeAggregates(snapshot.rollup, snapshot.df).counts(start, end, None)['sessions'] == len(raw)
+
+def test_fetch_pages_within_started_at_windows():
+    class Offsets(SyntheticClient):
+        def table(self, name):
+            query = super().table(name)
+            page = query.range
+
+            def range(start, end):
+                offsets.append(start)
+                return page(start, end)
+            query.range = range
+            return query
+
+    raw = generate_sessions(25_000, seed=2, days=10)
+    # A run of rows on one timestamp straddling the first page boundary
+    raw.loc[990:1010, 'started_at'] = raw.loc[990, 'started_at']
+    offsets = []
+    rows = fetch_rows(Offsets(raw), columns='session_id', page_size=1000, window_pages=4)
+    assert [row['session_id'] for row in rows] == list(raw['session_id'])
+    assert max(offsets) < 1000 * 8